@@ -1,5 +1,16 @@
 """Animated linegraph widget. Based on pyqtgraph. Includes buttons for x-axis zoom and
-    toggling plotlines on and off."""
+    toggling plotlines on and off. Plotlines can have min/max envelope showing the peaks
+    between graphed steps. Long plotlines are drawn decimated to about two points per
+    horizontal pixel, keeping the minimum and maximum of the decimated steps.
+    With history_length, plotlines keep a min/max history pyramid of the run, so the x-axis
+    can be zoomed out beyond the plotline length up to the whole run.
+    Left click annotates the nearest plotline point, shift + left click places one of the two
+    measurement cursors, which show the x and y difference and frequency between them.
+    y-axis follows the minimum and maximum of the visible steps, which plotlines track with
+    sliding window maxima. Range grows immediately and shrinks at most every
+    AUTOSCALE_INTERVAL seconds, when the values have fallen below AUTOSCALE_SHRINK of it.
+    New steps are added to the plotline buffers immediately and drawn with the next frame of
+    SimuRender.RenderScheduler, with the axis ranges."""
 
 ## Licensing
 '''
@@ -23,10 +34,20 @@ If not, see <https://www.gnu.org/licenses/>.
 # pylint: disable=C0206
 from copy import copy
 from functools import partial
+import time
 from PySide6.QtWidgets import QWidget, QGridLayout, QPushButton, QLabel
 from PySide6.QtCore import Qt
 import pyqtgraph as pg
 import numpy as np
+import SimuRender
+
+
+HISTORY_BUCKETS = 2048      # Min/max buckets kept in each level of HistoryPyramid
+HISTORY_PENDING = 64        # Steps collected before they are added to the HistoryPyramid levels
+ANNOTATION_LIMIT = 10       # Click annotations shown at a time, the oldest one is reused
+AUTOSCALE_MARGIN = 1.1      # y-axis range as a multiple of the largest visible value
+AUTOSCALE_SHRINK = 0.5      # y-axis range shrinks when visible values are below this share
+AUTOSCALE_INTERVAL = 0.5    # Seconds between automatic y-axis range changes, growing excluded
 
 
 def linetype_maker(input_str):
@@ -39,6 +60,43 @@ def linetype_maker(input_str):
         return [2, 2]
 
 
+def ring_write(buffer, head:int, values):
+    """Writes values over the oldest values of a ring buffer holding its data twice in a row,
+       see PlotLine. If there are more values than the buffer length, only the latest are
+       written. Returns the new head index"""
+    capacity = len(buffer)//2
+    values = values[len(values)-min(len(values), capacity):]
+    indices = (head + np.arange(len(values))) % capacity
+    buffer[indices] = values
+    buffer[indices+capacity] = values
+    return (head + len(values)) % capacity
+
+
+def reduce_min_max(x_values, y_values, bucket_size:int):
+    """Reduces each bucket of bucket_size steps to its minimum and maximum in the order they
+       occurred. Length of the values must be a multiple of bucket_size.
+       Returns x and y values of the reduced points"""
+    y_buckets = y_values.reshape(-1, bucket_size)
+    x_buckets = x_values.reshape(-1, bucket_size)
+    rows = np.arange(len(y_buckets))
+    i_min = np.argmin(y_buckets, axis=1)
+    i_max = np.argmax(y_buckets, axis=1)
+    order = (np.minimum(i_min, i_max), np.maximum(i_min, i_max))
+    x_reduced = np.stack([x_buckets[rows, i] for i in order], axis=1)
+    y_reduced = np.stack([y_buckets[rows, i] for i in order], axis=1)
+    return x_reduced.ravel(), y_reduced.ravel()
+
+
+def combine_pairs(buckets):
+    """Combines each two consecutive min/max buckets to one, buckets is a tuple of arrays
+       (x_min, y_min, x_max, y_max) with even length. Returns the combined buckets"""
+    x_min, y_min, x_max, y_max = (values.reshape(-1, 2) for values in buckets)
+    rows = np.arange(len(y_min))
+    i_min = np.argmin(y_min, axis=1)
+    i_max = np.argmax(y_max, axis=1)
+    return (x_min[rows, i_min], y_min[rows, i_min], x_max[rows, i_max], y_max[rows, i_max])
+
+
 def round_to(num, precision):
     """Round number to closest given precision value"""
     inver = precision**-1
@@ -51,7 +109,7 @@ class LinePlotWidget(QWidget):
     padding_factor = 0.005
     def __init__(self, name:str="Plot", x_name:str="x", y_name:str="y",
                  x_lenght:int=500, simu_steptime:float=0.001, plot_step:int=1,
-                 enable_legend:bool=False):
+                 enable_legend:bool=False, history_length:int=0):
         super().__init__()
         print("PhasorPlotWidget init: " + name)
         self.graph_name = name
@@ -60,18 +118,26 @@ class LinePlotWidget(QWidget):
         self.x_lenght = x_lenght
         self.steptime = simu_steptime
         self.step_len = plot_step
+        self.history_length = history_length    # Graphed steps kept in the history, 0 disables
 
         self.widget_layout = QGridLayout()
         self.graphWidget = pg.PlotWidget()
         self.widget_layout.addWidget(self.graphWidget,0,0,1,4)
         self.plot_lines = {}
-        self.click_markers = []
-        self.click_text = []
+        self.annotations = []       # (arrow, text) items of the click annotations
+        self.next_annotation = 0    # Index of the annotation reused by the next click
+        self.cursors = []           # Measurement cursors, pg.InfiniteLine
+        self.cursor_lines = []      # Names of the plotlines the cursors are snapped to
+        self.next_cursor = 0
         self.show_buttons = {}
+        self.channel_bindings = {}
+        self.envelopes = {}
 
         self.y_max = 0
+        self.y_range_time = 0       # time.monotonic() of the latest y-axis range change
         self.x_zoom_factor = 1
         self.x_min = x_lenght
+        self.run_view = False
 
         self.graphWidget.setBackground('w')
         self.graphWidget.showGrid(x=True, y=True)
@@ -81,6 +147,8 @@ class LinePlotWidget(QWidget):
         self.graphWidget.setLabel("bottom", self.x_name, **styles)
         self.graphWidget.setDefaultPadding(LinePlotWidget.padding_factor)
         self.graphWidget.scene().sigMouseClicked.connect(self.mouse_clicked)
+        self.graphWidget.plotItem.vb.sigResized.connect(self.update_decimation)
+        self.bucket_size = 1
         self.ref_y_limit(1)
         if enable_legend:
             self.graphWidget.addLegend()
@@ -96,11 +164,20 @@ class LinePlotWidget(QWidget):
         self.x_zoom_out_button.setEnabled(False)
         self.show_label = QLabel()
         self.show_label.setText("Show: ")
+        self.cursor_label = QLabel()
+        self.cursor_label.setVisible(False)
 
         self.widget_layout.addWidget(self.zoom_label,1,0,1,1)
         self.widget_layout.addWidget(self.x_zoom_in_button,1,1,1,1)
         self.widget_layout.addWidget(self.x_zoom_out_button,1,2,1,1)
-        self.widget_layout.addWidget(self.show_label,1,3,1,1)
+        if self.history_length > 0:
+            self.x_zoom_out_button.setEnabled(True)
+            self.run_view_button = QPushButton(" run ")
+            self.run_view_button.setCheckable(True)
+            self.run_view_button.clicked.connect(self.run_view_button_click)
+            self.widget_layout.addWidget(self.run_view_button,1,3,1,1)
+        self.widget_layout.addWidget(self.show_label,1,3+int(self.history_length > 0),1,1)
+        self.widget_layout.addWidget(self.cursor_label,2,0,1,4)
 
         #self.setSizePolicy(QSizePolicy.Expanding,QSizePolicy.Expanding)
         self.setLayout(self.widget_layout)
@@ -121,6 +198,10 @@ class LinePlotWidget(QWidget):
     def show_button_clicked(self, name:int):
         '''Toggles plotline visibility ON/OFF'''
         self.plot_lines[name].setVisible(self.show_buttons[name].isChecked())
+        if name in self.envelopes:
+            for item in self.envelopes[name]:
+                item.setVisible(self.show_buttons[name].isChecked())
+        self.update_y_range(immediate=True)
 
 
     def add_plotline(self, name, x_data, y_data, color="red"):
@@ -142,7 +223,9 @@ class LinePlotWidget(QWidget):
             x_data = x_data[len(x_data)-self.x_lenght:len(x_data)]
             y_data = y_data[len(x_data)-self.x_lenght:len(x_data)]
         x_data = x_data * self.steptime * self.step_len
-        self.plot_lines[name] = PlotLine(name, x_data, y_data, color)
+        self.plot_lines[name] = PlotLine(name, x_data, y_data, color, self.history_length)
+        self.plot_lines[name].set_bucket_size(self.bucket_size)
+        self.plot_lines[name].set_history_view(self.history_steps(), self.bucket_points())
         self.graphWidget.addItem(self.plot_lines[name])
         self.ref_y_limit(max([abs(min(y_data)),abs(max(y_data))]))
 
@@ -153,20 +236,184 @@ class LinePlotWidget(QWidget):
         """Update lineplot with given inputs, replaces the current plot"""
         self.plot_lines[str(name)].plotline_update(x_data_new, y_data_new)
         self.ref_y_limit(max([min(y_data_new),max(y_data_new)]))
+        SimuRender.schedule(self)
 
 
     def step(self, name, y_new):
         """Add new step to the lineplot, y-value is given, rest from self.parameters"""
         self.plot_lines[str(name)].plotline_step( y_new, self.step_len*self.steptime)
-        self.ref_y_limit(max([abs(y_new),y_new]))
+        SimuRender.schedule(self)
+
+
+    def extend(self, name, y_values):
+        """Add many steps to the lineplot at once, y-values are given as an array.
+           Plotline is redrawn once"""
+        self.extend_many({name: y_values})
+
+
+    def extend_many(self, lines:dict):
+        """Add many steps to many lineplots at once, lines is a dictionary of
+           name: array of y-values. Each plotline is redrawn once and the axis ranges are
+           updated once"""
+        for name, y_values in lines.items():
+            y_values = np.asarray(y_values, dtype=float)
+            if len(y_values) == 0:
+                continue
+            self.plot_lines[str(name)].plotline_extend(y_values, self.step_len*self.steptime)
+        SimuRender.schedule(self)
+
+
+    def add_envelope(self, name, color:str=None, alpha:int=60):
+        """Add min/max envelope to the plotline, envelope is filled between the minimum and
+           maximum values of each graphing interval"""
+        name = str(name)
+        line = self.plot_lines[name]
+        if color is None:
+            color = line.color
+        brush_color = pg.mkColor(color)
+        brush_color.setAlpha(alpha)
+        lower = PlotLine(name + " min", copy(line.x_data), copy(line.y_data), color,
+                         self.history_length)
+        upper = PlotLine(name + " max", copy(line.x_data), copy(line.y_data), color,
+                         self.history_length)
+        for item in (lower, upper):
+            item.setPen(pg.mkPen(brush_color))
+            item.set_bucket_size(self.bucket_size)
+            item.set_history_view(self.history_steps(), self.bucket_points())
+        fill = pg.FillBetweenItem(lower, upper, brush=brush_color)
+        fill.setZValue(-1)
+        for item in (lower, upper, fill):
+            self.graphWidget.addItem(item)
+        self.envelopes[name] = (lower, upper, fill)
+
+
+    def step_envelope(self, name, y_min, y_max):
+        """Add new step to the min/max envelope of the plotline"""
+        lower, upper, _ = self.envelopes[str(name)]
+        lower.plotline_step(y_min, self.step_len*self.steptime)
+        upper.plotline_step(y_max, self.step_len*self.steptime)
+        SimuRender.schedule(self)
+
+
+    def extend_envelope(self, name, y_min_values, y_max_values):
+        """Add many steps to the min/max envelope of the plotline at once"""
+        lower, upper, _ = self.envelopes[str(name)]
+        y_min_values = np.asarray(y_min_values, dtype=float)
+        y_max_values = np.asarray(y_max_values, dtype=float)
+        if len(y_min_values) == 0:
+            return
+        lower.plotline_extend(y_min_values, self.step_len*self.steptime)
+        upper.plotline_extend(y_max_values, self.step_len*self.steptime)
+        SimuRender.schedule(self)
+
+
+    def clear(self):
+        """Clears all plotlines and envelopes to zero, x-axis starts again from zero"""
+        x_data = np.arange((-self.x_lenght)+1,1,1) * self.steptime * self.step_len
+        for line in self.plot_lines.values():
+            line.plotline_clear(x_data)
+        for envelope in self.envelopes.values():
+            for item in envelope[0:2]:
+                item.plotline_clear(x_data)
+        self.clear_annotations()
+        self.y_max = 0
+        self.ref_y_limit(1)
+        SimuRender.schedule(self)
+
+
+    def render(self):
+        """Draws the plotlines changed since the previous frame and sets the axis ranges,
+           called by SimuRender.RenderScheduler"""
+        self.draw(immediate=False)
+
+
+    def draw(self, immediate:bool=True):
+        """Draws the changed plotlines and sets the axis ranges, immediate y-axis range change
+           is used for zoom and visibility changes. Plotlines replaced with update() keep the
+           automatic x-axis range and the y-limit set by update()"""
+        items = self.plot_items()
+        for item in items:
+            if item.dirty:
+                item.redraw()
+        if any(item.replaced is not None for item in items):
+            if not self.graphWidget.plotItem.vb.autoRangeEnabled()[0]:
+                self.graphWidget.enableAutoRange(axis="x")
+            return
+        self.update_y_range(immediate)
         self.update_x_range()
 
 
-    def ref_y_limit(self,y_limit):
-        """Calculates and sets the y-limits"""
-        if y_limit > self.y_max:
-            self.graphWidget.setYRange(-y_limit, y_limit)
-            self.y_max = y_limit
+    def plot_items(self):
+        """Returns the plotlines and envelope lines"""
+        items = list(self.plot_lines.values())
+        for envelope in self.envelopes.values():
+            items.extend(envelope[0:2])
+        return items
+
+
+    def bind_channel(self, name, channel:str, index:int=None):
+        '''Binds plotline to named output channel of SimuChannels.ChannelSet.
+           Index selects the element of channels with array shape'''
+        self.channel_bindings[str(name)] = (channel, index)
+
+
+    def step_channels(self, frame):
+        '''Add new step to all plotlines bound to channels, values are read from ChannelFrame.
+           Envelopes of bound plotlines are stepped with the interval minimum and maximum'''
+        for name, (channel, index) in self.channel_bindings.items():
+            if index is None:
+                if name in self.envelopes:
+                    self.step_envelope(name, frame.minimum(channel), frame.maximum(channel))
+                self.step(name, frame[channel])
+            else:
+                if name in self.envelopes:
+                    self.step_envelope(name, frame.minimum(channel)[index],
+                                       frame.maximum(channel)[index])
+                self.step(name, frame[channel][index])
+
+
+    def extend_channels(self, frames):
+        """Add steps of many ChannelFrames to all plotlines bound to channels at once,
+           see step_channels(). Each plotline is redrawn once"""
+        if len(frames) == 0:
+            return
+        lines = {}
+        for name, (channel, index) in self.channel_bindings.items():
+            selected = (lambda value: value) if index is None else (lambda value: value[index])
+            if name in self.envelopes:
+                self.extend_envelope(name,
+                                     [selected(frame.minimum(channel)) for frame in frames],
+                                     [selected(frame.maximum(channel)) for frame in frames])
+            lines[name] = [selected(frame[channel]) for frame in frames]
+        self.extend_many(lines)
+
+
+    def ref_y_limit(self, y_limit, immediate:bool=False):
+        """Sets the y-limits for values up to y_limit with hysteresis. Range grows immediately
+           and shrinks when y_limit is below AUTOSCALE_SHRINK of it, at most once per
+           AUTOSCALE_INTERVAL unless immediate. setYRange is called only when range changes"""
+        if not y_limit > 0:
+            return
+        now = time.monotonic()
+        if y_limit <= self.y_max:
+            if (y_limit >= self.y_max*AUTOSCALE_SHRINK
+                    or (not immediate and now - self.y_range_time < AUTOSCALE_INTERVAL)):
+                return
+        self.y_max = y_limit*AUTOSCALE_MARGIN
+        self.y_range_time = now
+        self.graphWidget.setYRange(-self.y_max, self.y_max)
+
+
+    def update_y_range(self, immediate:bool=False):
+        """Sets the y-limits by the largest absolute value of the visible plotlines and
+           envelopes in the visible x-axis range, see ref_y_limit"""
+        steps = min(int(self.x_min), self.x_lenght)
+        y_limit = 0
+        for item in self.plot_items():
+            if item.isVisible():
+                y_min, y_max = item.y_limits(steps)
+                y_limit = max(y_limit, abs(y_min), abs(y_max))
+        self.ref_y_limit(y_limit, immediate)
 
 
     def set_text(self, title:str="", y_label:str="", x_label:str="",
@@ -192,86 +439,258 @@ class LinePlotWidget(QWidget):
 
     def update_x_range(self):
         """x-axis panning"""
-        minmax = self.plot_lines[list(self.plot_lines.keys())[0]].get_x_minmax(self.x_lenght,
-                                                                               self.x_min)
-        self.graphWidget.setXRange(minmax[0],minmax[1])
+        line = self.plot_lines[list(self.plot_lines.keys())[0]]
+        history_steps = self.history_steps()
+        if history_steps == 0:
+            minmax = line.get_x_minmax(self.x_lenght, self.x_min)
+            self.graphWidget.setXRange(minmax[0],minmax[1])
+            return
+        if history_steps < 0:
+            history_steps = max(line.history.steps, self.x_lenght)
+        x_last = line.x_data[-1]
+        self.graphWidget.setXRange(x_last - (history_steps-1)*self.steptime*self.step_len, x_last)
+
+
+    def visible_data(self):
+        """Returns x and y values of the plotlines in the visible x-axis range as a dictionary
+           of name: (x, y). Zoomed out beyond the plotline length, the drawn min/max values
+           of the history are returned"""
+        data = {}
+        for name, line in self.plot_lines.items():
+            if self.history_steps() != 0:
+                data[name] = line.history.view(self.history_steps(), self.bucket_points())
+            else:
+                visible = min(int(self.x_min), line.capacity)
+                data[name] = (line.x_data[line.capacity-visible:].copy(),
+                              line.y_data[line.capacity-visible:].copy())
+        return data
+
+
+    def history_steps(self):
+        """Returns the graphed steps shown from the history, -1 for the whole run and 0 when
+           the x-axis is within the plotline length"""
+        if self.run_view:
+            return -1
+        if self.x_min > self.x_lenght:
+            return int(self.x_min)
+        return 0
+
+
+    def bucket_points(self):
+        """Returns the number of min/max buckets drawn, one per horizontal pixel"""
+        return max(1, int(self.graphWidget.plotItem.vb.width()))
+
+
+    def update_decimation(self):
+        """Sets decimation of the plotlines, so that about two points are drawn per horizontal
+           pixel of the visible x-axis range. Zoomed out beyond the plotline length,
+           plotlines are drawn from the history"""
+        width = int(self.graphWidget.plotItem.vb.width())
+        self.bucket_size = max(1, int(min(self.x_min, self.x_lenght)//width)) if width > 0 else 1
+        for item in self.plot_items():
+            item.set_bucket_size(self.bucket_size)
+            item.set_history_view(self.history_steps(), self.bucket_points())
+        SimuRender.schedule(self)
+
+
+    def max_zoom_factor(self):
+        """Returns the largest x-axis zoom factor, over 1 when the history is kept"""
+        return max(1, self.history_length/self.x_lenght)
 
 
     def zoom_in_button_click(self):
         """Set x-axis for zoom in"""
-        self.x_zoom_factor *= 0.9
+        self.set_run_view(False)
+        if self.x_zoom_factor > 1:
+            self.x_zoom_factor = max(1, self.x_zoom_factor/2)
+        else:
+            self.x_zoom_factor *= 0.9
         self.x_min = self.x_zoom_factor*self.x_lenght
-        self.update_x_range()
-        if self.x_zoom_factor >= 0.9:
-            self.x_zoom_out_button.setEnabled(True)
+        self.update_decimation()
+        self.draw()
+        self.x_zoom_out_button.setEnabled(True)
 
 
     def zoom_out_button_click(self):
-        """Set x-axis for zoom out"""
-        self.x_zoom_factor /= 0.9
-        if round(self.x_zoom_factor,1) > 1:
-            self.x_zoom_factor *= 0.9
+        """Set x-axis for zoom out, beyond the plotline length the zoom is doubled"""
+        self.set_run_view(False)
+        if round(self.x_zoom_factor,1) >= 1:
+            self.x_zoom_factor = min(2*max(self.x_zoom_factor, 1), self.max_zoom_factor())
+        else:
+            self.x_zoom_factor /= 0.9
+            if round(self.x_zoom_factor,1) > 1:
+                self.x_zoom_factor *= 0.9
         self.x_min = self.x_zoom_factor*self.x_lenght
-        self.update_x_range()
-        if self.x_zoom_factor >= 1:
+        self.update_decimation()
+        self.draw()
+        if self.x_zoom_factor >= self.max_zoom_factor():
             self.x_zoom_out_button.setEnabled(False)
 
 
+    def run_view_button_click(self):
+        """Toggles x-axis zoom to the whole run"""
+        self.set_run_view(self.run_view_button.isChecked())
+
+
+    def set_run_view(self, enabled:bool):
+        """Shows the whole run from the history or returns to the zoom of the buttons"""
+        if self.history_length <= 0 or enabled == self.run_view:
+            return
+        self.run_view = enabled
+        self.run_view_button.setChecked(enabled)
+        self.update_decimation()
+        self.draw()
+
+
     def mouse_clicked(self, click_event):
-        """Left click action in graph"""
+        """Left click annotates the nearest plotline point, with shift places a cursor"""
         if click_event.button() != Qt.MouseButton.LeftButton:
             return
-        lookup_range = 1
         vb = self.graphWidget.plotItem.vb
         scene_coords = click_event.scenePos()
-        if self.graphWidget.sceneBoundingRect().contains(scene_coords):
-            mouse_point = vb.mapSceneToView(scene_coords)
-            print(f'clicked plot X: {mouse_point.x()}, Y: {mouse_point.y()}, event: {click_event}')
-        closest = round_to(mouse_point.x(), self.steptime)
-        i_round = int(np.log10(self.steptime**-1))-1
-        x_index = self.plot_lines[list(self.plot_lines.keys())[0]].get_i_of_x(closest,i_round)
-        if x_index < 0:
+        if not vb.sceneBoundingRect().contains(scene_coords):
+            return
+        mouse_point = vb.mapSceneToView(scene_coords)
+        point = self.nearest_point(mouse_point.x(), mouse_point.y())
+        if point is None:
             return
-        key_index = 0
-        abs_distances = []
-        xy_coordinates = []
-        for key in self.plot_lines.keys():
-            abs_distances.append([])
-            xy_coordinates.append([])
-            for x_index_i in range(x_index-lookup_range,x_index+lookup_range):
-                if x_index_i > self.x_lenght-1:
-                    break
-                if x_index_i < 0:
-                    break
-                y_val = self.plot_lines[key].get_y_at_i(x_index_i)
-                x_val = self.plot_lines[key].get_x_at_i(x_index_i)
-                abs_distances[key_index].append(np.sqrt((mouse_point.x()-x_val)**2 + (mouse_point.y()-y_val)**2))
-                xy_coordinates[key_index].append([x_val, y_val])
-            key_index += 1
-        min_line = min(range(len(abs_distances)), key=abs_distances.__getitem__)
-        point_min_ind = min(range(len(abs_distances[min_line])),
-                            key=abs_distances[min_line].__getitem__)
-        xy = [xy_coordinates[min_line][point_min_ind][0],
-              xy_coordinates[min_line][point_min_ind][1]]
-        color = str(self.plot_lines[list(self.plot_lines.keys())[min_line]].color)
-        self.click_markers.append(pg.ArrowItem(pen={"color": color}, brush=color))
-        self.click_markers[len(self.click_markers)-1].setPos(xy[0],xy[1])
-        self.graphWidget.addItem(self.click_markers[len(self.click_markers)-1])
-        text = "x:"+ str(round_to(xy[0],self.steptime)) +"\ny:"+ str(round_to(xy[1],self.steptime))
-        self.click_text.append(pg.TextItem(text=text))
-        self.click_text[len(self.click_text)-1].setPos(xy[0],xy[1])
-        self.graphWidget.addItem(self.click_text[len(self.click_text)-1])
+        if click_event.modifiers() & Qt.KeyboardModifier.ShiftModifier:
+            self.place_cursor(*point)
+        else:
+            self.add_annotation(*point)
+
+
+    def nearest_point(self, x, y):
+        """Returns plotline name, x and y of the visible plotline point nearest to the given
+           point on the screen, None if no plotline is visible"""
+        pixel_width, pixel_height = self.graphWidget.plotItem.vb.viewPixelSize()
+        nearest = None
+        distance = np.inf
+        for name, line in self.plot_lines.items():
+            if not line.isVisible():
+                continue
+            x_values, y_values = line.nearest_points(x)
+            distances = np.hypot((x_values-x)/pixel_width, (y_values-y)/pixel_height)
+            if len(distances) > 0 and np.min(distances) < distance:
+                i = int(np.argmin(distances))
+                distance = distances[i]
+                nearest = (name, float(x_values[i]), float(y_values[i]))
+        return nearest
+
+
+    def add_annotation(self, name, x, y):
+        """Marks the point with an arrow and its values. Annotation items are created up to
+           ANNOTATION_LIMIT, after that the oldest annotation is moved to the point"""
+        color = str(self.plot_lines[name].color)
+        if len(self.annotations) < ANNOTATION_LIMIT:
+            arrow = pg.ArrowItem()
+            text = pg.TextItem()
+            self.graphWidget.addItem(arrow)
+            self.graphWidget.addItem(text)
+            self.annotations.append((arrow, text))
+        arrow, text = self.annotations[self.next_annotation]
+        self.next_annotation = (self.next_annotation + 1) % ANNOTATION_LIMIT
+        arrow.setStyle(pen={"color": color}, brush=color)
+        text.setText("x:"+ str(round_to(x,self.steptime)) +"\ny:"+ str(round_to(y,self.steptime)))
+        for item in (arrow, text):
+            item.setPos(x, y)
+            item.setVisible(True)
+
+
+    def place_cursor(self, name, x, _y=None):
+        """Places the next of the two measurement cursors to the point of the plotline,
+           the cursor can then be dragged along the x-axis"""
+        if len(self.cursors) < 2:
+            cursor = pg.InfiniteLine(angle=90, movable=True)
+            cursor.sigPositionChanged.connect(self.update_measurement)
+            cursor.sigPositionChangeFinished.connect(self.snap_cursor)
+            self.graphWidget.addItem(cursor)
+            self.cursors.append(cursor)
+            self.cursor_lines.append(name)
+        cursor = self.cursors[self.next_cursor]
+        self.cursor_lines[self.next_cursor] = name
+        self.next_cursor = (self.next_cursor + 1) % 2
+        cursor.setPen(pg.mkPen(self.plot_lines[name].color, dash=linetype_maker("--")))
+        cursor.setValue(x)
+        cursor.setVisible(True)
+        self.update_measurement()
+
+
+    def cursor_point(self, number:int):
+        """Returns x and y of the plotline point nearest to the cursor on the x-axis"""
+        x = self.cursors[number].value()
+        x_values, y_values = self.plot_lines[self.cursor_lines[number]].nearest_points(x)
+        if len(x_values) == 0:
+            return x, np.nan
+        i = int(np.argmin(np.abs(x_values-x)))
+        return float(x_values[i]), float(y_values[i])
+
+
+    def snap_cursor(self, cursor):
+        """Moves dragged cursor to the nearest point of its plotline"""
+        cursor.setValue(self.cursor_point(self.cursors.index(cursor))[0])
+
+
+    def update_measurement(self):
+        """Shows the cursor values, and x and y differences and frequency between the cursors"""
+        points = [self.cursor_point(i) for i in range(len(self.cursors))]
+        text = "   ".join(f"{self.x_name} {i+1}: {x:.6g}, {self.y_name}: {y:.6g}"
+                           for i, (x, y) in enumerate(points))
+        if len(points) == 2:
+            delta_x = points[1][0] - points[0][0]
+            delta_y = points[1][1] - points[0][1]
+            frequency = 1/abs(delta_x) if delta_x != 0 else np.inf
+            text += f"   \u0394{self.x_name}: {delta_x:.6g}, \u0394{self.y_name}: {delta_y:.6g}"
+            text += f", f: {frequency:.6g}"
+        self.cursor_label.setText(text)
+        self.cursor_label.setVisible(True)
+
+
+    def clear_annotations(self):
+        """Hides the annotations and cursors, their items are kept for reuse"""
+        for item in self.cursors + [item for pair in self.annotations for item in pair]:
+            item.setVisible(False)
+        self.next_annotation = 0
+        self.next_cursor = 0
+        self.cursor_label.setVisible(False)
 
 
 
 class PlotLine(pg.PlotCurveItem):
-    """Lineplot object for LinePlotWidget, based on pg.PlotCurveItem"""
-    def __init__(self, name, x_data, y_data, color="red"):
+    """Lineplot object for LinePlotWidget, based on pg.PlotCurveItem.
+       Plotline data is held in ring buffers with the length of the plotline. Buffers hold
+       their data twice in a row, so that the plotted data is always a contiguous view of the
+       buffer and adding a step does not copy the data"""
+    def __init__(self, name, x_data, y_data, color="red", history_length:int=0):
         super().__init__()
         print("PlotLine init: " + name)
 
-        self.x_data = x_data
-        self.y_data = y_data
+        self.capacity = 0
+        self.x_buffer = None
+        self.y_buffer = None
+        self.head = 0           # Buffer index of the oldest value, next step is written over it
+        self.total_steps = 0    # Steps written since the buffers were filled, incl. the fill
+
+        # min/max decimation, steps are reduced in buckets counted from the fill
+        self.bucket_size = 1    # Steps in one bucket, 1 when plotline is not decimated
+        self.reduced_x = None   # Ring buffers of reduced points, two points per bucket
+        self.reduced_y = None
+        self.reduced_head = 0
+        self.reduced_count = 0  # Reduced points in the ring buffers
+        self.reduced_steps = 0  # Steps reduced to complete buckets, multiple of bucket_size
+        self.dirty = False      # Data changed after the previous redraw
+        self.replaced = None    # x and y values given to plotline_update, drawn until next step
+
+        # sliding window maxima of the values and the negated values, for the y-axis range
+        self.window_max = None
+        self.window_min = None
+
+        # history of the whole run, drawn when zoomed out beyond the plotline length
+        self.history = HistoryPyramid(history_length) if history_length > 0 else None
+        self.history_steps = 0  # Steps shown from the history, -1 all, 0 the plotline data
+        self.history_points = 0 # Buckets drawn from the history
+
+        self.fill_buffers(x_data, y_data)
         self.color = color
         self.linetype = "-"
         self.linewidth = 1
@@ -280,18 +699,180 @@ class PlotLine(pg.PlotCurveItem):
         self.setData(self.x_data, self.y_data, pen=self.pen, name=name)
 
 
+    @property
+    def x_data(self):
+        """Plotline x values from the oldest to the newest, view of the ring buffer"""
+        return self.x_buffer[self.head:self.head+self.capacity]
+
+
+    @property
+    def y_data(self):
+        """Plotline y values from the oldest to the newest, view of the ring buffer"""
+        return self.y_buffer[self.head:self.head+self.capacity]
+
+
+    def fill_buffers(self, x_data, y_data):
+        """Replace ring buffer data, buffers are reallocated if the length has changed"""
+        if len(x_data) != self.capacity:
+            self.capacity = len(x_data)
+            self.x_buffer = np.zeros(2*self.capacity)
+            self.y_buffer = np.zeros(2*self.capacity)
+            self.window_max = SlidingMaximum(self.capacity)
+            self.window_min = SlidingMaximum(self.capacity)
+        self.window_max.clear()
+        self.window_min.clear()
+        self.window_max.add(np.asarray(y_data, dtype=float))
+        self.window_min.add(-np.asarray(y_data, dtype=float))
+        self.head = 0
+        self.x_buffer[0:self.capacity] = x_data
+        self.x_buffer[self.capacity:] = x_data
+        self.y_buffer[0:self.capacity] = y_data
+        self.y_buffer[self.capacity:] = y_data
+        self.total_steps = self.capacity
+        self.reset_reduction()
+
+
     def plotline_step(self, y_new, step):
-        """Add new step to plotline"""
-        self.x_data = np.delete(self.x_data,0)
-        self.x_data = np.append(self.x_data,self.x_data[-1]+step)
-        self.y_data = np.delete(self.y_data,0)
-        self.y_data = np.append(self.y_data,y_new)
-        self.setData(self.x_data, self.y_data)
+        """Add new step to plotline, the oldest step is overwritten"""
+        x_new = self.x_buffer[self.head+self.capacity-1] + step
+        self.x_buffer[self.head] = self.x_buffer[self.head+self.capacity] = x_new
+        self.y_buffer[self.head] = self.y_buffer[self.head+self.capacity] = y_new
+        self.head = (self.head+1) % self.capacity
+        self.total_steps += 1
+        self.replaced = None
+        self.window_max.add_value(y_new)
+        self.window_min.add_value(-y_new)
+        if self.history is not None:
+            self.history.add(np.array([x_new]), np.array([y_new], dtype=float))
+        self.dirty = True
+
+
+    def plotline_extend(self, y_values, step):
+        """Add many steps to plotline at once, the oldest steps are overwritten.
+           If there are more steps than the plotline length, only the latest are kept"""
+        count = len(y_values)
+        kept = min(count, self.capacity)
+        x_last = self.x_buffer[self.head+self.capacity-1]
+        if self.history is not None:
+            self.history.add(x_last + step*np.arange(1, count+1), y_values)
+        ring_write(self.x_buffer, self.head, x_last + step*np.arange(count-kept+1, count+1))
+        self.head = ring_write(self.y_buffer, self.head, y_values[count-kept:])
+        self.total_steps += count
+        self.replaced = None
+        self.window_max.add(y_values)
+        self.window_min.add(-y_values)
+        self.dirty = True
+
+
+    def plotline_clear(self, x_data):
+        """Replace plotline data with zeros at the given x values"""
+        self.fill_buffers(x_data, np.zeros(len(x_data)))
+        if self.history is not None:
+            self.history.clear()
+        self.replaced = None
+        self.dirty = True
+
+
+    def set_bucket_size(self, bucket_size:int):
+        """Sets number of steps reduced to one minimum and maximum when the plotline is drawn,
+           1 draws all steps. Bucket is at most a quarter of the plotline length"""
+        bucket_size = max(1, min(int(bucket_size), self.capacity//4))
+        if bucket_size == self.bucket_size:
+            return
+        self.bucket_size = bucket_size
+        self.reset_reduction()
+        self.dirty = True
+
+
+    def set_history_view(self, steps:int, points:int):
+        """Shows the latest steps from the history reduced to about points buckets,
+           -1 steps shows the whole history and 0 the plotline data"""
+        if self.history is None:
+            steps = 0
+        if (int(steps), int(points)) == (self.history_steps, self.history_points):
+            return
+        self.history_steps = int(steps)
+        self.history_points = int(points)
+        self.dirty = True
+
+
+    def reset_reduction(self):
+        """Reduces the complete buckets of the plotline data again, used when the data or
+           the bucket size is replaced"""
+        if self.bucket_size == 1:
+            self.reduced_x = None
+            self.reduced_y = None
+            return
+        points = 2*(self.capacity//self.bucket_size + 1)
+        self.reduced_x = np.zeros(2*points)
+        self.reduced_y = np.zeros(2*points)
+        self.reduced_head = 0
+        self.reduced_count = 0
+        self.reduced_steps = self.first_bucket_step()
+        self.reduce_buckets()
+
+
+    def first_bucket_step(self):
+        """Returns the first step of the first complete bucket in the plotline data"""
+        window_start = self.total_steps - self.capacity
+        return -(-window_start//self.bucket_size)*self.bucket_size
+
+
+    def reduce_buckets(self):
+        """Reduces buckets completed since the previous reduction, only new steps are read"""
+        window_start = self.total_steps - self.capacity
+        start = max(self.reduced_steps, self.first_bucket_step())
+        end = self.total_steps - self.total_steps % self.bucket_size
+        if end <= start:
+            return
+        x_reduced, y_reduced = reduce_min_max(self.x_data[start-window_start:end-window_start],
+                                              self.y_data[start-window_start:end-window_start],
+                                              self.bucket_size)
+        ring_write(self.reduced_x, self.reduced_head, x_reduced)
+        self.reduced_head = ring_write(self.reduced_y, self.reduced_head, y_reduced)
+        self.reduced_count = min(self.reduced_count + len(y_reduced), len(self.reduced_y)//2)
+        self.reduced_steps = end
+
+
+    def redraw(self):
+        """Sets the plotline data to the curve. Decimated plotline is drawn from the reduced
+           buckets and the partial buckets at the start and end of the data"""
+        self.dirty = False
+        if self.replaced is not None:
+            self.setData(*self.replaced)
+            return
+        if self.history_steps != 0:
+            self.setData(*self.history.view(self.history_steps, self.history_points))
+            return
+        if self.bucket_size == 1:
+            self.setData(self.x_data, self.y_data)
+            return
+        self.reduce_buckets()
+        window_start = self.total_steps - self.capacity
+        first = min(self.first_bucket_step(), self.total_steps)
+        last = max(self.reduced_steps, first)
+        points = min(2*((last-first)//self.bucket_size), self.reduced_count)
+        end = self.reduced_head + len(self.reduced_y)//2
+        head_x, head_y = self.partial_bucket(window_start, first)
+        tail_x, tail_y = self.partial_bucket(last, self.total_steps)
+        self.setData(np.concatenate((head_x, self.reduced_x[end-points:end], tail_x)),
+                     np.concatenate((head_y, self.reduced_y[end-points:end], tail_y)))
+
+
+    def partial_bucket(self, start:int, stop:int):
+        """Returns minimum and maximum of the steps from start to stop, which do not form
+           a complete bucket"""
+        if stop <= start:
+            return np.zeros(0), np.zeros(0)
+        window_start = self.total_steps - self.capacity
+        return reduce_min_max(self.x_data[start-window_start:stop-window_start],
+                              self.y_data[start-window_start:stop-window_start], stop-start)
 
 
     def plotline_update(self, x_data, y_data):
-        """Update the complete plotline data"""
-        self.setData(x_data, y_data)
+        """Update the complete plotline data, drawn with the next frame"""
+        self.replaced = (np.array(x_data, dtype=float), np.array(y_data, dtype=float))
+        self.dirty = True
 
 
     def pen_change(self, color, linetype, width):
@@ -309,24 +890,245 @@ class PlotLine(pg.PlotCurveItem):
         self.setPen(self.pen)
 
 
-    def get_y_at_i(self,i):
-        """Return y-axis value at given index"""
-        return float(self.y_data[i])
-
+    def y_limits(self, steps:int):
+        """Return minimum and maximum of the latest steps, or of the drawn history buckets
+           when zoomed out beyond the plotline"""
+        if self.history_steps != 0:
+            y_values = self.getData()[1]
+            if y_values is None or len(y_values) == 0:
+                return 0, 0
+            return np.nanmin(y_values), np.nanmax(y_values)
+        return -self.window_min.maximum(steps), self.window_max.maximum(steps)
 
-    def get_x_at_i(self,i):
-        """Return x-axis value at given index"""
-        return float(self.x_data[i])
 
-
-    def get_i_of_x(self, x, i_round):
-        """Return index of x-axis value, with given rounding"""
-        try:
-            return np.where(np.round(self.x_data,i_round)==x)[0][0]
-        except IndexError:
-            return -1
+    def nearest_points(self, x):
+        """Return x and y values of the drawn points on both sides of x. Plotline steps are
+           searched, or the drawn history buckets when zoomed out beyond the plotline"""
+        if self.history_steps != 0:
+            x_values, y_values = self.getData()
+            if x_values is None:
+                return np.zeros(0), np.zeros(0)
+        else:
+            x_values, y_values = self.x_data, self.y_data
+        i = int(np.searchsorted(x_values, x))
+        return x_values[max(i-1, 0):i+1], y_values[max(i-1, 0):i+1]
 
 
     def get_x_minmax(self, lenght, limit):
         """Return x values for panning"""
         return [self.x_data[int(lenght-limit)], self.x_data[-1]]
+
+
+
+class SlidingMaximum():
+    """Maximum of the latest values in a sliding window of window values, kept with a
+       monotonic deque. Deque holds the values which are greater than all values after them,
+       in decreasing order with their value numbers, in arrays used from first to end.
+       Each value is added to and removed from the deque once, so the maximum is kept in
+       amortized constant time per value. Maximum of any latest part of the window is the
+       first deque value in that part, found with a binary search"""
+    def __init__(self, window:int):
+        self.window = max(1, window)
+        self.numbers = np.zeros(2*self.window+1, dtype=np.int64)
+        self.values = np.zeros(2*self.window+1)
+        self.first = 0
+        self.end = 0
+        self.total = 0          # Values added
+
+
+    def add(self, values):
+        """Adds an array of values, NaN values are ignored"""
+        count = len(values)
+        if count == 0:
+            return
+        values = values[count-min(count, self.window):]
+        kept = ~np.isnan(values)
+        values = np.where(kept, values, -np.inf)
+        later = np.maximum.accumulate(values[::-1])[::-1]
+        kept[:-1] &= values[:-1] > later[1:]
+        numbers = self.total + count - len(values) + np.flatnonzero(kept)
+        values = values[kept]
+        self.total += count
+        if len(values) > 0:
+            # deque values not greater than the largest new value are removed
+            self.end = self.first + int(np.searchsorted(-self.values[self.first:self.end],
+                                                        -values[0]))
+        self.first += int(np.searchsorted(self.numbers[self.first:self.end],
+                                          self.total - self.window))
+        if self.end + len(values) > len(self.values):
+            live = self.end - self.first
+            self.numbers[0:live] = self.numbers[self.first:self.end]
+            self.values[0:live] = self.values[self.first:self.end]
+            self.first, self.end = 0, live
+        self.numbers[self.end:self.end+len(values)] = numbers
+        self.values[self.end:self.end+len(values)] = values
+        self.end += len(values)
+
+
+    def add_value(self, value):
+        """Adds one value, same as add() without the array operations"""
+        self.total += 1
+        if self.first < self.end and self.numbers[self.first] < self.total - self.window:
+            self.first += 1
+        if np.isnan(value):
+            return
+        while self.end > self.first and self.values[self.end-1] <= value:
+            self.end -= 1
+        if self.end == len(self.values):
+            live = self.end - self.first
+            self.numbers[0:live] = self.numbers[self.first:self.end]
+            self.values[0:live] = self.values[self.first:self.end]
+            self.first, self.end = 0, live
+        self.numbers[self.end] = self.total - 1
+        self.values[self.end] = value
+        self.end += 1
+
+
+    def maximum(self, count:int):
+        """Returns maximum of the latest count values, NaN if there are none"""
+        start = self.total - min(count, self.window)
+        i = self.first + int(np.searchsorted(self.numbers[self.first:self.end], start))
+        return self.values[i] if i < self.end else np.nan
+
+
+    def clear(self):
+        """Removes all values"""
+        self.first = 0
+        self.end = 0
+        self.total = 0
+
+
+
+class HistoryLevel():
+    """One level of HistoryPyramid, ring buffers of min/max buckets of bucket_size steps"""
+    def __init__(self, bucket_size:int, buckets:int):
+        self.bucket_size = bucket_size
+        self.buffers = tuple(np.zeros(2*buckets) for _ in range(4))  # x_min, y_min, x_max, y_max
+        self.head = 0
+        self.count = 0          # Buckets in the ring buffers
+        self.written = 0        # Buckets written since clear, older than count are dropped
+        self.carry = None       # Bucket of the lower level waiting for its pair
+
+
+    def add(self, buckets):
+        """Adds buckets of the lower level, each two are combined to one bucket of this level.
+           Returns the buckets written to this level"""
+        if self.carry is not None:
+            buckets = tuple(np.concatenate((carry, values))
+                            for carry, values in zip(self.carry, buckets))
+        paired = len(buckets[0]) - len(buckets[0]) % 2
+        self.carry = tuple(values[paired:] for values in buckets) if paired < len(buckets[0]) \
+                     else None
+        combined = combine_pairs(tuple(values[0:paired] for values in buckets))
+        if len(combined[0]) > 0:
+            for buffer, values in zip(self.buffers, combined):
+                head = ring_write(buffer, self.head, values)
+            self.head = head
+            self.written += len(combined[0])
+            self.count = min(self.written, len(self.buffers[0])//2)
+        return combined
+
+
+    def latest(self, buckets:int):
+        """Returns x and y values of the latest buckets, minimum and maximum of each bucket
+           in the order they occurred"""
+        end = self.head + len(self.buffers[0])//2
+        return self.bucket_points(*(buffer[end-buckets:end] for buffer in self.buffers))
+
+
+    def carried(self):
+        """Returns x and y values of the lower level bucket waiting for its pair, see latest().
+           Its steps are newer than the buckets of this level"""
+        if self.carry is None:
+            return np.zeros(0), np.zeros(0)
+        return self.bucket_points(*self.carry)
+
+
+    @staticmethod
+    def bucket_points(x_min, y_min, x_max, y_max):
+        """Returns x and y values of the buckets, minimum and maximum of each bucket in the
+           order they occurred"""
+        min_first = x_min <= x_max
+        x_values = np.stack((np.where(min_first, x_min, x_max),
+                             np.where(min_first, x_max, x_min)), axis=1)
+        y_values = np.stack((np.where(min_first, y_min, y_max),
+                             np.where(min_first, y_max, y_min)), axis=1)
+        return x_values.ravel(), y_values.ravel()
+
+
+    def clear(self):
+        """Removes all buckets"""
+        self.head = 0
+        self.count = 0
+        self.written = 0
+        self.carry = None
+
+
+
+class HistoryPyramid():
+    """Min/max history of a plotline over the whole run.\n
+       Level k holds buckets of 2^(k+1) steps, each bucket is the minimum and maximum of two
+       buckets of the level below, so adding steps updates each level incrementally. Each level
+       holds at most HISTORY_BUCKETS buckets, the number of levels is chosen so that the top
+       level covers history_length steps. Memory use depends on the number of levels, not on
+       the number of steps. New steps are collected to pending buffers and added to the levels
+       HISTORY_PENDING steps at a time, pending steps are shown as they are."""
+    def __init__(self, history_length:int, buckets:int=HISTORY_BUCKETS):
+        self.buckets = buckets
+        level_count = max(1, int(np.ceil(np.log2(max(history_length/buckets, 1)))))
+        self.levels = [HistoryLevel(2**(k+1), buckets) for k in range(level_count)]
+        self.steps = 0          # Steps added since clear
+        self.pending_x = np.zeros(HISTORY_PENDING)
+        self.pending_y = np.zeros(HISTORY_PENDING)
+        self.pending = 0        # Steps in the pending buffers
+
+
+    def add(self, x_values, y_values):
+        """Adds new steps to the history"""
+        count = len(y_values)
+        self.steps += count
+        if self.pending + count < HISTORY_PENDING:
+            self.pending_x[self.pending:self.pending+count] = x_values
+            self.pending_y[self.pending:self.pending+count] = y_values
+            self.pending += count
+            return
+        x_values = np.concatenate((self.pending_x[0:self.pending], x_values))
+        y_values = np.concatenate((self.pending_y[0:self.pending], y_values))
+        self.pending = 0
+        buckets = (x_values, y_values, x_values, y_values)
+        for level in self.levels:
+            buckets = level.add(buckets)
+            if len(buckets[0]) == 0:
+                break
+
+
+    def view(self, steps:int, points:int):
+        """Returns x and y values of the latest steps, reduced to about points buckets,
+           -1 steps returns the whole history. Level with the smallest buckets covering
+           the steps is used"""
+        steps = self.steps if steps < 0 else min(steps, self.steps)
+        pending = min(steps, self.pending)
+        steps -= pending
+        selected = self.levels[-1]
+        for level in self.levels:
+            covered = level.written <= level.count or steps <= level.bucket_size*level.count
+            if covered and steps <= level.bucket_size*max(points, 1):
+                selected = level
+                break
+        buckets = min(selected.count, -(-steps//selected.bucket_size))
+        # steps carried by the levels up to the selected one are newer than its buckets,
+        # carries of the higher levels are older
+        carrying = self.levels[0:self.levels.index(selected)+1]
+        x_parts, y_parts = zip(selected.latest(buckets),
+                               *(level.carried() for level in reversed(carrying)))
+        start = self.pending - pending
+        return (np.concatenate(x_parts + (self.pending_x[start:self.pending],)),
+                np.concatenate(y_parts + (self.pending_y[start:self.pending],)))
+
+
+    def clear(self):
+        """Removes the history, used when the plotline is cleared"""
+        self.steps = 0
+        self.pending = 0
+        for level in self.levels:
+            level.clear()
@@ -28,13 +28,12 @@ except ImportError:
 import sys
 import os
 import time
-import importlib
 from inspect import getfile, currentframe
 try:
-    from PySide6.QtCore import (Qt, QObject, Signal, QThread, Slot)
+    from PySide6.QtCore import (Qt, QObject, Signal, QThread, Slot, QTimer)
     from PySide6.QtGui import QResizeEvent
     from PySide6.QtWidgets import (QApplication, QMainWindow, QDockWidget,
-                                   QMessageBox, QScrollArea)
+                                   QMessageBox, QScrollArea, QFileDialog, QProgressDialog)
 except ImportError as pyside_error:
     txt_log("PySide6 import error > " + pyside_error)
     sys.exit()
@@ -44,44 +43,42 @@ try:
     import SimuControlPanel
     import SimuMenu
     import UtilityFunctions
+    import SimuChannels
+    import SimuBlocks
+    import SimuBindings
+    import SimuStaging
+    import SimuProcess
+    import SimuRunState
+    import SimuSnapshot
+    import SimuRecorder
+    import SimuExport
+    import SimuRegistry
+    import SimuRender
+    from LinePlotWidget import LinePlotWidget
 except ImportError as simoerror:
     txt_log("Simulator module import error > " + simoerror)
     sys.exit()
 
 
+PREWARM_DELAY = 2000    # Time in ms after startup before pre-warming simulation modules
+
+
+
+def launcher_ready_file(argv):
+    '''Returns the file given by the launcher with --ready-file argument, None if not given.
+       Launcher waits until the file exists and exits when the window has opened'''
+    if "--ready-file" in argv[0:-1]:
+        return argv[argv.index("--ready-file")+1]
+    return None
 
-def import_simulations(parent):
-    '''Import simulation modules given in the simulation_list.json.\n
-       Returns a dict with module name as key'''
-    simu_modul = {}
-    module_fail_names = ""
-    own_location = os.path.dirname(os.path.abspath(getfile(currentframe())))
-    simulation_info = UtilityFunctions.open_json_file("Simulation_list.json",
-                                            own_location + "/Simulation_files")
-    for subj in simulation_info["subjects"].keys():
-        for simu in simulation_info["subjects"][str(subj)].keys():
-            module_name = simulation_info["subjects"][str(subj)][str(simu)]["filename"][0:-3]
-            full_module_name = "Simulation_files." + str(module_name)
-            try:
-                simu_modul[str(module_name)] = importlib.import_module(full_module_name,
-                                                                       package=None)
-            except ModuleNotFoundError as error:
-                module_fail_names += (str(module_name) + " (not found)" + "\n")
-                UtilityFunctions.txt_log("Simulation import error, " + str(module_name)
-                                         + " not found > " + str(error))
-            except Exception as error:
-                module_fail_names += (str(module_name) + " (error)" + "\n")
-                UtilityFunctions.txt_log("Simulation import error " + str(module_name)
-                                         + " general error > " + str(error))
-
-    if len(module_fail_names) > 0:
-        error_dialog = SimuMenu.WarningDialog(parent=parent,
-                                title="Import error",
-                                message="Import of simulation modules failed: \n \n"
-                                + module_fail_names,
-                                icon=QMessageBox.Warning)
-        error_dialog.exec()
-    return simu_modul
+
+def write_ready_file(filename):
+    '''Creates the ready file of the launcher'''
+    try:
+        with open(filename, "w", encoding="utf-8"):
+            pass
+    except OSError as error:
+        UtilityFunctions.txt_log("Launcher ready file error > " + str(error))
 
 
 
@@ -89,7 +86,8 @@ class SimuSignals(QObject):
     '''Simulationflow control signals'''
     start_run = Signal(bool)
     continue_pause = Signal(bool)
-    step_data = Signal(list)
+    step_data = Signal(object)
+    thread_step_data = Signal(int, object)
     update_inputs = Signal(bool)
 
     close_simulation = Signal(bool)
@@ -97,10 +95,60 @@ class SimuSignals(QObject):
     graphing_interval_change = Signal(int)
 
     simulation_error = Signal(list)
-    terminate_computation = Signal(bool)
 
     update_progress_bar = Signal(bool)
 
+    create_simulator = Signal(object)
+    release_simulator = Signal(bool)
+
+
+
+class SimulationWorker(QObject):
+    '''Simulator host living in the simulation thread.\n
+       The thread and the worker are created once and kept for the whole session, simulator
+       objects are created, run and released in the thread when simulations are opened, reset
+       and closed.'''
+    def __init__(self, parent):
+        super().__init__()
+        self.main_window = parent
+        self.simulation = None
+
+
+    @Slot(object)
+    def create(self, module):
+        '''Creates simulator object of the given simulation module,
+           simulation is None if the simulator cannot be created'''
+        try:
+            self.simulation = module.simulator(self.main_window,
+                                               self.main_window.parameter,
+                                               self.main_window.simulation_control_signals,
+                                               self.main_window.send_to_graph)
+        except Exception as error:
+            UtilityFunctions.txt_log("Simulator creation error > " + str(error))
+            self.simulation = None
+            return
+        self.main_window.save_snapshot("initial")
+
+
+    @Slot(bool)
+    def run(self, _):
+        '''Runs the simulator loop, returns when the simulation is released.
+           Simulators with step_block() are run in blocks, see SimuBlocks'''
+        if self.simulation is None:
+            return
+        if SimuBlocks.has_step_block(self.simulation):
+            SimuBlocks.run_blocks(self.simulation,
+                                  self.main_window.simulation_block_control,
+                                  self.main_window.send_block)
+        else:
+            self.simulation.run(False)
+
+
+    @Slot(bool)
+    def release(self, _):
+        '''Releases the simulator object, executed after its run loop has returned'''
+        self.simulation = None
+
 
 
 class MainWindow(QMainWindow):
@@ -109,7 +157,9 @@ class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
 
-        self.simu_modul = import_simulations(self)
+        # simulation modules are imported when opened, startup menu uses the cached manifest
+        self.registry = SimuRegistry.SimulationRegistry(self.location + "/Simulation_files",
+                                                        self.location)
 
         self.setWindowTitle("SFDEsim Simulator")
         app = QApplication.instance()
@@ -128,7 +178,12 @@ class MainWindow(QMainWindow):
                         icon=QMessageBox.Warning)
             error_dialog.exec()
             self.settings_dict = {
-                "speed_timings": [0.1, 0.0030]
+                "speed_timings": [0.1, 0.0030],
+                "execution_mode": "thread",
+                "prewarm_count": 2,
+                "record_data": False,
+                "compress_recording": False,
+                "render_rate": SimuRender.RENDER_RATE
                 }
 
         self.simulation_control_signals = SimuSignals()
@@ -136,18 +191,50 @@ class MainWindow(QMainWindow):
         self.simulation_control_signals.simulation_error.connect(self.show_error_message)
         self.simulation_open = False
         self.simulation_speed_limits = self.settings_dict["speed_timings"]
+        # "process" runs process safe simulations in a worker process, others use a thread
+        self.execution_mode = self.settings_dict.get("execution_mode", "thread")
+        # channel values of every step are recorded to disk, see SimuRecorder
+        self.record_data = self.settings_dict.get("record_data", False)
+        # recorded steps are written to a compressed archive, see SimuArchive
+        self.compress_recording = self.settings_dict.get("compress_recording", False)
+        # graphs are drawn at most render_rate times per second, see SimuRender
+        self.render_rate = self.settings_dict.get("render_rate", SimuRender.RENDER_RATE)
+        SimuRender.render_scheduler().set_frame_rate(self.render_rate)
+        self.process_mode = False
         self.simulation_delay = round(((self.simulation_speed_limits[0]-
                                        self.simulation_speed_limits[1])/4)*3,4)
-        self.simulation_running = False
-        self.terminate_computation = False
+        self.run_state = SimuRunState.RunState()
+        self.snapshots = {}             # Snapshots of the simulator in thread mode
+        self.checkpoints = None         # Checkpoints for rewinding in thread mode
+        self.replay_until = None        # Rewind target time while simulating to it
+        self.update_stager = None       # Computes input updates in thread mode
+        self.recorder = None            # Records steps in thread mode, SimuRecorder.RunRecorder
+        self.recording_directory = None # Session directory of the recorded steps
+        self.export_job = None          # Data export running in the background
+        self.export_dialog = None
         self.open_simu_filename = ""
         self.simu_interval_step = 0
-        self.start_graphing = False
-        self.graphing_pause = False
-        self.taking_step = False
         self.simu_graph_step_error = 0
+        self.graph_generation = 0       # Thread mode steps sent with older generation are not drawn
         self.parameter_view_size = 240
 
+        # simulation thread and worker are kept for the session, signals are connected once
+        self.simulation_thread = QThread()
+        self.simulation_worker = SimulationWorker(self)
+        self.simulation_worker.moveToThread(self.simulation_thread)
+        self.simulation_control_signals.start_run.connect(self.simulation_worker.run)
+        self.simulation_control_signals.create_simulator.connect(self.simulation_worker.create,
+                                                                 Qt.BlockingQueuedConnection)
+        self.simulation_control_signals.release_simulator.connect(self.simulation_worker.release,
+                                                                  Qt.BlockingQueuedConnection)
+        self.simulation_control_signals.continue_pause.connect(self.simu_run_pause)
+        self.simulation_control_signals.step_data.connect(self.graph_step)
+        self.simulation_control_signals.thread_step_data.connect(self.thread_graph_step)
+        self.simulation_control_signals.graphing_interval_change.connect(
+            self.change_graphing_interval)
+        self.simulation_thread.start()
+        self.simulation_process = None      # worker process, started when first needed
+
 
         self.startup_menu_widget = MainViewWidget.StartUp(self)
         self.scroll_startup_menu_widget = QScrollArea(self)
@@ -174,6 +261,10 @@ class MainWindow(QMainWindow):
         self.dock_widget.visibilityChanged.connect(self.menu_bar.enable_dock_button)
         self.addDockWidget(Qt.LeftDockWidgetArea, self.dock_widget)
 
+        # most often opened simulations are imported in the background after startup
+        prewarm_count = self.settings_dict.get("prewarm_count", 0)
+        QTimer.singleShot(PREWARM_DELAY, lambda: self.registry.prewarm(prewarm_count))
+
 
 
     def open_simulation(self, filename):
@@ -181,37 +272,28 @@ class MainWindow(QMainWindow):
         UtilityFunctions.txt_log("opening simulation" + str(filename[0:-3]))
         self.open_simu_filename = filename
 
-        #Simulation parameter object init
+        #Simulation module import and parameter object init
         try:
-            self.parameter = self.simu_modul[str(filename[0:-3])].parameters()
+            self.simulation_module = self.registry.module(str(filename[0:-3]))
+            self.parameter = self.simulation_module.parameters()
         except Exception as error:
-            txt_log("Simulation opening error > ", str(error))
+            txt_log("Simulation opening error > " + str(error))
             error_dialog = SimuMenu.WarningDialog(title="Simulation error",
-                    message="Simulation you're trying to open ("+ str(error) +") is not imported",
+                    message="Simulation you're trying to open ("+ str(error) +") cannot be imported",
                     parent=self,
                     icon=QMessageBox.Critical)
             error_dialog.exec()
             self.open_simu_filename = ""
             return
+        self.registry.record_open(str(filename[0:-3]))
 
-        self.simulation_control_signals.continue_pause.connect(self.simu_run_pause)
-        self.simulation_control_signals.terminate_computation.emit(False)
-
-        # simulator object initialization and threading
-        self.simulation = self.simu_modul[str(filename[0:-3])].simulator(self,
-                                                                self.parameter,
-                                                                self.simulation_control_signals,
-                                                                self.send_to_graph)
-        self.simulation_thread = QThread()
-        self.simulation_control_signals.start_run.connect(self.simulation.run)
-        self.simulation.moveToThread(self.simulation_thread)
-        self.simulation_thread.start()
+        self.start_simulator(filename)
 
         # simulator graphics object initialization
-        self.simulation_view = self.simu_modul[str(filename[0:-3])].graphicsViewWidget(self,
-                                                                        self.parameter,
-                                                                        self.graphing_flow_control)
-        self.simulation_control_signals.step_data.connect(self.simulation_view.update)
+        SimuRender.render_scheduler().clear()
+        self.simulation_view = self.simulation_module.graphicsViewWidget(self,
+                                                                    self.parameter,
+                                                                    self.graphing_flow_control)
         self.setCentralWidget(self.simulation_view)
 
         self.simu_control.simu_opened_closed(True)
@@ -219,12 +301,19 @@ class MainWindow(QMainWindow):
                                          filename,
                                          self.parameter.graphing_interval,
                                          self.parameter.steptime)
-        self.simulation_control_signals.graphing_interval_change.connect(self.change_graphing_interval)
 
         self.simulation_open = True
 
+        # simulator run loop is started once and waits in simulation_flow_control() while stopped
         self.simulation_control_signals.start_run.emit(False)
 
+        self.open_parameter_view()
+
+        self.setWindowTitle("SFDEsim Simulator - " + self.parameter.simulation_name)
+
+
+    def open_parameter_view(self):
+        '''Creates the parameter edit widgets of the open simulation to the dock'''
         self.parameter_view = SimuParameterWidget.SimuParameters(self,
                                                                  self.parameter.input_parameters)
         self.scroll_dock_widget = QScrollArea(self)
@@ -232,17 +321,16 @@ class MainWindow(QMainWindow):
         self.scroll_dock_widget.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
         self.scroll_dock_widget.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
         self.scroll_dock_widget.setWidgetResizable(False)
-        self.dock_widget.setWidget(self.scroll_dock_widget)
+        self.set_dock_widget(self.scroll_dock_widget)
         self.dock_widget.setMinimumWidth(self.parameter_view_size)
         self.simulation_control_signals.allow_full_parameter_edit.emit(not self.menu_bar.adv_edit_enabled)
 
-        self.setWindowTitle("SFDEsim Simulator - " + self.parameter.simulation_name)
-
 
 
     def close_simulation(self):
         '''Simulation closing function, re-opens startUp widgets'''
-        self.simulation_thread.terminate()
+        self.stop_simulation()
+        SimuRender.render_scheduler().clear()
         self.startup_menu_widget = MainViewWidget.StartUp(self)
         self.scroll_startup_menu_widget = QScrollArea(self)
         self.scroll_startup_menu_widget.setWidget(self.startup_menu_widget)
@@ -252,7 +340,7 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(self.scroll_startup_menu_widget)
 
         self.dock_startup = SimuParameterWidget.StartUp(self)
-        self.dock_widget.setWidget(self.dock_startup)
+        self.set_dock_widget(self.dock_startup)
         self.dock_widget.setMinimumWidth(140)
 
         self.simu_control.simu_opened_closed(False)
@@ -264,76 +352,415 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("SFDEsim Simulator")
 
 
+    def reset_simulation(self):
+        '''Resets simulation by restoring the snapshot captured when the simulator was created,
+           graphs are cleared and parameters are set to their initial values.
+           Simulator and views are recreated if the snapshot cannot be restored'''
+        if self.restore_snapshot("initial"):
+            for graph in self.simulation_view.findChildren(LinePlotWidget):
+                graph.clear()
+            return
+        filename = self.open_simu_filename
+        self.stop_simulation()
+        self.simulation_open = False
+        self.open_simulation(filename)
+
+
+    def reload_simulation(self):
+        '''Imports the edited simulation module again and replaces the simulator with one of the
+           reloaded module. Compatible simulator state, inputs and simulation time are migrated
+           to the new simulator, see SimuSnapshot.Snapshot.migrate(). Simulation view is
+           created again, the parameter widgets only if the input parameters have changed.
+           Previous simulation is kept if the module cannot be imported'''
+        if not self.simulation_open:
+            return
+        self.set_run_state(SimuRunState.STOPPED)
+        filename = self.open_simu_filename
+        try:
+            module = self.registry.reload(str(filename[0:-3]))
+            parameter = module.parameters()
+        except Exception as error:
+            txt_log("Simulation reload error > " + str(error))
+            error_dialog = SimuMenu.WarningDialog(title="Simulation error",
+                    message="Simulation cannot be reloaded ("+ str(error) +")",
+                    parent=self,
+                    icon=QMessageBox.Critical)
+            error_dialog.exec()
+            return
+        self.simulation_module = module
+        previous_inputs = self.parameter.input_parameters
+
+        if self.process_mode:
+            self.parameter = parameter
+            try:
+                self.simulation.reload(str(filename[0:-3]), self.parameter, self.simulation_delay)
+            except RuntimeError as error:
+                self.reload_failed(error)
+                return
+            self.start_recording()
+        else:
+            snapshot = None
+            if self.run_state.call(lambda: self.save_snapshot("reload")):
+                snapshot = self.snapshots["reload"]
+            self.stop_simulation()
+            self.parameter = parameter
+            self.start_simulator(filename)
+            if self.simulation is None:
+                self.reload_failed("simulator cannot be created")
+                return
+            if snapshot is not None:
+                def migrate():
+                    snapshot.migrate(self.simulation, self.parameter)
+                    self.simulation.update_matrixes()
+                # errors of the edited simulation are logged by the simulator thread
+                if not self.run_state.call(migrate):
+                    self.reload_failed("simulator state cannot be migrated, see log")
+                    return
+
+        self.simu_interval_step = 0
+        SimuRender.render_scheduler().clear()
+        self.simulation_view = self.simulation_module.graphicsViewWidget(self,
+                                                                    self.parameter,
+                                                                    self.graphing_flow_control)
+        self.setCentralWidget(self.simulation_view)
+        if self.parameter.input_parameters != previous_inputs:
+            self.open_parameter_view()
+        self.simulation_restored()
+        self.menu_bar.simu_opened_closed(True,
+                                         filename,
+                                         self.parameter.graphing_interval,
+                                         self.parameter.steptime)
+        self.setWindowTitle("SFDEsim Simulator - " + self.parameter.simulation_name)
+        UtilityFunctions.txt_log("reloaded simulation " + str(filename[0:-3]))
+
+
+    def reload_failed(self, error):
+        '''Shows error of the reloaded simulator and closes the simulation'''
+        txt_log("Simulation reload error > " + str(error))
+        error_dialog = SimuMenu.WarningDialog(title="Simulation error",
+                message="Reloaded simulation cannot be started ("+ str(error) +")",
+                parent=self,
+                icon=QMessageBox.Critical)
+        error_dialog.exec()
+        self.close_simulation()
+
+
+    def start_simulator(self, filename):
+        '''Creates simulator object in the simulation thread or in the worker process,
+           and starts its run loop'''
+        module = self.simulation_module
+        self.run_state = SimuRunState.RunState()
+        self.snapshots = {}
+        self.checkpoints = None
+        self.replay_until = None
+        self.simu_interval_step = 0
+        self.process_mode = False
+        self.update_stager = None
+        if self.execution_mode == "process" and SimuProcess.is_process_safe(module):
+            try:
+                if self.simulation_process is None:
+                    self.simulation_process = SimuProcess.SimulationProcess(
+                                                    self.simulation_control_signals)
+                self.simulation_process.open(str(filename[0:-3]),
+                                             self.parameter,
+                                             self.simulation_delay)
+                self.simulation = self.simulation_process
+                self.process_mode = True
+            except RuntimeError as error:
+                UtilityFunctions.txt_log("Simulation process error, using thread > " + str(error))
+        self.start_recording()
+        if not self.process_mode:
+            self.checkpoints = SimuSnapshot.CheckpointRing(self.parameter)
+            self.simulation_control_signals.create_simulator.emit(module)
+            self.simulation = self.simulation_worker.simulation
+            if self.simulation is not None:
+                self.update_stager = SimuStaging.UpdateStager(self.simulation, self.parameter,
+                                                              self.run_state,
+                                                              self.request_checkpoint)
+            # simulator run loop is started once and waits in simulation_flow_control()
+            self.simulation_control_signals.start_run.emit(False)
+
+
+    def start_recording(self):
+        '''Starts recording the steps to a new session directory if recording is enabled,
+           in the worker process in process mode'''
+        self.recorder = None
+        self.recording_directory = None
+        self.menu_bar.export_data_full.setEnabled(self.record_data)
+        if not self.record_data:
+            return
+        self.recording_directory = SimuRecorder.session_directory(self.location,
+                                                                  self.parameter.simulation_name)
+        if self.process_mode:
+            self.simulation.record(self.recording_directory, self.compress_recording)
+        else:
+            self.recorder = SimuRecorder.RunRecorder(self.recording_directory,
+                                                     self.compress_recording)
+
+
+    def export_data(self, full_data:bool):
+        '''Exports the data shown in the graphs, or every recorded step if full_data is True,
+           to a CSV or NPY file selected by the user, see SimuExport. File is written in the
+           background while a progress dialog is shown, export can be cancelled'''
+        if not self.simulation_open or self.export_job is not None:
+            return
+        if full_data:
+            if self.recording_directory is None:
+                return
+            # buffered steps are written in the simulator thread
+            if self.recorder is not None and not self.run_state.call(self.recorder.flush):
+                txt_log("Recording not flushed, simulator not responding")
+            try:
+                recording = SimuRecorder.open_recording(self.recording_directory)
+            except (OSError, ValueError) as error:
+                txt_log("Recording open error > " + str(error))
+                SimuMenu.WarningDialog(parent=self, title="Export error",
+                                       message="No steps have been recorded yet",
+                                       icon=QMessageBox.Warning).exec()
+                return
+            source = SimuExport.RecordingSource(recording)
+        else:
+            columns = {}
+            for graph in self.simulation_view.findChildren(LinePlotWidget):
+                for name, (x_data, y_data) in graph.visible_data().items():
+                    column = graph.graph_name + " " + name
+                    while column + " x" in columns:
+                        column += "_"
+                    columns[column + " x"] = x_data
+                    columns[column + " y"] = y_data
+            source = SimuExport.GraphSource(columns)
+
+        location = self.recording_directory if self.recording_directory else self.location
+        default = os.path.join(location, self.parameter.simulation_name.replace(" ", "_") + ".csv")
+        filename, _ = QFileDialog.getSaveFileName(self, "Export data", default,
+                                                  "CSV (*.csv);;NumPy array (*.npy)")
+        if not filename:
+            return
+        self.export_job = SimuExport.ExportJob(filename, source)
+        self.export_dialog = QProgressDialog("Exporting " + os.path.basename(filename),
+                                             "Cancel", 0, 100, self)
+        self.export_dialog.setWindowTitle("Export data")
+        self.export_dialog.setMinimumDuration(0)
+        self.export_dialog.canceled.connect(self.export_job.cancel)
+        self.export_job.progress.connect(self.export_dialog.setValue)
+        self.export_job.finished.connect(self.export_finished)
+        self.export_job.start()
+
+
+    @Slot(bool, str)
+    def export_finished(self, completed:bool, message:str):
+        '''Closes the export progress dialog, shows error if the export failed'''
+        cancelled = self.export_job.cancelled
+        self.export_job = None
+        self.export_dialog.close()
+        self.export_dialog = None
+        UtilityFunctions.txt_log(message)
+        if not completed and not cancelled:
+            SimuMenu.WarningDialog(parent=self, title="Export error", message=message,
+                                   icon=QMessageBox.Critical).exec()
+
+
+    def stop_simulation(self):
+        '''Stops and releases the simulator, the simulation thread and process are kept.
+           Simulator run loop returns when it is released from waiting'''
+        self.run_state.close()
+        if self.update_stager is not None:
+            self.update_stager.close()
+            self.update_stager = None
+        if self.process_mode:
+            self.simulation.release()
+        else:
+            self.simulation_control_signals.release_simulator.emit(False)
+            # graphing steps sent before stopping are not drawn
+            self.graph_generation += 1
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        self.simulation = None
+        self.snapshots = {}
+        self.checkpoints = None
+        self.process_mode = False
+
+
+    def save_snapshot(self, name:str):
+        '''Captures snapshot of the simulator state with the given name, see SimuSnapshot.
+           Executed in the simulator thread, simulators can save snapshots in their run loop'''
+        self.snapshots[name] = SimuSnapshot.Snapshot(self.simulation_worker.simulation,
+                                                     self.parameter)
+        self.checkpoints.request()
+
+
+    def restore_snapshot(self, name:str):
+        '''Stops the simulation and restores the snapshot of the given name.
+           Snapshot is restored in the simulator thread or the worker process between steps,
+           graphing steps sent before it are not drawn. Parameter inputs are set to the
+           restored values and simulation_restored(name) of the view is called if it exists.
+           Returns True if the snapshot was restored'''
+        if not self.simulation_open:
+            return False
+        self.set_run_state(SimuRunState.STOPPED)
+        if self.process_mode:
+            restored = self.simulation.restore_snapshot(name)
+        else:
+            if name not in self.snapshots:
+                return False
+            snapshot = self.snapshots[name]
+            def restore():
+                snapshot.restore(self.simulation, self.parameter)
+                self.checkpoints.discard_after(snapshot.simulation_time)
+                if self.recorder is not None:
+                    self.recorder.discard_after(snapshot.simulation_time)
+                # graphing steps sent before restoring are not drawn
+                self.graph_generation += 1
+            restored = self.run_state.call(restore)
+            self.run_state.graph_drawn()
+        if not restored:
+            return False
+        self.simulation_restored()
+        if hasattr(self.simulation_view, "simulation_restored"):
+            self.simulation_view.simulation_restored(name)
+        return True
+
+
+    def rewind(self, target_time:float):
+        '''Returns the simulation to the given time. The nearest checkpoint before the time is
+           restored and simulation is run to the target time without delay or graphing,
+           the step at the target time is graphed and the simulation stops.
+           Returns True if the simulation was rewound'''
+        if not self.simulation_open:
+            return False
+        self.set_run_state(SimuRunState.STOPPED)
+        if self.process_mode:
+            restored = self.simulation.rewind(target_time)
+        else:
+            checkpoint = self.checkpoints.nearest(target_time)
+            if checkpoint is None:
+                return False
+            def restore():
+                checkpoint.restore(self.simulation, self.parameter)
+                self.checkpoints.discard_after(checkpoint.simulation_time)
+                if self.recorder is not None:
+                    self.recorder.discard_after(checkpoint.simulation_time)
+                self.replay_until = target_time
+                self.graph_generation += 1
+            restored = self.run_state.call(restore)
+            self.run_state.graph_drawn()
+        if not restored:
+            return False
+        self.simulation_restored()
+        self.set_run_state(SimuRunState.STEPPING)
+        return True
+
+
+    def rewind_range(self):
+        '''Returns the earliest time the simulation can be rewound to and the current time,
+           None if there are no checkpoints'''
+        if not self.simulation_open:
+            return None
+        if self.process_mode:
+            start_time = self.simulation.checkpoint_start
+        else:
+            start_time = self.checkpoints.start_time()
+        if start_time is None:
+            return None
+        return start_time, self.parameter.simulation_time
+
+
+    def simulation_restored(self):
+        '''Updates parameter inputs and progress after the simulator state has been restored'''
+        self.simu_interval_step = 0
+        if self.update_stager is not None:
+            self.update_stager.sync()
+        self.parameter_view.set_values(self.simulation.input_variables,
+                                       self.simulation.input_texts)
+        self.simu_control.progress_bar(False)
+
+
+    def shutdown(self):
+        '''Stops the simulation thread and the worker process at the end of the session'''
+        if self.simulation_open:
+            self.stop_simulation()
+            self.simulation_open = False
+        if self.simulation_process is not None:
+            self.simulation_process.close()
+        self.simulation_thread.quit()
+        self.simulation_thread.wait()
+
+
+    def set_dock_widget(self, widget):
+        '''Replaces the dock widget content, previous content is deleted'''
+        previous = self.dock_widget.widget()
+        self.dock_widget.setWidget(widget)
+        if previous is not None:
+            previous.deleteLater()
+
+
     @Slot(bool)
     def simu_run_pause(self, inp):
         '''Simulation pause slot, True input continues running simulation,
            False input pauses simulation'''
-        self.simulation_running = inp
-        self.menu_bar.simu_running_stopped(inp)
-        self.simu_control.simu_running_stopped(inp)
         if inp:
-            self.simulation_control_signals.start_run.emit(False)
+            self.set_run_state(SimuRunState.RUNNING)
+        else:
+            self.set_run_state(SimuRunState.STOPPED)
+
+
+    def set_run_state(self, state:int):
+        '''Sets simulation run state, see SimuRunState.
+           Updates menus and wakes the simulator waiting for the state change'''
+        running = state != SimuRunState.STOPPED
+        self.menu_bar.simu_running_stopped(running)
+        self.simu_control.simu_running_stopped(running)
+        self.run_state.set(state)
+        if self.process_mode:
+            self.simulation.set_state(state)
 
 
     @Slot(bool)
     def update_inputs(self,inp):
         '''Simulation input value update. Slot input true when update is manual.
-        When Signal received, loops through all input parameters and updates new values,
-        lastly executes update_matrixes() method to update values into calculation matrixes
-        or singular variables, and does variable update calculations'''
-        i_num = 0       # index offset of input_varables
-        i_text = 0      # index offset of input_texts
-        no_pref = 0     # index offset for non-prefix inputs
-        if self.simu_control.updating_checkbox.isChecked():     #if auto update is ON
-            for i,val in enumerate(self.parameter_view.value_inputs):
-                if self.parameter_view.type_list[i] == "number":
-                    if i in set(self.parameter_view.prefix_indexes):
-                        # Refix indexes holds which input indexes have prefix selector
-                        pref_str = self.parameter_view.prefix_inputs[i-no_pref].currentText()
-                        unit = (self.parameter.input_parameters
-                                [list(self.parameter.input_parameters.keys())[i]]["unit"])
-                        pref_val = UtilityFunctions.resolve_unit_prefix(pref_str.replace(unit,""))
-                    else:
-                        pref_val = 0
-                        no_pref += 1
-                    self.simulation.input_variables[i+i_num] = (val.value()*(10**pref_val))
-                    i_text -= 1
-                elif self.parameter_view.type_list[i] == "dropdown":
-                    self.simulation.input_texts[i+i_text] = val.currentText()
-                    i_num -= 1
-                    no_pref += 1
-
-            self.simulation.update_matrixes()
-
-        else:                                                   #if auto update is off
-            if inp:
-                for i,val in enumerate(self.parameter_view.value_inputs):
-                    if self.parameter_view.type_list[i] == "number":
-                        if i in set(self.parameter_view.prefix_indexes):
-                        # Refix indexes holds which input indexes have prefix selector
-                            pref_str = self.parameter_view.prefix_inputs[i-no_pref].currentText()
-                            unit = (self.parameter.input_parameters
-                                    [list(self.parameter.input_parameters.keys())[i]]["unit"])
-                            pref_val = UtilityFunctions.resolve_unit_prefix(pref_str.replace(unit,""))
-                        else:
-                            pref_val = 0
-                            no_pref += 1
-                        self.simulation.input_variables[i+i_num] = (val.value()*(10**pref_val))
-                        i_text -= 1
-                    elif self.parameter_view.type_list[i] == "dropdown":
-                        self.simulation.input_texts[i+i_text] = val.currentText()
-                        i_num -= 1
-                        no_pref += 1
-
-                self.simulation.update_matrixes()
+        When Signal received, changed input values are read with the binding table of the
+        parameter view, and the update methods depending on them are executed, see SimuBindings.
+        Manual update executes the whole update_matrixes().
+        Updates are computed in the background and committed to the simulator between steps,
+        in the simulation thread by SimuStaging and in the worker process by the worker'''
+        if not inp and not self.simu_control.updating_checkbox.isChecked():
+            return
+        if self.process_mode:
+            changed = self.parameter_view.bindings.read(self.simulation.input_variables,
+                                                        self.simulation.input_texts)
+        elif self.update_stager is not None:
+            changed = self.update_stager.read(self.parameter_view.bindings)
+        else:
+            return
+        if inp:
+            changed = None
+        elif not changed:
+            return
+        if self.process_mode:
+            self.simulation.update_matrixes(changed)
+            self.request_checkpoint()
+        else:
+            self.update_stager.submit(changed)
+
+
+    def request_checkpoint(self):
+        '''Requests checkpoint at the next step after inputs have changed, in process mode
+           the worker takes it when it receives the inputs'''
+        if self.checkpoints is not None:
+            self.checkpoints.request()
 
 
 
     def take_step(self):
         '''Activates simulation for one graphing step.
         Simulation is set to run and paused by graphing_flow_control() when step has been drawn'''
-        self.taking_step = True
-        self.simu_run_pause(True)
+        self.set_run_state(SimuRunState.STEPPING)
+
+
+    def fast_forward(self):
+        '''Runs simulation without step delay, graphs are updated when they are free'''
+        self.set_run_state(SimuRunState.FAST_FORWARD)
 
 
 
@@ -352,66 +779,154 @@ class MainWindow(QMainWindow):
         elif delay < self.simulation_speed_limits[1]:
             delay = self.simulation_speed_limits[1]
         self.simulation_delay = delay
+        if self.simulation_open and self.process_mode:
+            self.simulation.set_delay(delay)
 
 
 
     def simulation_flow_control(self):
         '''Controls simulation flow, including pausing and speed.\n
            Must be included in simulation loop to avoid crashind due thread desychnronization.
-           Pauses simulation calculations if 90 % of the graphing interval is reached before graphs
-           are updated.'''
-        self.parameter.simulation_time += self.parameter.steptime
-        if self.start_graphing:
-            if self.simu_interval_step >= 0.9*self.parameter.graphing_interval:
-                self.simu_run_pause(False)
-                self.graphing_pause = True
-        if not self.simulation_running: # is this needed?
-            time.sleep(0.25)
+           Waits while simulation is stopped, and if 90 % of the graphing interval is reached
+           before graphs are updated. Takes checkpoints for rewinding between steps.
+           Returns False when simulation is closed.'''
+        if not self.run_state.ready(self.simu_interval_step >= 0.9*self.parameter.graphing_interval):
             return False
-        time.sleep(self.simulation_delay)
+        if self.checkpoints.due(self.parameter.simulation_time):
+            self.checkpoints.add(self.simulation_worker.simulation, self.parameter)
+        self.parameter.simulation_time += self.parameter.steptime
+        if self.replay_until is not None:
+            # rewinding, steps before the target time are not delayed or graphed
+            if self.parameter.simulation_time < self.replay_until - self.parameter.steptime/2:
+                return True
+            self.replay_until = None
+            self.simu_interval_step = self.parameter.graphing_interval - 1
+        elif self.run_state.state != SimuRunState.FAST_FORWARD:
+            time.sleep(self.simulation_delay)
         self.simulation_control_signals.update_progress_bar.emit(False)
         return True
 
 
-
-    def send_to_graph(self, a_list:list):
+    def simulation_block_control(self):
+        '''Block counterpart of simulation_flow_control() for simulators with step_block(),
+           see SimuBlocks. Waits while simulation is stopped and takes checkpoints between
+           blocks. Returns number of steps in the next block, 0 when simulation is closed'''
+        if not self.run_state.ready(self.simu_interval_step >= SimuBlocks.GRAPH_WAIT_RATIO*
+                                    self.parameter.graphing_interval):
+            return 0
+        if self.checkpoints.due(self.parameter.simulation_time):
+            self.checkpoints.add(self.simulation_worker.simulation, self.parameter)
+        if self.replay_until is not None:
+            # rewinding, steps before the target time are computed in blocks without graphing
+            steps = SimuBlocks.replay_steps(self.parameter, self.replay_until)
+            if steps > 1:
+                return min(steps - 1, SimuBlocks.BLOCK_STEPS)
+            self.replay_until = None
+            self.simu_interval_step = self.parameter.graphing_interval - 1
+            return 1
+        delay = self.simulation_delay
+        if self.run_state.state == SimuRunState.FAST_FORWARD:
+            delay = 0
+        return SimuBlocks.block_size(self.simu_interval_step, self.parameter.graphing_interval,
+                                     delay)
+
+
+
+    def send_to_graph(self, a_list):
         '''Auxilary simulation method, executed at the end of simulation slot to
         transfer computed data to graphs
-        Input is a list consisting of varibles to be transfered to graphing Slot
+        Input is a list consisting of varibles to be transfered to graphing Slot,
+        or SimuChannels.ChannelSet, which is sent as ChannelFrame of its current values.
         Acts as abstraction for simulation module.
-        Only sends data to graph when graphing interval is reached'''
+        Only sends data to graph when graphing interval is reached, ChannelSet values of the
+        steps in between are aggregated to the sent frame.
+        In fast forward graphing steps are skipped while the previous one is being drawn,
+        while rewinding nothing is sent. ChannelSet values of every step are recorded when
+        recording is enabled'''
+        if self.recorder is not None and isinstance(a_list, SimuChannels.ChannelSet):
+            self.recorder.record_step(a_list, self.parameter.simulation_time)
+        if self.replay_until is not None:
+            return
+        if isinstance(a_list, SimuChannels.ChannelSet):
+            a_list.accumulate()
         self.simu_interval_step += 1
         if self.simu_interval_step >= self.parameter.graphing_interval:
-            self.start_graphing = True
-            self.simulation_control_signals.step_data.emit(a_list)
-            self.simu_interval_step = 0
+            self.send_graph_step(a_list)
+
+
+    def send_block(self, channels, values):
+        '''Block counterpart of send_to_graph(), values holds the channel values of the steps
+           computed with step_block(). Advances simulation time over the block, sleeps the
+           step delay of the block and sends the aggregated ChannelSet to the graphs when the
+           graphing interval is reached. Steps are recorded when recording is enabled'''
+        if len(values) == 0:
+            return
+        times = SimuBlocks.step_times(self.parameter, len(values))
+        self.parameter.simulation_time = times[-1]
+        if self.recorder is not None:
+            self.recorder.record_block(channels, values, times)
+        if self.replay_until is not None:
+            channels.data[...] = values[-1]
+            return
+        if self.run_state.state != SimuRunState.FAST_FORWARD:
+            time.sleep(self.simulation_delay*len(values))
+        self.simulation_control_signals.update_progress_bar.emit(False)
+        channels.accumulate_block(values)
+        self.simu_interval_step += len(values)
+        if self.simu_interval_step >= self.parameter.graphing_interval:
+            self.send_graph_step(channels)
+
+
+    def send_graph_step(self, data):
+        '''Emits graphing step data to the graphs, ChannelSet is sent as ChannelFrame.
+           In fast forward the step is skipped while the previous one is being drawn'''
+        if self.run_state.graph_pending and self.run_state.state == SimuRunState.FAST_FORWARD:
+            return
+        self.run_state.graph_sent()
+        if isinstance(data, SimuChannels.ChannelSet):
+            data = data.frame()
+        self.simulation_control_signals.thread_step_data.emit(self.graph_generation, data)
+        self.simu_interval_step = 0
+
+
+
+    @Slot(object)
+    def graph_step(self, data):
+        '''Passes graphing step data to the update Slot of the open simulation view'''
+        if self.simulation_open:
+            self.simulation_view.update(data)
+
+
+    @Slot(int, object)
+    def thread_graph_step(self, generation:int, data):
+        '''Passes graphing step sent by the simulator thread to graph_step. Steps sent before
+           the simulator was stopped, restored or rewound have older generation and are dropped'''
+        if generation == self.graph_generation:
+            self.graph_step(data)
+
+
+
+    def set_render_rate(self, frame_rate:int):
+        '''Sets the frames per second the graphs are drawn at, see SimuRender'''
+        self.render_rate = frame_rate
+        SimuRender.render_scheduler().set_frame_rate(frame_rate)
 
 
 
     def graphing_flow_control(self):
-        '''Controls graphing flow, unlocks simulation if simulation_flow_control() has locked it
-        for synchronicity.
+        '''Controls graphing flow, unlocks simulation if simulation_flow_control() is waiting
+        for the graphs.
         Pauses simulation if forward step has bee taken'''
-        self.start_graphing = False
-        if self.graphing_pause:
-            self.simu_run_pause(True)
-            self.graphing_pause = False
-        if self.taking_step:
-            self.taking_step = False
+        if self.run_state.graph_drawn():
             self.simu_run_pause(False)
 
 
-    @Slot(bool)
-    def terminate_funct(self, inp):
-        self.terminate_computation = inp
-
-
 
     def simulation_error(self, message:str):
         '''Pauses simulation and emits error message signal.\n
            Inteded to be used as simulation creator error function, for example in\n
            convergence error conditions'''
-        self.simu_run_pause(False)
+        self.run_state.set(SimuRunState.STOPPED)
         UtilityFunctions.txt_log("Simulation error")
         title = "Simulation runtime error"
         self.simulation_control_signals.simulation_error.emit([message,title])
@@ -433,8 +948,8 @@ class MainWindow(QMainWindow):
     def closeEvent(self, event):
         '''Interrupts window closing from "X", if simulation is open confirms action'''
         self.simu_run_pause(False)
-        self.simulation_control_signals.terminate_computation.emit(True)
         if not self.simulation_open:
+            self.shutdown()
             event.accept()
             return
         message = "Simulation is open.\nAre you sure you want to close the program?"
@@ -442,7 +957,7 @@ class MainWindow(QMainWindow):
                                          message=message,
                                          icon=QMessageBox.Warning)
         if confirm:
-            self.simulation_thread.terminate()
+            self.shutdown()
             event.accept()
         else:
             event.ignore()
@@ -463,13 +978,18 @@ class MainWindow(QMainWindow):
     def change_graphing_interval(self, new_interval):
         '''Change of graphing interval from menubar'''
         self.parameter.graphing_interval = new_interval
+        if self.process_mode:
+            self.simulation.set_graphing_interval(new_interval)
 
 
 
-# Main app call
-main_app = QApplication(sys.argv)
-
+# Main app call, only in the main process as worker processes import this module
 if __name__ == "__main__":
+    main_app = QApplication(sys.argv)
     main_win = MainWindow()
     main_win.show()
+    # written when the event loop has started and the window is shown
+    ready_file = launcher_ready_file(sys.argv)
+    if ready_file is not None:
+        QTimer.singleShot(0, lambda: write_ready_file(ready_file))
     main_app.exec()
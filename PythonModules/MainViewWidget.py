@@ -18,24 +18,21 @@ If not, see <https://www.gnu.org/licenses/>.
 '''
 
 # pylint: disable=E0611
-import os
-from inspect import getfile, currentframe
 from functools import partial
 from PySide6.QtCore import Qt
 from PySide6.QtWidgets import (QGridLayout, QWidget, QPushButton, QLabel)
 from PySide6.QtGui import QFont
-import UtilityFunctions
 
 
 
 class StartUp(QWidget):
-    '''StartUp widget is the main window at startup containing the simulation selection menu'''
+    '''StartUp widget is the main window at startup containing the simulation selection menu.
+       Simulation list is read from the simulation registry, modules are not imported'''
     def __init__(self, parent):
         super().__init__()
 
-        own_location = os.path.dirname(os.path.abspath(getfile(currentframe())))
-        self.simulation_info = UtilityFunctions.open_json_file("Simulation_list.json",
-                                                               own_location + "/Simulation_files")
+        registry = parent.registry
+        self.simulation_info = {"subjects": registry.subjects}
         print(self.simulation_info["subjects"].keys())
 
         self.startup_layout = QGridLayout()
@@ -79,9 +76,12 @@ class StartUp(QWidget):
                 self.subject_label_list[i_simu].setAlignment(Qt.AlignLeft)
                 self.startup_layout.addWidget(self.subject_label_list[i_simu], i_row,0)
                 self.subject_button_list.append(QPushButton("Open"))
+                filename = self.simulation_info["subjects"][str(subj)][str(simu)]["filename"]
                 self.subject_button_list[i_simu].clicked.connect(partial(parent.open_simulation,
-                                                self.simulation_info["subjects"][str(subj)]
-                                                [str(simu)]["filename"]))
+                                                                         filename))
+                if not registry.is_available(filename[0:-3]):
+                    self.subject_button_list[i_simu].setEnabled(False)
+                    self.subject_button_list[i_simu].setToolTip(filename + " not found")
                 self.startup_layout.addWidget(self.subject_button_list[i_simu], i_row,1)
                 self.startup_layout.setRowStretch(i_row,14)
                 i_row += 1
@@ -1,4 +1,5 @@
-"""Animated phasorgraph widget. Based on pyqtgraph."""
+"""Animated phasorgraph widget. Based on pyqtgraph.
+    Updated phasors are drawn with the next frame of SimuRender.RenderScheduler."""
 
 
 ## Licensing
@@ -23,6 +24,7 @@ If not, see <https://www.gnu.org/licenses/>.
 from PySide6.QtWidgets import QWidget, QGridLayout
 import pyqtgraph as pg
 import numpy as np
+import SimuRender
 
 
 def linetype_maker(input_str):
@@ -104,6 +106,7 @@ class PhasorGraphWidget(QWidget):
         #print("PPW update " + str(threading.get_ident()))
         name = str(name)
         self.phasors[name].phasor_update(x_start, x_end, y_start, y_end)
+        SimuRender.schedule(self)
         new_V = round(np.sqrt((x_end**2 + y_end**2)),4)
         if new_V > self.current_V_max[1]:
             self.current_V_max[0] = name
@@ -118,6 +121,14 @@ class PhasorGraphWidget(QWidget):
                 Phasor.arrow_minimum = new_V*0.05
 
 
+    def render(self):
+        """Draws the phasors updated since the previous frame,
+           called by SimuRender.RenderScheduler"""
+        for phasor in self.phasors.values():
+            if phasor.dirty:
+                phasor.redraw()
+
+
     def update_bg(self, max_lenght):
         """Updates background grid based on maximum phsor lenght"""
         print("bg update")
@@ -265,6 +276,7 @@ class Phasor(pg.PlotCurveItem):
         self.color = color
         self.linetype = "-"
         self.linewidth = 1
+        self.dirty = False
 
         x_len = self.phasor_x_end-self.phasor_x_start
         y_len = self.phasor_y_end-self.phasor_y_start
@@ -287,20 +299,25 @@ class Phasor(pg.PlotCurveItem):
 
 
     def phasor_update(self, new_x1, new_x2, new_y1, new_y2):
-        """Updates phasor object based on new x and y values"""
+        """Updates phasor object based on new x and y values, drawn with redraw()"""
         #print("phasor update")
         self.phasor_x_start = new_x1
         self.phasor_y_start = new_y1
         self.phasor_x_end = new_x2
         self.phasor_y_end = new_y2
+        self.dirty = True
+
 
+    def redraw(self):
+        """Sets the phasor line and arrow head of the current x and y values to the curve"""
+        self.dirty = False
         x_len = self.phasor_x_end-self.phasor_x_start
         y_len = self.phasor_y_end-self.phasor_y_start
         phasor_len = np.sqrt((x_len**2 + y_len**2))
         self.arrow_len = max(phasor_len * Phasor.arrow_multiplier, Phasor.arrow_minimum)
         with np.errstate(divide='ignore', invalid='ignore'):
             self.phasor_angle = np.arctan((y_len)/(x_len))
-        if new_x2-new_x1 < 0:
+        if x_len < 0:
             self.phasor_angle += np.pi
 
         self.setData(x=np.array([self.phasor_x_start, self.phasor_x_end,
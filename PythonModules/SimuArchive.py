@@ -0,0 +1,415 @@
+'''SimuArchive stores recorded simulation steps in a compressed archive file.\n
+Steps are stored in chunks of a fixed number of steps. Every chunk is filtered and compressed
+separately, and an index of the chunks holds their position in the file, simulation times and
+the minimum and maximum of every numeric channel column, see SimuChannels.numeric_columns().
+Seeking to a time decompresses only the chunk of the time, and overviews of long recordings are
+read from the index without decompressing any chunk when each overview point covers at least
+one chunk.\n
+Chunk filters, applied before compression:\n
+SHUFFLE: bytes of the records are grouped by their position in the record, so that the
+slowly changing high bytes of consecutive values are next to each other\n
+DELTA: shuffled bytes are stored as differences to the byte of the previous step\n
+Compression is zlib or lzma of the Python standard library, or none.\n
+File layout:\n
+ARCHIVE_MAGIC, offset and length of the current index as uint64, header length as uint64 and
+the JSON header with the dtype and chunk settings\n
+compressed chunks, each holding records of (simulation time, channel values)\n
+INDEX_MAGIC and the chunk index as NPY data, written by every flush after the data\n
+ArchiveWriter appends steps incrementally, it is used by SimuRecorder.RunRecorder when the
+recording is compressed. Full chunks are compressed and written in a background thread, so the
+simulator thread is not blocked by the compression. flush() appends the buffered steps as a
+partial chunk and the index after the data, then points the header to the new index. Data
+before the end of a flush is never written again, so a reader opened after a flush keeps
+reading valid chunks while the simulation continues and the next chunks are appended.\n
+ArchiveReader reads archives in the GUI and in headless tools, it only depends on NumPy.'''
+
+## Licensing
+'''
+This file is part of SFDEsim.
+
+SFDEsim is free software: you can redistribute it and/or modify it under the terms of the
+ GNU General Public License as published by the Free Software Foundation, either version 3
+   of the License, or (at your option) any later version.
+
+SFDEsim is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+ even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+ See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with SFDEsim.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import io
+import json
+import lzma
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from SimuChannels import numeric_columns, column_values
+
+
+ARCHIVE_FILE = "recording.sfa"
+ARCHIVE_MAGIC = b"SFDEARC1"
+INDEX_MAGIC = b"SFDEIDX1"
+ARCHIVE_CHUNK = 16384       # Steps in a chunk
+ARCHIVE_CACHE = 8           # Decompressed chunks kept by ArchiveReader, covers an export chunk
+ARCHIVE_PENDING = 4         # Full chunks waiting for compression before appending waits
+
+NO_FILTER = "none"
+SHUFFLE = "shuffle"
+DELTA = "delta"
+
+NO_COMPRESSION = "none"
+ZLIB = "zlib"
+LZMA = "lzma"
+ZLIB_LEVEL = 1              # Fast level, keeps the compression thread ahead of the simulator
+LZMA_PRESET = 1
+
+
+
+def step_dtype(dtype):
+    '''Returns dtype of the archived steps, simulation time and channel values'''
+    return np.dtype([("time", np.float64), ("values", dtype)])
+
+
+def index_dtype(columns:int):
+    '''Returns dtype of the chunk index with the given number of numeric columns'''
+    return np.dtype([("offset", np.uint64), ("size", np.uint64), ("steps", np.int64),
+                     ("start", np.float64), ("end", np.float64),
+                     ("minimum", np.float64, (columns,)), ("maximum", np.float64, (columns,))])
+
+
+def filter_chunk(steps, method:str):
+    '''Returns the bytes of the array of steps filtered with the method'''
+    data = np.frombuffer(steps.tobytes(), dtype=np.uint8)
+    if method == NO_FILTER:
+        return data.tobytes()
+    shuffled = data.reshape(len(steps), steps.dtype.itemsize).T.copy()
+    if method == DELTA:
+        shuffled[:, 1:] = np.diff(shuffled, axis=1)
+    return shuffled.tobytes()
+
+
+def unfilter_chunk(data:bytes, dtype, steps:int, method:str):
+    '''Returns the array of steps from bytes filtered with the method'''
+    data = np.frombuffer(data, dtype=np.uint8)
+    if method != NO_FILTER:
+        shuffled = data.reshape(dtype.itemsize, steps)
+        if method == DELTA:
+            shuffled = np.cumsum(shuffled, axis=1, dtype=np.uint8)
+        data = np.ascontiguousarray(shuffled.T)
+    return np.frombuffer(data.tobytes(), dtype=dtype)
+
+
+def compress(data:bytes, method:str):
+    '''Returns data compressed with the method'''
+    if method == ZLIB:
+        return zlib.compress(data, ZLIB_LEVEL)
+    if method == LZMA:
+        return lzma.compress(data, preset=LZMA_PRESET)
+    return data
+
+
+def decompress(data:bytes, method:str):
+    '''Returns data decompressed with the method'''
+    if method == ZLIB:
+        return zlib.decompress(data)
+    if method == LZMA:
+        return lzma.decompress(data)
+    return data
+
+
+
+class ArchiveWriter():
+    '''Writes recorded steps to an archive file, see module description.\n
+       ArchiveWriter(filename, dtype) creates a new archive for channels of the given dtype,
+       append() and extend() add steps like SimuRecorder.DataRecorder. Steps are buffered until
+       a chunk is full and the full chunk is written in the compression thread. flush() appends
+       the buffered steps as a partial chunk with the index and close() finishes the archive.'''
+    def __init__(self, filename:str, dtype, chunk_steps:int=ARCHIVE_CHUNK,
+                 compression:str=ZLIB, method:str=DELTA):
+        self.filename = filename
+        self.dtype = np.dtype(dtype)
+        self.chunk_steps = chunk_steps
+        self.compression = compression
+        self.method = method
+        self.columns = numeric_columns(self.dtype)
+        self.buffer = np.zeros(chunk_steps, dtype=step_dtype(self.dtype))
+        self.buffered = 0           # Steps in the buffer
+        self.chunks = []            # Index entries of the written full chunks
+        self.steps = 0              # Steps in the full chunks
+        self.pending = []           # Futures of the full chunks being written
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+        header = json.dumps({"dtype": np.lib.format.dtype_to_descr(self.dtype),
+                             "chunk_steps": chunk_steps, "compression": compression,
+                             "filter": method,
+                             "columns": [column[0] for column in self.columns]}).encode()
+        self.file = open(filename, "w+b")   # pylint: disable=R1732
+        self.file.write(ARCHIVE_MAGIC + struct.pack("<QQQ", 0, 0, len(header)) + header)
+        self.data_end = self.file.tell()    # End of the written data, next chunk is written here
+        self.flushed_end = self.data_end    # End of the latest flush, data before is kept
+        self.flush()
+
+
+    def __len__(self):
+        return self.steps + self.buffered
+
+
+    def append(self, values, simulation_time:float):
+        '''Archives channel values of one step, values is a record of the dtype'''
+        step = self.buffer[self.buffered]
+        step["time"] = simulation_time
+        step["values"] = values
+        self.buffered += 1
+        if self.buffered == self.chunk_steps:
+            self.write_buffer()
+
+
+    def extend(self, values, times):
+        '''Archives channel values of consecutive steps, values is an array of the dtype'''
+        start = 0
+        while start < len(values):
+            count = min(len(values) - start, self.chunk_steps - self.buffered)
+            steps = self.buffer[self.buffered:self.buffered + count]
+            steps["time"] = times[start:start + count]
+            steps["values"] = values[start:start + count]
+            self.buffered += count
+            start += count
+            if self.buffered == self.chunk_steps:
+                self.write_buffer()
+
+
+    def write_chunk(self, steps, full:bool=True):
+        '''Writes the steps as a chunk at the end of the full chunks, returns index entry.
+           Full chunk is added to the index, partial chunk is written by flush()'''
+        entry = np.zeros((), dtype=index_dtype(len(self.columns)))
+        data = compress(filter_chunk(steps, self.method), self.compression)
+        entry["offset"] = self.data_end
+        entry["size"] = len(data)
+        entry["steps"] = len(steps)
+        entry["start"] = steps["time"][0]
+        entry["end"] = steps["time"][-1]
+        for i, column in enumerate(self.columns):
+            values = column_values(steps["values"], column)
+            entry["minimum"][i] = values.min()
+            entry["maximum"][i] = values.max()
+        self.file.seek(self.data_end)
+        self.file.write(data)
+        self.data_end += len(data)
+        if full:
+            self.chunks.append(entry)
+        return entry
+
+
+    def write_buffer(self):
+        '''Passes the full buffer to the compression thread'''
+        if len(self.pending) >= ARCHIVE_PENDING:
+            self.pending.pop(0).result()
+        self.pending.append(self.executor.submit(self.write_chunk, self.buffer.copy()))
+        self.steps += self.buffered
+        self.buffered = 0
+
+
+    def wait(self):
+        '''Waits until the full chunks are written, errors of the writes are raised'''
+        while self.pending:
+            self.pending.pop(0).result()
+
+
+    def write_index(self, chunks:list):
+        '''Writes the chunk index at the end of the data and truncates the file after it.
+           Header is pointed to the index after the index is written'''
+        index = np.array(chunks, dtype=index_dtype(len(self.columns)))
+        data = io.BytesIO()
+        np.save(data, index, allow_pickle=False)
+        offset = self.data_end + len(INDEX_MAGIC)
+        self.file.seek(self.data_end)
+        self.file.write(INDEX_MAGIC + data.getvalue())
+        self.file.truncate()
+        self.file.flush()
+        self.file.seek(len(ARCHIVE_MAGIC))
+        self.file.write(struct.pack("<QQ", offset, len(data.getvalue())))
+        self.data_end = offset + len(data.getvalue())
+
+
+    def discard_after(self, simulation_time:float):
+        '''Removes steps archived after the given time, used when the simulation is restored
+           to an earlier time. Chunk of the time is read back to the buffer. Discarded chunks
+           before the latest flush are left in the file for readers of the flushed index'''
+        self.wait()
+        time = simulation_time + 1e-12
+        buffered = self.buffer["time"][0:self.buffered]
+        if self.buffered > 0 and buffered[0] <= time:
+            self.buffered = int(np.searchsorted(buffered, time, side="right"))
+            return
+        ends = np.array([entry["end"] for entry in self.chunks])
+        chunk = int(np.searchsorted(ends, time, side="right"))
+        self.buffered = 0
+        if chunk == len(self.chunks):
+            return
+        entry = self.chunks[chunk]
+        self.file.seek(int(entry["offset"]))
+        steps = unfilter_chunk(decompress(self.file.read(int(entry["size"])), self.compression),
+                               self.buffer.dtype, int(entry["steps"]), self.method)
+        self.buffered = int(np.searchsorted(steps["time"], time, side="right"))
+        self.buffer[0:self.buffered] = steps[0:self.buffered]
+        self.data_end = max(int(entry["offset"]), self.flushed_end)
+        self.steps -= sum(int(entry["steps"]) for entry in self.chunks[chunk:])
+        del self.chunks[chunk:]
+
+
+    def flush(self):
+        '''Writes the buffered steps and the index, archive can be read after flush'''
+        self.wait()
+        chunks = list(self.chunks)
+        if self.buffered > 0:
+            chunks.append(self.write_chunk(self.buffer[0:self.buffered], full=False))
+        self.write_index(chunks)
+        self.file.flush()
+        self.flushed_end = self.data_end
+
+
+    def close(self):
+        '''Writes the archive to disk and closes the file'''
+        if self.file is not None:
+            self.flush()
+            self.executor.shutdown()
+            self.file.close()
+            self.file = None
+
+
+
+class ArchiveReader():
+    '''Reads an archive file, see module description.\n
+       reader[i] returns the channel record of step i and reader.time(i) its simulation time,
+       slices return arrays, like SimuRecorder.DataRecorder. seek() finds the step of a time,
+       read_time() the steps of a time range and overview() minimum and maximum of a column.'''
+    def __init__(self, filename:str):
+        self.filename = filename
+        self.cache = {}             # Decompressed chunks, chunk number: steps
+        with open(filename, "rb") as file:
+            if file.read(len(ARCHIVE_MAGIC)) != ARCHIVE_MAGIC:
+                raise ValueError(filename + " is not a simulation archive")
+            offset, size, length = struct.unpack("<QQQ", file.read(24))
+            header = json.loads(file.read(length))
+            file.seek(offset - len(INDEX_MAGIC))
+            if file.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                raise ValueError(filename + " has no chunk index")
+            self.index = np.load(io.BytesIO(file.read(size)), allow_pickle=False)
+
+        self.dtype = np.lib.format.descr_to_dtype(header["dtype"])
+        self.step_dtype = step_dtype(self.dtype)
+        self.chunk_steps = header["chunk_steps"]
+        self.compression = header["compression"]
+        self.method = header["filter"]
+        self.columns = numeric_columns(self.dtype)
+        self.column_names = [column[0] for column in self.columns]
+        self.first_steps = np.concatenate(([0], np.cumsum(self.index["steps"])))
+        self.steps = int(self.first_steps[-1])
+
+
+    def __len__(self):
+        return self.steps
+
+
+    def chunk(self, number:int):
+        '''Returns the decompressed steps of the chunk'''
+        if number in self.cache:
+            return self.cache[number]
+        entry = self.index[number]
+        with open(self.filename, "rb") as file:
+            file.seek(int(entry["offset"]))
+            data = decompress(file.read(int(entry["size"])), self.compression)
+        steps = unfilter_chunk(data, self.step_dtype, int(entry["steps"]), self.method)
+        if len(self.cache) >= ARCHIVE_CACHE:
+            del self.cache[next(iter(self.cache))]
+        self.cache[number] = steps
+        return steps
+
+
+    def read(self, start:int, stop:int):
+        '''Returns the steps from start to stop as an array of (time, values) records,
+           only the chunks of the steps are decompressed'''
+        start, stop = max(start, 0), min(stop, self.steps)
+        if start >= stop:
+            return np.zeros(0, dtype=self.step_dtype)
+        first = int(np.searchsorted(self.first_steps, start, side="right")) - 1
+        last = int(np.searchsorted(self.first_steps, stop, side="left")) - 1
+        parts = [self.chunk(number) for number in range(first, last + 1)]
+        steps = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        offset = start - int(self.first_steps[first])
+        return steps[offset:offset + stop - start]
+
+
+    def steps_of(self, index):
+        '''Returns steps of an index or a slice'''
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.steps)
+            return self.read(start, stop)[::step]
+        if index < 0:
+            index += self.steps
+        if not 0 <= index < self.steps:
+            raise IndexError("Step " + str(index) + " is not archived")
+        return self.read(index, index + 1)[0]
+
+
+    def __getitem__(self, index):
+        '''Returns channel record of the step index, or records of a slice of steps'''
+        return self.steps_of(index)["values"]
+
+
+    def time(self, index):
+        '''Returns simulation time of the step index, or times of a slice of steps'''
+        return self.steps_of(index)["time"]
+
+
+    def chunk_of_time(self, simulation_time:float):
+        '''Returns number of the first chunk ending at or after the given time'''
+        return int(np.searchsorted(self.index["end"], simulation_time - 1e-12))
+
+
+    def seek(self, simulation_time:float):
+        '''Returns index of the first step at or after the given time'''
+        number = self.chunk_of_time(simulation_time)
+        if number == len(self.index):
+            return self.steps
+        times = self.chunk(number)["time"]
+        return int(self.first_steps[number]
+                   + np.searchsorted(times, simulation_time - 1e-12))
+
+
+    def read_time(self, start_time:float, end_time:float):
+        '''Returns the steps from start time to end time as an array of (time, values)'''
+        return self.read(self.seek(start_time), self.seek(end_time + 2e-12))
+
+
+    def overview(self, column:str, points:int, start_time=None, end_time=None):
+        '''Returns times, minimum and maximum of the column in at most the given number of
+           buckets over the time range, whole archive by default. Buckets of whole chunks are
+           read from the index, shorter buckets from the chunks of the range'''
+        number = self.column_names.index(column)
+        first = 0 if start_time is None else self.chunk_of_time(start_time)
+        last = len(self.index) if end_time is None else self.chunk_of_time(end_time) + 1
+        last = min(last, len(self.index))
+        if last - first >= points:
+            index = self.index[first:last]
+            starts = np.linspace(0, len(index), points, endpoint=False).astype(np.int64)
+            return (index["start"][starts],
+                    np.minimum.reduceat(index["minimum"][:, number], starts),
+                    np.maximum.reduceat(index["maximum"][:, number], starts))
+        steps = self.read(int(self.first_steps[first]), int(self.first_steps[last]))
+        if start_time is not None or end_time is not None:
+            times = steps["time"]
+            begin = 0 if start_time is None else np.searchsorted(times, start_time - 1e-12)
+            end = len(times) if end_time is None else np.searchsorted(times, end_time + 1e-12,
+                                                                       side="right")
+            steps = steps[begin:end]
+        if len(steps) == 0:
+            return np.zeros(0), np.zeros(0), np.zeros(0)
+        values = column_values(steps["values"], self.columns[number]).astype(np.float64)
+        starts = np.linspace(0, len(steps), min(points, len(steps)),
+                             endpoint=False).astype(np.int64)
+        return (steps["time"][starts], np.minimum.reduceat(values, starts),
+                np.maximum.reduceat(values, starts))
@@ -0,0 +1,139 @@
+'''SimuBindings binds the parameter input widgets to the simulator inputs.\n
+BindingTable is built once when the parameter view is created. It holds for each input the
+widget, the prefix selector, the index in input_variables or input_texts and the multipliers
+of the prefix selector items, so that reading the inputs does not parse unit prefixes or
+search parameter names. Reading writes only the changed inputs and returns their names.\n
+Simulator can declare which of its update methods depend on which inputs with class attribute
+update_dependencies, a dictionary of method name: names of inputs or earlier update methods,
+for example:\n
+update_dependencies = {"update_load": ("load_power", "load_type"),
+                       "update_flow": ("u_in", "update_load")}\n
+Methods are executed in the declared order when one of their inputs has changed or one of
+the methods they depend on has been executed. Without update_dependencies, update_matrixes()
+is executed when any input has changed. update_matrixes() should still compute everything,
+it is executed when the simulator is created, reloaded or updated manually.'''
+
+## Licensing
+'''
+This file is part of SFDEsim.
+
+SFDEsim is free software: you can redistribute it and/or modify it under the terms of the
+ GNU General Public License as published by the Free Software Foundation, either version 3
+   of the License, or (at your option) any later version.
+
+SFDEsim is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+ even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+ See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with SFDEsim.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import UtilityFunctions as uFunc
+
+
+NUMBER = "number"
+DROPDOWN = "dropdown"
+
+
+
+def update_changed(simulation, changed=None):
+    '''Executes the update methods of the simulator depending on the changed inputs, see module
+       description. If changed is None, update_matrixes() is executed'''
+    dependencies = getattr(simulation, "update_dependencies", None)
+    if changed is None or dependencies is None:
+        simulation.update_matrixes()
+        return
+    updated = set(changed)
+    for method, names in dependencies.items():
+        if updated.intersection(names):
+            getattr(simulation, method)()
+            updated.add(method)
+
+
+
+class InputBinding():
+    '''Binding of one input widget to the simulator input.
+       kind is NUMBER or DROPDOWN and index is the index in input_variables or input_texts'''
+    def __init__(self, name:str, kind:str, index:int, widget, prefix_widget=None,
+                 multipliers=None):
+        self.name = name
+        self.kind = kind
+        self.index = index
+        self.widget = widget
+        self.prefix_widget = prefix_widget
+        self.multipliers = multipliers
+
+
+    def multiplier(self):
+        '''Returns multiplier of the selected unit prefix'''
+        if self.prefix_widget is None:
+            return 1
+        return self.multipliers[self.prefix_widget.currentIndex()]
+
+
+    def value(self):
+        '''Returns the input value of the widget, numbers are multiplied with the prefix'''
+        if self.kind == NUMBER:
+            return self.widget.value()*self.multiplier()
+        return self.widget.currentText()
+
+
+    def show(self, value):
+        '''Shows the simulator input value in the widget, signals are not emitted'''
+        self.widget.blockSignals(True)
+        if self.kind == NUMBER:
+            self.widget.setValue(float(value)/self.multiplier())
+        else:
+            self.widget.setCurrentText(value)
+        self.widget.blockSignals(False)
+
+
+
+class BindingTable():
+    '''Bindings of the parameter view input widgets, built once when the view is created.\n
+       input_parameters is the input parameter dictionary of the simulation, value_inputs and
+       type_list the input widgets and their types in the same order, and prefix_inputs the
+       prefix selectors of the inputs listed in prefix_indexes'''
+    def __init__(self, input_parameters, value_inputs, type_list, prefix_inputs, prefix_indexes):
+        self.bindings = []
+        prefix_widgets = dict(zip(prefix_indexes, prefix_inputs))
+        i_num = 0       # index of input_variables
+        i_text = 0      # index of input_texts
+        for i, name in enumerate(input_parameters.keys()):
+            if type_list[i] == NUMBER:
+                prefix_widget = prefix_widgets.get(i)
+                multipliers = None
+                if prefix_widget is not None:
+                    unit = input_parameters[name]["unit"]
+                    multipliers = [10**uFunc.resolve_unit_prefix(
+                                       prefix_widget.itemText(j).replace(unit, ""))
+                                   for j in range(prefix_widget.count())]
+                self.bindings.append(InputBinding(name, NUMBER, i_num, value_inputs[i],
+                                                  prefix_widget, multipliers))
+                i_num += 1
+            elif type_list[i] == DROPDOWN:
+                self.bindings.append(InputBinding(name, DROPDOWN, i_text, value_inputs[i]))
+                i_text += 1
+
+
+    def read(self, input_variables, input_texts):
+        '''Writes changed widget values to the simulator inputs, returns names of the
+           changed inputs'''
+        changed = []
+        for binding in self.bindings:
+            value = binding.value()
+            inputs = input_variables if binding.kind == NUMBER else input_texts
+            if inputs[binding.index] != value:
+                inputs[binding.index] = value
+                changed.append(binding.name)
+        return changed
+
+
+    def show(self, input_variables, input_texts):
+        '''Shows the simulator input values in the widgets'''
+        for binding in self.bindings:
+            if binding.kind == NUMBER:
+                binding.show(input_variables[binding.index])
+            else:
+                binding.show(input_texts[binding.index])
@@ -0,0 +1,92 @@
+'''SimuBlocks runs simulators which compute their steps in blocks.\n
+Simulator can implement step_block(n, out) instead of the run loop calling flow_control() and
+send_to_graph() every step. step_block computes the next n simulation steps and writes the
+output channel values of each step to out, which is a preallocated NumPy array of n elements
+with the dtype of the simulator ChannelSet, declared as self.channels. Returns the number of
+steps taken, which can be smaller than n if the simulation must stop early.\n
+Step i of the block is computed at time params.simulation_time + (i+1)*params.steptime, the
+step times are given by step_times(). Simulation time is advanced by the framework after the
+block, so step_block must not change it. Result should not depend on how the steps are divided
+into blocks, blocks are restarted from checkpoints when rewinding.\n
+Block size is selected by the framework so that blocks end at the graphing steps and at 90 %
+of the graphing interval, where the simulator waits for the previous graphing step to be drawn,
+and that the step delay slept after a block stays short. Channel values of the block are
+reduced to minimum, maximum and mean with ChannelSet.accumulate_block().\n
+Simulators without step_block are run with their run loop as before.'''
+
+## Licensing
+'''
+This file is part of SFDEsim.
+
+SFDEsim is free software: you can redistribute it and/or modify it under the terms of the
+ GNU General Public License as published by the Free Software Foundation, either version 3
+   of the License, or (at your option) any later version.
+
+SFDEsim is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+ even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+ See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with SFDEsim.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import math
+import numpy as np
+
+
+BLOCK_STEPS = 1000      # Maximum number of steps computed in one step_block call
+BLOCK_TIME = 0.05       # Maximum step delay in seconds slept after one block
+GRAPH_WAIT_RATIO = 0.9  # Part of graphing interval after which simulator waits for graphs
+
+
+
+def has_step_block(simulation):
+    '''Returns True if the simulator computes its steps with step_block()'''
+    return callable(getattr(simulation, "step_block", None))
+
+
+def step_times(params, steps:int):
+    '''Returns simulation times of the next steps. Times are summed step by step as in the
+       run loop, so that the times do not depend on the block size'''
+    times = np.full(steps + 1, params.steptime, dtype=float)
+    times[0] = params.simulation_time
+    return np.cumsum(times)[1:]
+
+
+def block_size(interval_step:int, graphing_interval:int, delay:float):
+    '''Returns number of steps in the next block, see module description.
+       interval_step is the number of steps since the previous graphing step and delay is
+       the delay per step, 0 when the simulation is run without delay'''
+    wait_step = math.ceil(GRAPH_WAIT_RATIO*graphing_interval)
+    if interval_step < wait_step:
+        steps = wait_step - interval_step
+    elif interval_step < graphing_interval:
+        steps = graphing_interval - interval_step
+    else:
+        # previous graphing step has been skipped in fast forward
+        steps = graphing_interval
+    if delay > 0:
+        steps = min(steps, int(BLOCK_TIME/delay))
+    return max(1, min(steps, BLOCK_STEPS))
+
+
+def replay_steps(params, target_time:float):
+    '''Returns number of steps to the target time when simulating to a rewind target'''
+    return round((target_time - params.simulation_time)/params.steptime)
+
+
+def run_blocks(simulation, block_control, send_block):
+    '''Runs the simulator with step_block() until block_control returns 0.\n
+       block_control returns the number of steps of the next block, it waits while the
+       simulation is stopped. send_block receives the ChannelSet of the simulator and the
+       channel values of the computed steps'''
+    channels = simulation.channels
+    out = np.zeros(BLOCK_STEPS, dtype=channels.dtype)
+    while True:
+        steps = block_control()
+        if steps == 0:
+            return
+        taken = simulation.step_block(steps, out[0:steps])
+        if taken is None:
+            taken = steps
+        send_block(channels, out[0:taken])
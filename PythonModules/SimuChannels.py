@@ -0,0 +1,233 @@
+'''SimuChannels has the objects for named and typed simulation output channels.\n
+ChannelSet is declared once in the simulator object and holds the latest values of all
+output channels in a single NumPy structured buffer.\n
+Slow changing data, such as arrays computed in update_matrixes(), is published to ChannelSet
+as static data with a version number and is only sent to graphs when the version changes.\n
+Channel values of every simulation step are reduced to minimum, maximum and mean values over
+the graphing interval, so that peaks between graphed steps are not lost.\n
+ChannelFrame is the object sent to graphicsViewWidget update Slot, when ChannelSet is given
+to send_to_graph() instead of a list.'''
+
+
+## Licensing
+'''
+This file is part of SFDEsim.
+
+SFDEsim is free software: you can redistribute it and/or modify it under the terms of the
+ GNU General Public License as published by the Free Software Foundation, either version 3
+   of the License, or (at your option) any later version.
+
+SFDEsim is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+ even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+ See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with SFDEsim.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import numpy as np
+
+
+NUMERIC_KINDS = "biufc"     # Channel dtype kinds having numeric columns
+
+
+
+def numeric_columns(dtype):
+    '''Returns numeric columns of the channel dtype as a list of
+       (column name, field name, element index, complex part).
+       Array channels have one column per element and complex channels real and imaginary
+       columns, used when recorded channels are exported or archived'''
+    columns = []
+    for name in dtype.names:
+        field = dtype[name]
+        if field.base.kind not in NUMERIC_KINDS:
+            continue
+        for index in np.ndindex(field.shape):
+            column = name + "".join("[" + str(i) + "]" for i in index)
+            if field.base.kind == "c":
+                columns.append((column + ".real", name, index, "real"))
+                columns.append((column + ".imag", name, index, "imag"))
+            else:
+                columns.append((column, name, index, None))
+    return columns
+
+
+def column_values(values, column):
+    '''Returns values of the numeric column in an array of channel records'''
+    _, field, index, part = column
+    values = values[field][(slice(None),) + index]
+    return values if part is None else getattr(values, part)
+
+
+
+class ChannelSet():
+    '''Named output channels of a simulation.\n
+       Channels are declared as a dict, where key is the channel name and value is a tuple of
+       dtype and shape, for example:\n
+       ChannelSet({"currents": (float, 3), "time": (float, ())})\n
+       Channel values are written in the simulation loop with channels["currents"] = ...
+       and the whole set is sent to graphs with self.send_to_graph(self.channels)\n
+       Simulators computing their steps in blocks write the values of each step to an array of
+       the ChannelSet dtype instead, see SimuBlocks.\n
+       Slow changing data is published with channels.publish(name, value), usually in
+       update_matrixes(). Published value is sent only with the next frame after publishing.'''
+    def __init__(self, channels:dict):
+        fields = []
+        for name, (dtype, shape) in channels.items():
+            fields.append((str(name), np.dtype(dtype), shape))
+        self.dtype = np.dtype(fields)
+        self.names = list(self.dtype.names)
+        self.data = np.zeros((), dtype=self.dtype)
+
+        self.static = {}            # Holds published static values
+        self.static_versions = {}   # Holds version numbers of static values
+        self.sent_versions = {}     # Holds version numbers already sent to graphs
+
+        # real valued channels are aggregated, others only have their last value
+        self.aggregated_names = [name for name in self.names
+                                 if self.dtype[name].base.kind in "fiu"]
+        self.minimum = np.zeros((), dtype=self.dtype)
+        self.maximum = np.zeros((), dtype=self.dtype)
+        self.total = np.zeros((), dtype=self.dtype)
+        self.aggregated_steps = 0
+
+
+    def __getitem__(self, name):
+        '''Returns writable view of the given channel'''
+        return self.data[name]
+
+
+    def __setitem__(self, name, value):
+        '''Writes new value to the given channel'''
+        self.data[name] = value
+
+
+    def publish(self, name:str, value):
+        '''Publishes new static value and increments its version.
+           Published value should not be modified in place afterwards, new object should be
+           published instead'''
+        self.static[name] = value
+        self.static_versions[name] = self.static_versions.get(name, 0) + 1
+
+
+    def resend_static(self):
+        '''Sends all static values again with the next frame, used when graphs are recreated'''
+        self.sent_versions = {}
+
+
+    def accumulate(self):
+        '''Adds current channel values to the minimum, maximum and mean of the graphing interval.
+           Executed by send_to_graph() at every simulation step'''
+        if self.aggregated_steps == 0:
+            self.minimum[...] = self.data
+            self.maximum[...] = self.data
+            self.total[...] = self.data
+        else:
+            for name in self.aggregated_names:
+                np.minimum(self.minimum[name], self.data[name], out=self.minimum[name])
+                np.maximum(self.maximum[name], self.data[name], out=self.maximum[name])
+                np.add(self.total[name], self.data[name], out=self.total[name])
+        self.aggregated_steps += 1
+
+
+    def accumulate_block(self, values):
+        '''Adds channel values of consecutive steps to the minimum, maximum and mean of the
+           graphing interval, values is an array with the dtype of the ChannelSet.
+           Values of the last step are set as the current channel values'''
+        self.data[...] = values[-1]
+        if self.aggregated_steps == 0:
+            self.minimum[...] = self.data
+            self.maximum[...] = self.data
+            self.total[...] = self.data
+            for name in self.aggregated_names:
+                np.min(values[name], axis=0, out=self.minimum[name])
+                np.max(values[name], axis=0, out=self.maximum[name])
+                np.sum(values[name], axis=0, out=self.total[name])
+        else:
+            for name in self.aggregated_names:
+                np.minimum(self.minimum[name], values[name].min(axis=0), out=self.minimum[name])
+                np.maximum(self.maximum[name], values[name].max(axis=0), out=self.maximum[name])
+                np.add(self.total[name], values[name].sum(axis=0), out=self.total[name])
+        self.aggregated_steps += len(values)
+
+
+    def frame(self):
+        '''Returns ChannelFrame with a copy of the current channel values, their minimum,
+           maximum and mean over the graphing interval and the static values which have changed
+           since the previous frame'''
+        changed = {}
+        for name, version in list(self.static_versions.items()):
+            if self.sent_versions.get(name) != version:
+                changed[name] = (version, self.static[name])
+                self.sent_versions[name] = version
+        data = self.data.copy()
+        if self.aggregated_steps == 0:
+            return ChannelFrame(data, changed)
+        minimum = data.copy()
+        maximum = data.copy()
+        mean = data.copy()
+        for name in self.aggregated_names:
+            minimum[name] = self.minimum[name]
+            maximum[name] = self.maximum[name]
+            mean[name] = self.total[name]/self.aggregated_steps
+        self.aggregated_steps = 0
+        return ChannelFrame(data, changed, minimum, maximum, mean)
+
+
+
+class ChannelFrame():
+    '''Channel values of one graphing step, received by graphicsViewWidget update Slot.\n
+       Channels are read by name, frame["currents"] returns a view of the channel data,
+       scalar channels are returned as numbers.\n
+       Static values are included only when their version has changed, which can be checked
+       with frame.changed(name) before redrawing.\n
+       Minimum, maximum and mean values over the graphing interval are read with
+       frame.minimum(name), frame.maximum(name) and frame.mean(name).'''
+    def __init__(self, data, static=None, minimum=None, maximum=None, mean=None):
+        self.data = data
+        self.names = data.dtype.names
+        if static is None:
+            static = {}
+        self.static = static        # Holds changed static values as name: (version, value)
+        # without aggregation the last values are used
+        self.min_data = data if minimum is None else minimum
+        self.max_data = data if maximum is None else maximum
+        self.mean_data = data if mean is None else mean
+
+
+    def __getitem__(self, name):
+        '''Returns value of the given channel or changed static value'''
+        if name in self.static:
+            return self.static[name][1]
+        return self.data[name][()]
+
+
+    def __contains__(self, name):
+        return name in self.names or name in self.static
+
+
+    def minimum(self, name:str):
+        '''Returns minimum value of the given channel over the graphing interval'''
+        return self.min_data[name][()]
+
+
+    def maximum(self, name:str):
+        '''Returns maximum value of the given channel over the graphing interval'''
+        return self.max_data[name][()]
+
+
+    def mean(self, name:str):
+        '''Returns mean value of the given channel over the graphing interval'''
+        return self.mean_data[name][()]
+
+
+    def changed(self, name:str):
+        '''Returns True if static value of given name has new version in this frame'''
+        return name in self.static
+
+
+    def version(self, name:str):
+        '''Returns version of changed static value, or -1 if it is not included in the frame'''
+        if name in self.static:
+            return self.static[name][0]
+        return -1
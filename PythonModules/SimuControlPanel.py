@@ -18,9 +18,10 @@ If not, see <https://www.gnu.org/licenses/>.
 '''
 
 # pylint: disable=E0611
-from PySide6.QtCore import  Slot
+from PySide6.QtCore import  Slot, Qt
 from PySide6.QtGui import QAction, QActionGroup, QIcon
-from PySide6.QtWidgets import (QToolBar, QLabel, QCheckBox, QDoubleSpinBox, QPushButton)
+from PySide6.QtWidgets import (QToolBar, QLabel, QCheckBox, QDoubleSpinBox, QPushButton,
+                               QSlider)
 
 bars = ["▰▱▱▱▱▱▱▱▱▱",
         "▱▰▱▱▱▱▱▱▱▱",
@@ -43,6 +44,10 @@ bars = ["▰▱▱▱▱▱▱▱▱▱",
         ]
 
 
+REWIND_STEPS = 1000     # Resolution of the rewind slider
+
+
+
 class Panel(QToolBar):
     '''Simulation control toolbar.
     Consists of simulation controls.'''
@@ -51,6 +56,11 @@ class Panel(QToolBar):
 
         self.control_signals = control_signals
         self.take_step = parent.take_step
+        self.fast_forward = parent.fast_forward
+        self.rewind = parent.rewind
+        self.rewind_range = parent.rewind_range
+        self.rewind_times = None
+        self.rewind_updating = False
 
         self.simulation_txt_label = QLabel()
         self.simulation_txt_label.setText("Simulation control:")
@@ -71,6 +81,13 @@ class Panel(QToolBar):
         self.simu_contol_group.addAction(self.pause_simu_btn)
         self.addAction(self.pause_simu_btn)
 
+        self.fast_simu_btn = QAction("Fast >>", self)
+        self.fast_simu_btn.setCheckable(False)
+        self.fast_simu_btn.setToolTip("Run simulation without speed limit")
+        self.fast_simu_btn.triggered.connect(self.fast_forward_pressed)
+        self.simu_contol_group.addAction(self.fast_simu_btn)
+        self.addAction(self.fast_simu_btn)
+
         self.simu_contol_group.setEnabled(simu_open)
 
         self.addSeparator()
@@ -89,6 +106,23 @@ class Panel(QToolBar):
 
         self.step_simu_contol_group.setEnabled(simu_open)
 
+        # Rewind slider covers the time from the oldest checkpoint to the current time
+        self.rewind_txt_label = QLabel()
+        self.rewind_txt_label.setText("  Rewind:")
+        self.addWidget(self.rewind_txt_label)
+        self.rewind_slider = QSlider(Qt.Horizontal)
+        self.rewind_slider.setRange(0, REWIND_STEPS)
+        self.rewind_slider.setValue(REWIND_STEPS)
+        self.rewind_slider.setFixedWidth(120)
+        self.rewind_slider.setToolTip("Return simulation to earlier time when paused")
+        self.rewind_slider.valueChanged.connect(self.rewind_moved)
+        self.rewind_slider.sliderReleased.connect(self.rewind_released)
+        self.rewind_slider.setEnabled(False)
+        self.addWidget(self.rewind_slider)
+        self.rewind_time_label = QLabel()
+        self.rewind_time_label.setMinimumWidth(80)
+        self.addWidget(self.rewind_time_label)
+
         self.addSeparator()
         self.separator_space_label2 = QLabel()
         self.separator_space_label2.setText("  ")
@@ -151,7 +185,6 @@ class Panel(QToolBar):
     def start_pressed(self):
         """Control panel start button action"""
         print("start_pressed")
-        self.control_signals.terminate_computation.emit(False)
         self.control_signals.continue_pause.emit(True)
 
 
@@ -159,16 +192,54 @@ class Panel(QToolBar):
         """Control panel pause button action"""
         print("pause_pressed")
         self.control_signals.continue_pause.emit(False)
-        self.control_signals.terminate_computation.emit(True)
 
 
     def f_step_pressed(self):
         """Control panel forward step action"""
         print("forward_pressed")
-        self.control_signals.terminate_computation.emit(False)
         self.take_step()
 
 
+    def fast_forward_pressed(self):
+        """Control panel fast forward action"""
+        print("fast_forward_pressed")
+        self.fast_forward()
+
+
+    def rewind_target(self):
+        '''Returns simulation time selected with the rewind slider'''
+        start_time, end_time = self.rewind_times
+        return start_time + (end_time-start_time)*self.rewind_slider.value()/REWIND_STEPS
+
+
+    def rewind_moved(self, _):
+        '''Shows the selected rewind time, rewinds if slider is moved without dragging'''
+        if self.rewind_updating or self.rewind_times is None:
+            return
+        self.rewind_time_label.setText(" t = " + str(round(self.rewind_target(), 4)) + " s")
+        if not self.rewind_slider.isSliderDown():
+            self.rewind_released()
+
+
+    def rewind_released(self):
+        '''Rewinds simulation to the selected time'''
+        if self.rewind_times is None or self.rewind_slider.value() >= REWIND_STEPS:
+            return
+        print("rewind:", self.rewind_target())
+        self.rewind(self.rewind_target())
+
+
+    def update_rewind_range(self, enabled:bool):
+        '''Sets the rewind slider to the current time, slider is enabled when there are
+           checkpoints to rewind to'''
+        self.rewind_times = self.rewind_range() if enabled else None
+        self.rewind_updating = True
+        self.rewind_slider.setValue(REWIND_STEPS)
+        self.rewind_updating = False
+        self.rewind_slider.setEnabled(self.rewind_times is not None)
+        self.rewind_time_label.setText("")
+
+
     def speed_change(self, parent, val):
         """Control panel speed change action"""
         print("speed_changed:", val)
@@ -182,6 +253,7 @@ class Panel(QToolBar):
         self.step_simu_contol_group.setEnabled(inp)
         self.speed_entry_field.setEnabled(inp)
         self.updating_btn.setEnabled(inp)
+        self.update_rewind_range(False)
 
 
     def update_check_clicked(self):
@@ -195,6 +267,7 @@ class Panel(QToolBar):
     def simu_running_stopped(self,inp):
         '''Changes menu action enable states when simulation is set to run or stopped'''
         self.f_step_simu_btn.setEnabled(not inp)
+        self.update_rewind_range(not inp)
 
 
     @Slot(bool)
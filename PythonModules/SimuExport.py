@@ -0,0 +1,175 @@
+'''SimuExport writes simulation data to CSV or NPY files in a background thread.\n
+Data is read from a source in chunks of EXPORT_CHUNK rows and written to the file chunk by
+chunk, so exporting long recordings does not load them into memory and the GUI is not
+blocked. Every column is written as float64, array channels are written one element per
+column and complex values as real and imaginary parts.\n
+Sources:\n
+RecordingSource: every recorded step of SimuRecorder.DataRecorder or SimuArchive.ArchiveReader,
+"Full data" export\n
+GraphSource: data shown in the graphs of the simulation view, "Graph data" export\n
+File format is selected by the file extension, ".npy" writes a NumPy structured array with
+the column names as field names, other extensions write CSV with a header row.\n
+ExportJob runs the export in a thread, reports the progress with its progress signal and
+can be cancelled, cancelled export removes the partly written file.'''
+
+## Licensing
+'''
+This file is part of SFDEsim.
+
+SFDEsim is free software: you can redistribute it and/or modify it under the terms of the
+ GNU General Public License as published by the Free Software Foundation, either version 3
+   of the License, or (at your option) any later version.
+
+SFDEsim is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+ even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+ See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with SFDEsim.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+# pylint: disable=E0611
+import os
+import threading
+import traceback
+from PySide6.QtCore import QObject, Signal
+import numpy as np
+from numpy.lib.recfunctions import structured_to_unstructured
+from SimuChannels import numeric_columns, column_values
+import UtilityFunctions
+
+
+EXPORT_CHUNK = 65536        # Rows read and written at a time
+CSV_ROWS = 4096             # Rows formatted at a time, GIL is held while formatting
+CSV_FORMAT = "%.10g"        # Number format of CSV files
+
+
+def write_csv(filename:str, source, progress, cancelled):
+    '''Writes the source to a CSV file chunk by chunk, returns False if cancelled'''
+    rows = len(source)
+    row_format = ",".join([CSV_FORMAT]*len(source.dtype.names)) + "\n"
+    with open(filename, "w", encoding="utf-8", newline="") as file:
+        file.write(",".join(source.dtype.names) + "\n")
+        for start in range(0, rows, EXPORT_CHUNK):
+            if cancelled():
+                return False
+            stop = min(start + EXPORT_CHUNK, rows)
+            chunk = structured_to_unstructured(source.read(start, stop))
+            for i in range(0, len(chunk), CSV_ROWS):
+                lines = chunk[i:i+CSV_ROWS]
+                file.write((row_format*len(lines)) % tuple(lines.ravel().tolist()))
+            progress(stop, rows)
+    return True
+
+
+def write_npy(filename:str, source, progress, cancelled):
+    '''Writes the source to a NPY file chunk by chunk, returns False if cancelled'''
+    rows = len(source)
+    header = {"descr": np.lib.format.dtype_to_descr(source.dtype), "fortran_order": False,
+              "shape": (rows,)}
+    with open(filename, "wb") as file:
+        np.lib.format.write_array_header_2_0(file, header)
+        for start in range(0, rows, EXPORT_CHUNK):
+            if cancelled():
+                return False
+            stop = min(start + EXPORT_CHUNK, rows)
+            file.write(source.read(start, stop).tobytes())
+            progress(stop, rows)
+    return True
+
+
+
+class RecordingSource():
+    '''Export source of the recorded steps, columns are the simulation time and the numerical
+       channels of the recording, see SimuRecorder'''
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.columns = numeric_columns(recorder.dtype)
+        names = ["simulation_time"] + [column[0] for column in self.columns]
+        self.dtype = np.dtype([(name, np.float64) for name in names])
+
+
+    def __len__(self):
+        return len(self.recorder)
+
+
+    def read(self, start:int, stop:int):
+        '''Returns the rows from start to stop as an array of the export dtype'''
+        values = self.recorder[start:stop]
+        rows = np.empty(len(values), dtype=self.dtype)
+        rows["simulation_time"] = self.recorder.time(slice(start, stop))
+        for column in self.columns:
+            rows[column[0]] = column_values(values, column)
+        return rows
+
+
+
+class GraphSource():
+    '''Export source of the graph data, columns is a dictionary of column name: values.
+       Columns are copied when the source is created, shorter columns are padded with NaN'''
+    def __init__(self, columns:dict):
+        self.columns = {name: np.array(values, dtype=np.float64)
+                        for name, values in columns.items()}
+        self.dtype = np.dtype([(name, np.float64) for name in self.columns])
+        self.rows = max((len(values) for values in self.columns.values()), default=0)
+
+
+    def __len__(self):
+        return self.rows
+
+
+    def read(self, start:int, stop:int):
+        '''Returns the rows from start to stop as an array of the export dtype'''
+        rows = np.full(stop - start, np.nan, dtype=self.dtype)
+        for name, values in self.columns.items():
+            part = values[start:stop]
+            rows[name][0:len(part)] = part
+        return rows
+
+
+
+class ExportJob(QObject):
+    '''Export of a source to a file in a background thread.\n
+       progress signal gives the exported percentage and finished signal whether the export
+       was completed and a message. cancel() stops the export after the current chunk'''
+    progress = Signal(int)
+    finished = Signal(bool, str)
+
+    def __init__(self, filename:str, source):
+        super().__init__()
+        self.filename = filename
+        self.source = source
+        self.cancelled = False
+        self.thread = None
+
+
+    def start(self):
+        '''Starts the export thread'''
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+
+    def cancel(self):
+        '''Requests the export to stop, partly written file is removed'''
+        self.cancelled = True
+
+
+    def report(self, done:int, total:int):
+        '''Emits the exported percentage'''
+        self.progress.emit(int(100*done/total) if total > 0 else 100)
+
+
+    def run(self):
+        '''Writes the file, executed in the export thread'''
+        writer = write_npy if self.filename.lower().endswith(".npy") else write_csv
+        try:
+            completed = writer(self.filename, self.source, self.report, lambda: self.cancelled)
+        except Exception:
+            UtilityFunctions.txt_log("Data export failed > " + traceback.format_exc())
+            completed = False
+            message = "Data could not be written to " + self.filename
+        else:
+            message = "Export cancelled" if not completed else "Data exported to " + self.filename
+        if not completed and os.path.exists(self.filename):
+            os.remove(self.filename)
+        self.finished.emit(completed, message)
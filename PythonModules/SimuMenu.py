@@ -36,8 +36,11 @@ class MenuWidget(QMenuBar):
         self.signals = signals
         self.control_signals = parent.simulation_control_signals
         self.take_step = parent.take_step
+        self.fast_forward = parent.fast_forward
         self.open_simulation = parent.open_simulation
         self.close_simulation = parent.close_simulation
+        self.reset_simulation = parent.reset_simulation
+        self.reload_simulation = parent.reload_simulation
         self.simu_open = parent.simulation_open
         self.simu_speed_list = parent.simulation_speed_limits
 
@@ -65,11 +68,14 @@ class MenuWidget(QMenuBar):
         self.export_graph.setEnabled(False)
         self.export_submenu.addAction(self.export_graph)
         self.export_data_data = QAction("Graph data", self.export_submenu)
-        self.export_data_data.setToolTip("Export data shown in all graphs as .csv")
-        self.export_data_data.setEnabled(False)
+        self.export_data_data.setToolTip("Export data shown in all graphs as .csv or .npy")
+        self.export_data_data.triggered.connect(lambda: parent.export_data(False))
         self.export_submenu.addAction(self.export_data_data)
         self.export_data_full = QAction("Full data", self.export_submenu)
-        self.export_data_full.setToolTip("Export full data as .csv")
+        tt = "Export every recorded simulation step as .csv or .npy.\n"
+        tt += "Available when Record full data is enabled in settings"
+        self.export_data_full.setToolTip(tt)
+        self.export_data_full.triggered.connect(lambda: parent.export_data(True))
         self.export_data_full.setEnabled(False)
         self.export_submenu.addAction(self.export_data_full)
         self.export_submenu.setEnabled(False)
@@ -102,6 +108,43 @@ class MenuWidget(QMenuBar):
         self.simu_speed_bottom.setDefaultWidget(self.simu_speed_bottom_subwidget)
         self.settings_submenu.addAction(self.simu_speed_top)
         self.settings_submenu.addAction(self.simu_speed_bottom)
+        self.process_mode_action = QAction("Run simulation in separate process", self)
+        tt = "Runs the simulation calculations in a separate process, so that simulation and\n"
+        tt += "graph drawing can use separate processor cores.\n"
+        tt += "Used only by simulations supporting it, applied when simulation is opened"
+        self.process_mode_action.setToolTip(tt)
+        self.process_mode_action.setCheckable(True)
+        self.process_mode_action.setChecked(parent.execution_mode == "process")
+        self.process_mode_action.toggled.connect(
+            lambda checked: setattr(parent, "execution_mode", "process" if checked else "thread"))
+        self.settings_submenu.addAction(self.process_mode_action)
+        self.record_data_action = QAction("Record full data", self)
+        tt = "Records the output values of every simulation step to the Recordings directory.\n"
+        tt += "Applied when simulation is opened"
+        self.record_data_action.setToolTip(tt)
+        self.record_data_action.setCheckable(True)
+        self.record_data_action.setChecked(parent.record_data)
+        self.record_data_action.toggled.connect(
+            lambda checked: setattr(parent, "record_data", checked))
+        self.settings_submenu.addAction(self.record_data_action)
+        self.compress_recording_action = QAction("Compress recorded data", self)
+        tt = "Records the steps to a compressed archive instead of uncompressed files.\n"
+        tt += "Archive is smaller, and slower to export. Applied when simulation is opened"
+        self.compress_recording_action.setToolTip(tt)
+        self.compress_recording_action.setCheckable(True)
+        self.compress_recording_action.setChecked(parent.compress_recording)
+        self.compress_recording_action.toggled.connect(
+            lambda checked: setattr(parent, "compress_recording", checked))
+        self.settings_submenu.addAction(self.compress_recording_action)
+        self.render_rate_action = QAction("Draw graphs at 30 fps", self)
+        tt = "Graphs are drawn at most 30 times per second instead of 60.\n"
+        tt += "Leaves more time for fast simulations"
+        self.render_rate_action.setToolTip(tt)
+        self.render_rate_action.setCheckable(True)
+        self.render_rate_action.setChecked(parent.render_rate == 30)
+        self.render_rate_action.toggled.connect(
+            lambda checked: parent.set_render_rate(30 if checked else 60))
+        self.settings_submenu.addAction(self.render_rate_action)
         self.save_settings_button = QAction(self)
         self.save_settings_button.setText("Save settings")
         tt = "Save settings to memory.\nSame values will be used in future"
@@ -135,6 +178,12 @@ class MenuWidget(QMenuBar):
         self.f_step_button_action.setEnabled(False)
         self.f_step_button_action.triggered.connect(lambda:self.f_step_clicked())
         self.simulation_menu.addAction(self.f_step_button_action)
+        self.fast_forward_action = QAction("Fast forward", self)
+        self.fast_forward_action.setToolTip("Run simulation without speed limit.\n"
+                                            "Graphs are updated when they are free")
+        self.fast_forward_action.setEnabled(False)
+        self.fast_forward_action.triggered.connect(lambda:self.fast_forward_clicked())
+        self.simulation_menu.addAction(self.fast_forward_action)
         self.simulation_menu.addSeparator()
         self.reset_button_action = QAction("Reset", self)
         tt = "Reset simulation to its default condition.\n"
@@ -143,6 +192,13 @@ class MenuWidget(QMenuBar):
         self.reset_button_action.setEnabled(False)
         self.reset_button_action.triggered.connect(lambda:self.simulation_reset_clicked())
         self.simulation_menu.addAction(self.reset_button_action)
+        self.reload_button_action = QAction("Reload simulation file", self)
+        tt = "Import the edited simulation file again.\n"
+        tt += "Simulation time, parameters and compatible simulation state are kept"
+        self.reload_button_action.setToolTip(tt)
+        self.reload_button_action.setEnabled(False)
+        self.reload_button_action.triggered.connect(lambda:self.simulation_reload_clicked())
+        self.simulation_menu.addAction(self.reload_button_action)
         self.simulation_menu.addSeparator()
 
         self.adv_edit_enabled = False
@@ -218,7 +274,6 @@ class MenuWidget(QMenuBar):
         '''
         print("menu -> file -> Close was clicked")
         self.signals.continue_pause.emit(False)
-        self.signals.terminate_computation.emit(True)
         if self.simu_open:
             message = "Simulation is open.\nAre you sure you want to close the program?"
         else:
@@ -226,26 +281,25 @@ class MenuWidget(QMenuBar):
         exit_dialog = confirm_dialog("Exit", message, icon=QMessageBox.Question)
         if exit_dialog:
             print("Success!")
-            try:
-                parent.simulation_thread.terminate()
-            except AttributeError:
-                pass
+            parent.shutdown()
             sys.exit()
         else:
             print("Cancel!")
 
     # Simulation menu functions
     def simulation_reset_clicked(self):
-        '''Resets simulation when reset is clicked by closing and reopening the simulation'''
-        self.signals.terminate_computation.emit(False)
-        self.close_simulation()
-        self.open_simulation(self.open_simu_filename)
+        '''Resets simulation when reset is clicked, simulator is restored to its initial snapshot'''
+        self.reset_simulation()
+
+
+    def simulation_reload_clicked(self):
+        '''Reloads the edited simulation file when reload is clicked'''
+        self.reload_simulation()
 
 
     def start_clicked(self):
         """Control panel start button action"""
         print("start_pressed")
-        self.signals.terminate_computation.emit(False)
         self.control_signals.continue_pause.emit(True)
         self.f_step_button_action.setEnabled(False)
 
@@ -253,7 +307,6 @@ class MenuWidget(QMenuBar):
     def pause_clicked(self):
         """Control panel pause button action"""
         print("pause_pressed")
-        self.signals.terminate_computation.emit(True)
         self.control_signals.continue_pause.emit(False)
         self.f_step_button_action.setEnabled(True)
 
@@ -261,10 +314,16 @@ class MenuWidget(QMenuBar):
     def f_step_clicked(self):
         """Control panel forward step action"""
         print("forward_pressed")
-        self.signals.terminate_computation.emit(False)
         self.take_step()
 
 
+    def fast_forward_clicked(self):
+        """Fast forward action"""
+        print("fast_forward_pressed")
+        self.fast_forward()
+        self.f_step_button_action.setEnabled(False)
+
+
     def advanced_edit_clicked(self):
         '''Sends appropriate boolean signal when edvanced parameter edit button is clicked'''
         if not self.adv_edit_enabled:
@@ -289,10 +348,12 @@ class MenuWidget(QMenuBar):
         self.start_button_action.setEnabled(inp)
         self.pause_button_action.setEnabled(inp)
         self.f_step_button_action.setEnabled(inp)
+        self.fast_forward_action.setEnabled(inp)
         self.advanced_edit.setEnabled(inp)
         self.plotting_interval.setEnabled(inp)
         self.plotting_interval_subwidget.setValue(graphing_interv)
         self.info_button_action.setEnabled(inp)
+        self.reload_button_action.setEnabled(inp)
         if inp:
             self.open_simu_filename = filename
             self.steptime_sub.setText("Simulation step time: "+ str(steptime*1000) +"ms")
@@ -302,6 +363,7 @@ class MenuWidget(QMenuBar):
         '''Changes menu action enable states when simulation is set to run or stopped'''
         self.export_submenu.setEnabled(not inp)
         self.reset_button_action.setEnabled(not inp)
+        self.reload_button_action.setEnabled(not inp)
         self.open_button_action.setEnabled(not inp)
         self.close_button_action.setEnabled(not inp)
         self.f_step_button_action.setEnabled(not inp)
@@ -327,6 +389,13 @@ class MenuWidget(QMenuBar):
         settings_dict = UtilityFunctions.open_json_file("settings.json",path)
         settings_dict["speed_timings"] = [round(1/self.simu_speed_bottom_subwidget.value(),4),
                                           round(1/self.simu_speed_top_subwidget.value(),4)]
+        if self.process_mode_action.isChecked():
+            settings_dict["execution_mode"] = "process"
+        else:
+            settings_dict["execution_mode"] = "thread"
+        settings_dict["record_data"] = self.record_data_action.isChecked()
+        settings_dict["compress_recording"] = self.compress_recording_action.isChecked()
+        settings_dict["render_rate"] = 30 if self.render_rate_action.isChecked() else 60
         UtilityFunctions.write_json_file(filename="settings.json",
                                          data_for_file=settings_dict,
                                          location=path)
@@ -23,6 +23,7 @@ from PySide6.QtGui import QFont
 from PySide6.QtWidgets import (QGridLayout, QDoubleSpinBox,
                                QWidget, QLabel, QComboBox)
 import UtilityFunctions as uFunc
+from SimuBindings import BindingTable
 
 
 
@@ -179,6 +180,16 @@ class SimuParameters(QWidget):
                 i_dropdown += 1
 
         self.setLayout(self.control_layout)
+        # widget bindings to the simulator inputs, see SimuBindings
+        self.bindings = BindingTable(input_parameters, self.value_inputs, self.type_list,
+                                     self.prefix_inputs, self.prefix_indexes)
+
+
+    def set_values(self, input_variables, input_texts):
+        '''Sets input values shown in the widget, used when simulator inputs are restored.
+           Number values are shown with the selected prefix, input changed signals are
+           not emitted'''
+        self.bindings.show(input_variables, input_texts)
 
 
     def input_value_changed(self, parent):
@@ -0,0 +1,671 @@
+'''SimuProcess runs the simulator object in a separate worker process.\n
+In process execution mode the simulation and graph drawing use separate cores and do not
+compete of the Python GIL.\n
+SimulationProcess is the GUI side object, which is used in place of the simulator object in
+MainWindow. The worker process is started once and kept for the session, it creates the
+simulator of each opened simulation, receives commands and input updates over a pipe and
+writes ChannelSet frames to a shared memory ring buffer read by the GUI.\n
+Only simulations with ChannelSet outputs and class attribute process_safe = True in the
+simulator object can be run in a process, as the simulator and graphicsViewWidget do not
+share memory in this mode.'''
+
+## Licensing
+'''
+This file is part of SFDEsim.
+
+SFDEsim is free software: you can redistribute it and/or modify it under the terms of the
+ GNU General Public License as published by the Free Software Foundation, either version 3
+   of the License, or (at your option) any later version.
+
+SFDEsim is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+ even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+ See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with SFDEsim.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+# pylint: disable=E0611
+import time
+import importlib
+import traceback
+import multiprocessing
+from multiprocessing import shared_memory
+from PySide6.QtCore import QObject, QTimer
+import numpy as np
+from SimuChannels import ChannelSet, ChannelFrame
+from SimuSnapshot import Snapshot, CheckpointRing
+from SimuBindings import update_changed
+from SimuRecorder import RunRecorder
+from SimuBlocks import (has_step_block, run_blocks, step_times, block_size, replay_steps,
+                        BLOCK_STEPS)
+import SimuRunState
+import UtilityFunctions
+
+
+# Shared memory header indexes, header is float64 array in front of the ring buffer
+HEADER_WRITE = 0        # Frames written by the worker
+HEADER_READ = 1         # Frames read by the GUI
+HEADER_TIME = 2         # Simulation time of the latest frame
+HEADER_STEPTIME = 3     # Simulation steptime of the latest frame
+HEADER_LEN = 4
+
+RING_SLOTS = 64         # Frames in ring buffer, worker waits when GUI is this many behind
+POLL_INTERVAL = 10      # GUI buffer polling interval in ms
+START_TIMEOUT = 60      # Time in seconds to wait for the worker to initialize the simulator
+RELEASE_TIMEOUT = 5     # Time in seconds to wait for the worker to release the simulator
+RESTORE_TIMEOUT = 5     # Time in seconds to wait for the worker to restore a snapshot
+
+
+def is_process_safe(module):
+    '''Returns True if simulation module can be run in a worker process'''
+    return getattr(module.simulator, "process_safe", False)
+
+
+def frame_dtype(dtype):
+    '''Returns ring buffer slot dtype for ChannelSet dtype'''
+    return np.dtype([("last", dtype), ("minimum", dtype), ("maximum", dtype), ("mean", dtype)])
+
+
+def map_buffer(shm, dtype):
+    '''Returns header and ring arrays mapped to the shared memory'''
+    header = np.ndarray((HEADER_LEN,), dtype=np.float64, buffer=shm.buf)
+    ring = np.ndarray((RING_SLOTS,), dtype=frame_dtype(dtype), buffer=shm.buf,
+                      offset=HEADER_LEN*np.dtype(np.float64).itemsize)
+    return header, ring
+
+
+
+class _ForwardedSignal():
+    '''Signal of the worker process, emit is forwarded to the GUI over the pipe'''
+    def __init__(self, conn, name):
+        self.conn = conn
+        self.name = name
+
+
+    def emit(self, *args):
+        self.conn.send(("signal", self.name, args))
+
+
+
+class _WorkerSignals():
+    '''Stands in for SimuSignals in the worker process'''
+    def __init__(self, conn):
+        self.conn = conn
+
+
+    def __getattr__(self, name):
+        return _ForwardedSignal(self.conn, name)
+
+
+
+class _Worker():
+    '''Worker process side of the simulation, acts as the parent of the simulator object.\n
+       simulation_flow_control and send_to_graph replace the MainWindow methods'''
+    def __init__(self, conn):
+        self.conn = conn
+        self.state = SimuRunState.STOPPED
+        self.closing = False
+        self.releasing = False
+        self.delay = 0
+        self.graphing_interval = 1
+        self.interval_step = 0
+        self.write_count = 0
+        self.shm = None
+        self.header = None
+        self.ring = None
+        self.params = None
+        self.simulation = None
+        self.snapshots = {}
+        self.checkpoints = None
+        self.replay_until = None
+        self.recorder = None
+
+
+    def main(self):
+        '''Worker loop, runs the simulator when not stopped and waits for commands otherwise'''
+        try:
+            while not self.closing:
+                if self.simulation is not None and self.state != SimuRunState.STOPPED:
+                    self.run_simulation()
+                    if self.recorder is not None:
+                        self.recorder.flush()
+                else:
+                    self.conn.poll(None)
+                    self.read_commands()
+                if self.releasing:
+                    self.release()
+        finally:
+            self.release_buffer()
+
+
+    def run_simulation(self):
+        '''Runs the simulator until it is stopped, in blocks if it has step_block()'''
+        if has_step_block(self.simulation):
+            run_blocks(self.simulation, self.simulation_block_control, self.send_block)
+        else:
+            self.simulation.run(False)
+
+
+    def open(self, module_name, graphing_interval, delay, snapshot=None):
+        '''Creates the simulator object of the given simulation module,
+           state of the given snapshot is migrated to the new simulator'''
+        module = importlib.import_module("Simulation_files." + module_name)
+        self.close_recorder()
+        self.state = SimuRunState.STOPPED
+        self.delay = delay
+        self.graphing_interval = graphing_interval
+        self.interval_step = 0
+        self.write_count = 0
+        self.params = module.parameters()
+        self.params.graphing_interval = graphing_interval
+        self.snapshots = {}
+        self.checkpoints = CheckpointRing(self.params)
+        self.replay_until = None
+        self.simulation = module.simulator(self, self.params, _WorkerSignals(self.conn),
+                                           self.send_to_graph)
+        self.save_snapshot("initial")
+        if snapshot is not None:
+            snapshot.migrate(self.simulation, self.params)
+            self.simulation.update_matrixes()
+        self.conn.send(("ready", self.simulation.input_variables,
+                        list(self.simulation.input_texts), self.params.simulation_time))
+
+
+    def reload(self, module_name, graphing_interval, delay):
+        '''Imports the simulation module again and creates its simulator, compatible state of
+           the previous simulator is migrated to the new one'''
+        snapshot = None
+        if self.simulation is not None:
+            snapshot = Snapshot(self.simulation, self.params)
+        self.simulation = None
+        self.release_buffer()
+        importlib.reload(importlib.import_module("Simulation_files." + module_name))
+        self.open(module_name, graphing_interval, delay, snapshot)
+
+
+    def release(self):
+        '''Releases the simulator object and its ring buffer'''
+        self.releasing = False
+        self.close_recorder()
+        self.simulation = None
+        self.params = None
+        self.snapshots = {}
+        self.checkpoints = None
+        self.release_buffer()
+        self.conn.send(("released",))
+
+
+    def close_recorder(self):
+        '''Writes the recorded steps to disk and stops recording'''
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+
+    def release_buffer(self):
+        '''Closes and removes the shared memory ring buffer'''
+        if self.shm is not None:
+            self.header = None
+            self.ring = None
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+    def read_commands(self):
+        '''Handles all commands received from the GUI'''
+        while self.conn.poll():
+            try:
+                command, *args = self.conn.recv()
+            except EOFError:
+                # GUI has exited
+                self.state = SimuRunState.STOPPED
+                self.closing = True
+                return
+            if command in ("open", "reload"):
+                try:
+                    getattr(self, command)(*args)
+                except Exception:
+                    self.simulation = None
+                    self.conn.send(("error", traceback.format_exc()))
+            elif command == "state":
+                self.state = args[0]
+            elif command == "delay":
+                self.delay = args[0]
+            elif command == "interval":
+                self.graphing_interval = args[0]
+                if self.params is not None:
+                    self.params.graphing_interval = args[0]
+            elif command == "inputs" and self.simulation is not None:
+                self.simulation.input_variables[:] = args[0]
+                self.simulation.input_texts[:] = args[1]
+                update_changed(self.simulation, args[2])
+                self.checkpoints.request()
+            elif command == "record":
+                self.close_recorder()
+                self.recorder = RunRecorder(args[0], args[1])
+            elif command == "restore":
+                self.restore_snapshot(args[0])
+            elif command == "rewind":
+                self.rewind(args[0])
+            elif command == "release":
+                # simulator is released by main() after its run loop has returned
+                self.state = SimuRunState.STOPPED
+                self.releasing = True
+            elif command == "close":
+                self.state = SimuRunState.STOPPED
+                self.closing = True
+
+
+    def simulation_flow_control(self):
+        '''Controls simulation flow in the worker, see MainWindow.simulation_flow_control.
+           Returns False when stopped, worker then waits for the next command'''
+        self.read_commands()
+        if self.state == SimuRunState.STOPPED:
+            return False
+        if self.checkpoints.due(self.params.simulation_time):
+            self.add_checkpoint()
+        self.params.simulation_time += self.params.steptime
+        if self.replay_until is not None:
+            if self.params.simulation_time < self.replay_until - self.params.steptime/2:
+                return True
+            self.replay_until = None
+            self.interval_step = self.graphing_interval - 1
+        elif self.state != SimuRunState.FAST_FORWARD:
+            time.sleep(self.delay)
+        return True
+
+
+    def simulation_block_control(self):
+        '''Controls simulation flow of simulators with step_block(), see
+           MainWindow.simulation_block_control. Returns 0 when stopped'''
+        self.read_commands()
+        if self.state == SimuRunState.STOPPED:
+            return 0
+        if self.checkpoints.due(self.params.simulation_time):
+            self.add_checkpoint()
+        if self.replay_until is not None:
+            steps = replay_steps(self.params, self.replay_until)
+            if steps > 1:
+                return min(steps - 1, BLOCK_STEPS)
+            self.replay_until = None
+            self.interval_step = self.graphing_interval - 1
+            return 1
+        delay = self.delay
+        if self.state == SimuRunState.FAST_FORWARD:
+            delay = 0
+        return block_size(self.interval_step, self.graphing_interval, delay)
+
+
+    def save_snapshot(self, name:str):
+        '''Captures snapshot of the simulator state with the given name, see SimuSnapshot'''
+        self.snapshots[name] = Snapshot(self.simulation, self.params)
+        self.checkpoints.request()
+
+
+    def add_checkpoint(self):
+        '''Takes checkpoint for rewinding and sends the time of the oldest checkpoint to GUI'''
+        self.checkpoints.add(self.simulation, self.params)
+        self.conn.send(("checkpoint", self.checkpoints.start_time()))
+
+
+    def restore_snapshot(self, name:str):
+        '''Restores snapshot of the given name, see send_restored()'''
+        if self.simulation is None or name not in self.snapshots:
+            self.conn.send(("restored", False))
+            return
+        self.state = SimuRunState.STOPPED
+        self.snapshots[name].restore(self.simulation, self.params)
+        self.checkpoints.discard_after(self.params.simulation_time)
+        if self.recorder is not None:
+            self.recorder.discard_after(self.params.simulation_time)
+        self.send_restored()
+
+
+    def rewind(self, target_time:float):
+        '''Restores the nearest checkpoint before the target time, simulation is run to the
+           target time without delay when the GUI sets the state to STEPPING'''
+        checkpoint = None
+        if self.simulation is not None:
+            checkpoint = self.checkpoints.nearest(target_time)
+        if checkpoint is None:
+            self.conn.send(("restored", False))
+            return
+        self.state = SimuRunState.STOPPED
+        checkpoint.restore(self.simulation, self.params)
+        self.checkpoints.discard_after(checkpoint.simulation_time)
+        if self.recorder is not None:
+            self.recorder.discard_after(checkpoint.simulation_time)
+        self.replay_until = target_time
+        self.send_restored()
+
+
+    def send_restored(self):
+        '''Sends the restored inputs and the ring buffer write count to the GUI,
+           frames written before it are not drawn'''
+        self.interval_step = 0
+        self.conn.send(("restored", True, self.write_count, self.params.simulation_time,
+                        self.params.steptime, self.simulation.input_variables,
+                        list(self.simulation.input_texts)))
+
+
+    def send_to_graph(self, channels):
+        '''Writes aggregated ChannelSet frame to the ring buffer every graphing interval.
+           Waits for the GUI if the ring buffer is full, in fast forward the frame is skipped.
+           While rewinding nothing is written'''
+        if not isinstance(channels, ChannelSet):
+            raise TypeError("Simulation in process execution mode must send a ChannelSet")
+        if self.recorder is not None:
+            self.recorder.record_step(channels, self.params.simulation_time)
+        if self.replay_until is not None:
+            return
+        channels.accumulate()
+        self.interval_step += 1
+        if self.interval_step < self.graphing_interval:
+            return
+        self.write_frame(channels)
+
+
+    def send_block(self, channels, values):
+        '''Advances simulation time over the block computed with step_block() and writes the
+           aggregated frame to the ring buffer every graphing interval, see send_to_graph()'''
+        if len(values) == 0:
+            return
+        times = step_times(self.params, len(values))
+        self.params.simulation_time = times[-1]
+        if self.recorder is not None:
+            self.recorder.record_block(channels, values, times)
+        if self.replay_until is not None:
+            channels.data[...] = values[-1]
+            return
+        if self.state != SimuRunState.FAST_FORWARD:
+            time.sleep(self.delay*len(values))
+        channels.accumulate_block(values)
+        self.interval_step += len(values)
+        if self.interval_step < self.graphing_interval:
+            return
+        self.write_frame(channels)
+
+
+    def write_frame(self, channels):
+        '''Writes the aggregated ChannelSet frame to the ring buffer.
+           Waits for the GUI if the ring buffer is full, in fast forward the frame is skipped'''
+        self.interval_step = 0
+        if self.shm is None:
+            self.create_buffer(channels.dtype)
+        while self.write_count - int(self.header[HEADER_READ]) >= RING_SLOTS:
+            if self.state == SimuRunState.FAST_FORWARD:
+                return
+            if self.conn.poll(0.002):
+                self.read_commands()
+            if self.state == SimuRunState.STOPPED:
+                return
+
+        frame = channels.frame()
+        if frame.static:
+            # sent before the frame is committed, GUI attaches them to the frame by index
+            self.conn.send(("static", self.write_count, frame.static))
+        i = self.write_count % RING_SLOTS
+        self.ring["last"][i] = frame.data
+        self.ring["minimum"][i] = frame.min_data
+        self.ring["maximum"][i] = frame.max_data
+        self.ring["mean"][i] = frame.mean_data
+        self.write_count += 1
+        self.header[HEADER_TIME] = self.params.simulation_time
+        self.header[HEADER_STEPTIME] = self.params.steptime
+        self.header[HEADER_WRITE] = self.write_count
+
+        if self.state == SimuRunState.STEPPING:
+            self.state = SimuRunState.STOPPED
+
+
+    def create_buffer(self, dtype):
+        '''Creates the shared memory ring buffer and sends its name to the GUI'''
+        size = HEADER_LEN*np.dtype(np.float64).itemsize + RING_SLOTS*frame_dtype(dtype).itemsize
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.header, self.ring = map_buffer(self.shm, dtype)
+        self.header[:] = 0
+        self.conn.send(("buffer", self.shm.name, dtype))
+
+
+
+def worker_main(conn):
+    '''Worker process entry point'''
+    try:
+        _Worker(conn).main()
+    except Exception:
+        conn.send(("error", traceback.format_exc()))
+
+
+
+class SimulationProcess(QObject):
+    '''GUI side of the simulation running in a worker process.\n
+       The worker process is started once and reused, open() creates the simulator of the
+       opened simulation in the worker and release() removes it.\n
+       Has the input_variables, input_texts and update_matrixes() of the simulator object,
+       so that parameter updates work as with the simulator in a thread.
+       Frames are read from the ring buffer with a QTimer and emitted with step_data signal.'''
+    def __init__(self, signals):
+        super().__init__()
+        self.signals = signals
+        self.params = None
+        self.shm = None
+        self.header = None
+        self.ring = None
+        self.read_count = 0
+        self.pending_static = {}
+        self.input_variables = None
+        self.input_texts = None
+        self.released = True
+        self.releasing = False
+        self.restored = None
+        self.checkpoint_start = None
+        self.error = False
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.poll)
+
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+
+    def open(self, module_name, params, delay, command="open"):
+        '''Creates the simulator in the worker process and starts reading its frames'''
+        self.params = params
+        self.read_count = 0
+        self.pending_static = {}
+        self.input_variables = None
+        self.checkpoint_start = None
+        self.send(command, module_name, params.graphing_interval, delay)
+        self.released = False
+
+        # simulator is initialized in the worker, inputs are needed for parameter updates
+        deadline = time.monotonic() + START_TIMEOUT
+        while self.input_variables is None and self.process.is_alive():
+            if not self.conn.poll(deadline - time.monotonic()):
+                break
+            self.read_messages()
+            if self.error:
+                break
+        if self.input_variables is None:
+            self.release()
+            raise RuntimeError("Simulation process failed to open " + module_name)
+        # static values of a reloaded simulator sent before the reload are not used
+        self.pending_static = {}
+        self.timer.start(POLL_INTERVAL)
+
+
+    def reload(self, module_name, params, delay):
+        '''Reloads the simulation module in the worker and replaces the simulator, state of
+           the previous simulator is migrated to the new one. Frames of the previous simulator
+           are not drawn. Raises RuntimeError if the new simulator cannot be created'''
+        self.timer.stop()
+        self.ring = None
+        self.header = None
+        if self.shm is not None:
+            self.shm.close()
+            self.shm = None
+        self.send("state", SimuRunState.STOPPED)
+        self.open(module_name, params, delay, "reload")
+
+
+    def read_messages(self):
+        '''Handles all messages received from the worker'''
+        self.error = False
+        while self.conn.poll():
+            try:
+                message, *args = self.conn.recv()
+            except EOFError:
+                self.timer.stop()
+                return
+            if message == "ready":
+                self.input_variables, self.input_texts, self.params.simulation_time = args
+            elif message == "released":
+                self.released = True
+            elif self.released or self.releasing:
+                # messages of the released simulator are discarded
+                continue
+            elif message == "buffer":
+                self.shm = shared_memory.SharedMemory(name=args[0])
+                self.header, self.ring = map_buffer(self.shm, args[1])
+            elif message == "restored":
+                self.restored = args
+            elif message == "checkpoint":
+                self.checkpoint_start = args[0]
+            elif message == "static":
+                self.pending_static[args[0]] = args[1]
+            elif message == "signal":
+                getattr(self.signals, args[0]).emit(*args[1])
+            elif message == "error":
+                self.error = True
+                UtilityFunctions.txt_log("Simulation process error > " + args[0])
+                self.signals.simulation_error.emit([args[0], "Simulation process error"])
+
+
+    def poll(self):
+        '''Emits the frames written to the ring buffer since the previous poll'''
+        if self.ring is None:
+            self.read_messages()
+            return
+        # static values of the written frames have been sent before the write count
+        write_count = int(self.header[HEADER_WRITE])
+        self.read_messages()
+        while self.ring is not None and self.read_count < write_count:
+            record = self.ring[self.read_count % RING_SLOTS].copy()
+            static = self.pending_static.pop(self.read_count, None)
+            self.read_count += 1
+            self.header[HEADER_READ] = self.read_count
+            frame = ChannelFrame(np.array(record["last"]), static,
+                                 np.array(record["minimum"]),
+                                 np.array(record["maximum"]),
+                                 np.array(record["mean"]))
+            self.params.simulation_time = float(self.header[HEADER_TIME])
+            self.params.steptime = float(self.header[HEADER_STEPTIME])
+            self.signals.update_progress_bar.emit(False)
+            self.signals.step_data.emit(frame)
+
+
+    def send(self, *command):
+        '''Sends command to the worker'''
+        try:
+            self.conn.send(command)
+        except (BrokenPipeError, OSError):
+            UtilityFunctions.txt_log("Simulation process command failed > " + str(command[0]))
+
+
+    def update_matrixes(self, changed=None):
+        '''Sends the current inputs to the worker, where the update methods depending on the
+           changed inputs are executed between simulation steps, see SimuBindings'''
+        self.send("inputs", self.input_variables, self.input_texts, changed)
+
+
+    def set_state(self, state:int):
+        '''Sets the worker simulation run state, see SimuRunState'''
+        self.send("state", state)
+
+
+    def set_delay(self, delay:float):
+        '''Sets the delay between simulation steps'''
+        self.send("delay", delay)
+
+
+    def set_graphing_interval(self, interval:int):
+        '''Sets the graphing interval of the worker'''
+        self.send("interval", interval)
+
+
+    def record(self, directory:str, compressed:bool=False):
+        '''Starts recording the steps in the worker to the session directory,
+           see SimuRecorder'''
+        self.send("record", directory, compressed)
+
+
+    def restore_snapshot(self, name:str):
+        '''Restores snapshot of the given name in the worker, see wait_restored()'''
+        self.send("state", SimuRunState.STOPPED)
+        self.send("restore", name)
+        return self.wait_restored()
+
+
+    def rewind(self, target_time:float):
+        '''Restores the nearest checkpoint before the target time in the worker,
+           see wait_restored()'''
+        self.send("state", SimuRunState.STOPPED)
+        self.send("rewind", target_time)
+        return self.wait_restored()
+
+
+    def wait_restored(self):
+        '''Waits for the worker to restore the simulator state and send the restored inputs.
+           Frames written before restoring are skipped. Returns True if restored'''
+        self.restored = None
+        deadline = time.monotonic() + RESTORE_TIMEOUT
+        while self.restored is None and self.process.is_alive():
+            if not self.conn.poll(deadline - time.monotonic()):
+                break
+            self.read_messages()
+        if not self.restored or not self.restored[0]:
+            return False
+        (_, write_count, self.params.simulation_time, self.params.steptime,
+         input_variables, input_texts) = self.restored
+        self.input_variables[:] = input_variables
+        self.input_texts[:] = input_texts
+        self.read_count = write_count
+        self.pending_static = {}
+        if self.header is not None:
+            self.header[HEADER_READ] = write_count
+        return True
+
+
+    def release(self):
+        '''Releases the simulator in the worker, frames and messages sent before the
+           release are discarded'''
+        self.timer.stop()
+        self.releasing = True
+        self.ring = None
+        self.header = None
+        if self.shm is not None:
+            self.shm.close()
+            self.shm = None
+        self.send("state", SimuRunState.STOPPED)
+        self.send("release")
+        deadline = time.monotonic() + RELEASE_TIMEOUT
+        while not self.released and self.process.is_alive():
+            if not self.conn.poll(deadline - time.monotonic()):
+                break
+            self.read_messages()
+        self.released = True
+        self.releasing = False
+
+
+    def close(self):
+        '''Stops the worker process at the end of the session'''
+        if not self.released:
+            self.release()
+        self.send("close")
+        self.process.join(2)
+        if self.process.is_alive():
+            self.process.terminate()
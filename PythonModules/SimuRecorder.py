@@ -0,0 +1,273 @@
+'''SimuRecorder records the channel values of every simulation step to disk.\n
+DataRecorder appends the ChannelSet values and simulation time of each step to memory-mapped
+files in a session directory, so that long runs with short steptimes can be kept without
+holding them in memory. Files are preallocated and grown by doubling their length, which keeps
+appending constant time on average, and the step of any index is read directly from the file.\n
+Files of a recording:\n
+channels.dat: channel values of the steps, one record of the ChannelSet dtype per step\n
+time.dat: simulation times of the steps as float64\n
+recording.json: dtype of the channel records and the number of recorded steps\n
+Files are longer than the recorded steps while recording, recording.json tells the number of
+valid steps. Closed recordings are opened for reading with open_recording().\n
+RunRecorder records the ChannelSet of a running simulation, in MainWindow or in the worker
+process, when recording is enabled in the settings. Compressed recordings are written to
+recording.sfa with SimuArchive instead, open_recording() returns SimuArchive.ArchiveReader for
+them.\n
+When the simulation is restored to an earlier time, steps after it are discarded and the
+simulated steps are recorded again.'''
+
+## Licensing
+'''
+This file is part of SFDEsim.
+
+SFDEsim is free software: you can redistribute it and/or modify it under the terms of the
+ GNU General Public License as published by the Free Software Foundation, either version 3
+   of the License, or (at your option) any later version.
+
+SFDEsim is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+ even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+ See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with SFDEsim.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import os
+import time
+import numpy as np
+import UtilityFunctions
+import SimuArchive
+
+
+RECORDINGS_DIRECTORY = "Recordings"     # Directory of the session directories
+RECORD_STEPS = 65536        # Steps preallocated in new recording files
+CHANNELS_FILE = "channels.dat"
+TIME_FILE = "time.dat"
+INFO_FILE = "recording.json"
+
+
+
+def session_directory(location:str, simulation_name:str):
+    '''Returns new session directory for the recording of the simulation'''
+    name = simulation_name.replace(" ", "_") + "_" + time.strftime("%Y%m%d_%H%M%S")
+    directory = os.path.join(location, RECORDINGS_DIRECTORY, name)
+    suffix = 1
+    while os.path.exists(directory):
+        suffix += 1
+        directory = os.path.join(location, RECORDINGS_DIRECTORY, name + "_" + str(suffix))
+    return directory
+
+
+def dtype_from_description(description):
+    '''Returns dtype of the description saved in recording.json, JSON lists are returned
+       to the tuples used by NumPy'''
+    if isinstance(description, str):
+        return np.dtype(description)
+    fields = []
+    for field in description:
+        name, base = field[0], field[1]
+        if isinstance(base, list):
+            base = dtype_from_description(base)
+        if len(field) > 2:
+            fields.append((name, base, tuple(field[2])))
+        else:
+            fields.append((name, base))
+    return np.dtype(fields)
+
+
+def map_file(path:str, dtype, capacity:int, mode:str="r+"):
+    '''Returns memory map of the file with capacity elements, the file is created or
+       resized to the capacity when it is writable'''
+    if mode != "r":
+        with open(path, "ab") as file:
+            file.truncate(capacity*dtype.itemsize)
+    return np.memmap(path, dtype=dtype, mode=mode, shape=(capacity,))
+
+
+def open_recording(directory:str):
+    '''Returns read only DataRecorder of the recording in the directory, or ArchiveReader of
+       a compressed recording'''
+    archive = os.path.join(directory, SimuArchive.ARCHIVE_FILE)
+    if os.path.exists(archive):
+        return SimuArchive.ArchiveReader(archive)
+    info = UtilityFunctions.open_json_file(INFO_FILE, directory)
+    if info is None:
+        raise FileNotFoundError("No recording in " + directory)
+    return DataRecorder(directory, dtype_from_description(info["dtype"]), info["steps"],
+                        writable=False)
+
+
+
+class DataRecorder():
+    '''Recording of the channel values of every simulation step, see module description.\n
+       DataRecorder(directory, dtype) creates a new recording for channels of the given dtype,
+       append() and extend() add steps and recorder[i] returns the channel record of step i,
+       recorder.time(i) its simulation time. close() writes recording.json and releases the
+       files. Recorder is written in the simulator thread and read while the simulation is
+       stopped.'''
+    def __init__(self, directory:str, dtype, steps:int=0, writable:bool=True):
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self.steps = steps          # Recorded steps, files can be longer
+        self.writable = writable
+        self.values = None
+        self.times = None
+        if writable:
+            os.makedirs(directory, exist_ok=True)
+            self.map_files(max(RECORD_STEPS, steps), "r+")
+            self.write_info()
+        else:
+            self.map_files(steps, "r")
+
+
+    def map_files(self, capacity:int, mode:str):
+        '''Maps the recording files with the given capacity'''
+        self.values = None
+        self.times = None
+        if capacity == 0:
+            # empty files cannot be mapped
+            self.values = np.zeros(0, dtype=self.dtype)
+            self.times = np.zeros(0)
+            return
+        self.values = map_file(os.path.join(self.directory, CHANNELS_FILE), self.dtype,
+                               capacity, mode)
+        self.times = map_file(os.path.join(self.directory, TIME_FILE), np.dtype(np.float64),
+                              capacity, mode)
+
+
+    def __len__(self):
+        return self.steps
+
+
+    def __getitem__(self, index):
+        '''Returns channel record of the step index, or records of a slice of steps'''
+        return self.values[0:self.steps][index]
+
+
+    def time(self, index):
+        '''Returns simulation time of the step index, or times of a slice of steps'''
+        return self.times[0:self.steps][index]
+
+
+    def capacity(self):
+        '''Returns number of steps fitting in the files before they are grown'''
+        return len(self.values)
+
+
+    def reserve(self, steps:int):
+        '''Grows the files by doubling until the given number of steps fits'''
+        capacity = self.capacity()
+        if steps <= capacity:
+            return
+        while capacity < steps:
+            capacity *= 2
+        self.values.flush()
+        self.times.flush()
+        self.map_files(capacity, "r+")
+
+
+    def append(self, values, simulation_time:float):
+        '''Records channel values of one step, values is a record of the dtype'''
+        if self.steps == self.capacity():
+            self.reserve(self.steps + 1)
+        self.values[self.steps] = values
+        self.times[self.steps] = simulation_time
+        self.steps += 1
+
+
+    def extend(self, values, times):
+        '''Records channel values of consecutive steps, values is an array of the dtype'''
+        end = self.steps + len(values)
+        self.reserve(end)
+        self.values[self.steps:end] = values
+        self.times[self.steps:end] = times
+        self.steps = end
+
+
+    def discard_after(self, simulation_time:float):
+        '''Removes steps recorded after the given time, used when the simulation is restored
+           to an earlier time'''
+        self.steps = int(np.searchsorted(self.times[0:self.steps],
+                                         simulation_time + 1e-12, side="right"))
+
+
+    def index_of_time(self, simulation_time:float):
+        '''Returns index of the first step at or after the given time'''
+        return int(np.searchsorted(self.times[0:self.steps], simulation_time - 1e-12))
+
+
+    def write_info(self):
+        '''Writes recording.json with the dtype and the number of recorded steps'''
+        info = {"dtype": np.lib.format.dtype_to_descr(self.dtype), "steps": self.steps}
+        UtilityFunctions.write_json_file(INFO_FILE, info, self.directory + os.sep)
+
+
+    def flush(self):
+        '''Writes the recorded steps and recording.json to disk'''
+        if not self.writable:
+            return
+        self.values.flush()
+        self.times.flush()
+        self.write_info()
+
+
+    def close(self):
+        '''Writes the recording to disk and releases the files'''
+        self.flush()
+        self.values = None
+        self.times = None
+
+
+
+class RunRecorder():
+    '''Records the steps of a simulation run to the session directory, used by MainWindow and
+       the worker process. DataRecorder is created with the first recorded steps, when the
+       dtype of the ChannelSet is known. Simulations not sending ChannelSet are not recorded.
+       Compressed recording uses SimuArchive.ArchiveWriter instead of DataRecorder'''
+    def __init__(self, directory:str, compressed:bool=False):
+        self.directory = directory
+        self.compressed = compressed
+        self.recorder = None
+
+
+    def create_recorder(self, dtype):
+        '''Creates the recorder of the channel dtype'''
+        if self.compressed:
+            os.makedirs(self.directory, exist_ok=True)
+            self.recorder = SimuArchive.ArchiveWriter(
+                os.path.join(self.directory, SimuArchive.ARCHIVE_FILE), dtype)
+        else:
+            self.recorder = DataRecorder(self.directory, dtype)
+
+
+    def record_step(self, channels, simulation_time:float):
+        '''Records the current values of the ChannelSet'''
+        if self.recorder is None:
+            self.create_recorder(channels.dtype)
+        self.recorder.append(channels.data, simulation_time)
+
+
+    def record_block(self, channels, values, times):
+        '''Records the channel values of a block of steps, see SimuBlocks'''
+        if self.recorder is None:
+            self.create_recorder(channels.dtype)
+        self.recorder.extend(values, times)
+
+
+    def discard_after(self, simulation_time:float):
+        '''Removes steps recorded after the given time'''
+        if self.recorder is not None:
+            self.recorder.discard_after(simulation_time)
+
+
+    def flush(self):
+        '''Writes the recorded steps to disk'''
+        if self.recorder is not None:
+            self.recorder.flush()
+
+
+    def close(self):
+        '''Writes the recording to disk and releases the files'''
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
@@ -0,0 +1,240 @@
+'''SimuRegistry has the registry of the installed simulation modules.\n
+Simulation list and information of the simulation modules are kept in a cached manifest, so
+that the startup menu can be shown without importing any simulation module. Modules are
+imported when the simulation is opened, and the most often opened ones can be imported in
+the background after startup.\n
+Cached information of a file is used while its modification time and size are unchanged,
+otherwise the file hash is compared and the file is read again if the hash has changed.
+Module information is read from the source with ast, the module is not executed.'''
+
+## Licensing
+'''
+This file is part of SFDEsim.
+
+SFDEsim is free software: you can redistribute it and/or modify it under the terms of the
+ GNU General Public License as published by the Free Software Foundation, either version 3
+   of the License, or (at your option) any later version.
+
+SFDEsim is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+ even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+ See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with SFDEsim.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import os
+import sys
+import ast
+import json
+import hashlib
+import importlib
+import threading
+import UtilityFunctions
+
+
+MANIFEST_VERSION = 1
+MANIFEST_FILE = "simulation_manifest.json"
+LIST_FILE = "Simulation_list.json"
+MODULE_PACKAGE = "Simulation_files"
+
+
+
+def file_stat(path):
+    '''Returns modification time and size of the file, None if file does not exist'''
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def file_hash(path):
+    '''Returns sha1 hash of the file contents'''
+    with open(path, "rb") as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+
+def read_module_info(path):
+    '''Reads simulation name and process_safe class attribute from the module source,
+       without importing the module'''
+    with open(path, encoding="utf-8") as file:
+        tree = ast.parse(file.read(), filename=path)
+    info = {"simulation_name": "", "process_safe": False}
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        if node.name == "simulator":
+            for item in node.body:
+                if (isinstance(item, ast.Assign) and isinstance(item.value, ast.Constant)
+                        and any(getattr(target, "id", "") == "process_safe"
+                                for target in item.targets)):
+                    info["process_safe"] = bool(item.value.value)
+        elif node.name == "parameters":
+            for item in ast.walk(node):
+                if (isinstance(item, ast.Assign) and isinstance(item.value, ast.Constant)
+                        and any(getattr(target, "attr", "") == "simulation_name"
+                                for target in item.targets)):
+                    info["simulation_name"] = str(item.value.value)
+    return info
+
+
+
+class SimulationRegistry():
+    '''Registry of the simulation modules listed in Simulation_list.json.\n
+       subjects holds the simulation list as in the json file, entries holds the cached
+       information of each module by module name. Modules are imported with module(name).'''
+    def __init__(self, simulation_location:str, cache_location:str):
+        self.simulation_location = simulation_location
+        self.manifest_path = os.path.join(cache_location, MANIFEST_FILE)
+        self.manifest = self.read_manifest()
+        self.changed = False
+
+        self.subjects = self.read_list()
+        self.entries = {}
+        cached_modules = self.manifest["modules"]
+        for subject in self.subjects.values():
+            for simulation in subject.values():
+                module_name = simulation["filename"][0:-3]
+                self.entries[module_name] = self.read_entry(module_name,
+                                                            cached_modules.get(module_name))
+        self.manifest["modules"] = self.entries
+        if self.changed:
+            self.save_manifest()
+
+
+    def read_manifest(self):
+        '''Returns the cached manifest, or an empty one if the cache cannot be used'''
+        try:
+            with open(self.manifest_path, encoding="utf-8") as file:
+                manifest = json.load(file)
+            if manifest.get("version") == MANIFEST_VERSION:
+                return manifest
+        except (OSError, ValueError):
+            pass
+        return {"version": MANIFEST_VERSION, "list": {}, "subjects": {}, "modules": {},
+                "open_counts": {}}
+
+
+    def save_manifest(self):
+        '''Writes the manifest cache, failure is logged as the cache is only an optimization'''
+        try:
+            with open(self.manifest_path, "w", encoding="utf-8") as file:
+                json.dump(self.manifest, file, ensure_ascii=False, indent=4)
+        except OSError as error:
+            UtilityFunctions.txt_log("Simulation manifest write error > " + str(error))
+        self.changed = False
+
+
+    def is_current(self, path, cached):
+        '''Returns True if the cached entry of the file is valid.
+           Modification time and size of an unchanged file are updated in the entry'''
+        stat = file_stat(path)
+        if cached is None or stat is None:
+            return False
+        if cached.get("stat") == stat:
+            return True
+        if cached.get("sha1") == file_hash(path):
+            cached["stat"] = stat
+            self.changed = True
+            return True
+        return False
+
+
+    def read_list(self):
+        '''Returns the subjects of the simulation list, from cache if the list is unchanged'''
+        path = os.path.join(self.simulation_location, LIST_FILE)
+        if self.is_current(path, self.manifest["list"]):
+            return self.manifest["subjects"]
+        simulation_info = UtilityFunctions.open_json_file(LIST_FILE, self.simulation_location)
+        if simulation_info is None:
+            return {}
+        self.manifest["list"] = {"stat": file_stat(path), "sha1": file_hash(path)}
+        self.manifest["subjects"] = simulation_info["subjects"]
+        self.changed = True
+        return self.manifest["subjects"]
+
+
+    def read_entry(self, module_name, cached):
+        '''Returns the manifest entry of the module, from cache if the module is unchanged'''
+        path = os.path.join(self.simulation_location, module_name + ".py")
+        if cached is not None and not cached["exists"] and file_stat(path) is None:
+            return cached
+        if self.is_current(path, cached):
+            return cached
+        self.changed = True
+        if file_stat(path) is None:
+            return {"exists": False}
+        entry = {"exists": True, "stat": file_stat(path), "sha1": file_hash(path)}
+        try:
+            entry.update(read_module_info(path))
+        except (SyntaxError, UnicodeDecodeError) as error:
+            UtilityFunctions.txt_log("Simulation module read error " + module_name
+                                     + " > " + str(error))
+        return entry
+
+
+    def is_available(self, module_name:str):
+        '''Returns True if the module file of the simulation exists'''
+        return self.entries.get(module_name, {}).get("exists", False)
+
+
+    def module(self, module_name:str):
+        '''Imports the simulation module, or returns it if already imported.
+           Raises ImportError if module cannot be imported'''
+        if not self.is_available(module_name):
+            raise ImportError(module_name + " not found")
+        try:
+            return importlib.import_module(MODULE_PACKAGE + "." + module_name)
+        except ImportError:
+            raise
+        except Exception as error:
+            raise ImportError(module_name + " import failed: " + str(error)) from error
+
+
+    def reload(self, module_name:str):
+        '''Imports the edited simulation module again and updates its manifest entry.
+           Module stays in its previous version if the reload fails, which raises ImportError'''
+        full_name = MODULE_PACKAGE + "." + module_name
+        if full_name not in sys.modules:
+            return self.module(module_name)
+        self.entries[module_name] = self.read_entry(module_name, self.entries.get(module_name))
+        if self.changed:
+            self.save_manifest()
+        try:
+            return importlib.reload(sys.modules[full_name])
+        except Exception as error:
+            raise ImportError(module_name + " reload failed: " + str(error)) from error
+
+
+    def record_open(self, module_name:str):
+        '''Counts the opening of the simulation, used to select the modules to pre-warm'''
+        counts = self.manifest["open_counts"]
+        counts[module_name] = counts.get(module_name, 0) + 1
+        self.save_manifest()
+
+
+    def most_opened(self, count:int):
+        '''Returns names of the given number of most often opened available modules'''
+        counts = self.manifest["open_counts"]
+        names = [name for name in counts if self.is_available(name)]
+        names.sort(key=lambda name: counts[name], reverse=True)
+        return names[0:count]
+
+
+    def prewarm(self, count:int):
+        '''Imports the most often opened modules in a background thread,
+           import errors are logged and shown when the simulation is opened'''
+        names = self.most_opened(count)
+        if not names:
+            return
+        threading.Thread(target=self.import_modules, args=(names,), daemon=True).start()
+
+
+    def import_modules(self, module_names):
+        '''Imports the given modules, executed in the pre-warm thread'''
+        for module_name in module_names:
+            try:
+                self.module(module_name)
+            except ImportError as error:
+                UtilityFunctions.txt_log("Simulation pre-warm error > " + str(error))
@@ -0,0 +1,97 @@
+'''SimuRender repaints the graphs of the simulation view at most once per display frame.\n
+Graph widgets add the data of each graphing step to their buffers when it arrives and mark
+themselves dirty with schedule(). RenderScheduler redraws all dirty widgets in one pass when
+the frame timer fires, so a fast simulation, or many frames read at once in process mode,
+only adds data and the drawing cost is capped by the frame rate.\n
+Widgets implement render(), which draws their changed items and sets their axis ranges.
+Frame rate is set from the settings, 60 or 30 frames per second, 0 draws every update
+immediately as before the scheduler.'''
+
+## Licensing
+'''
+This file is part of SFDEsim.
+
+SFDEsim is free software: you can redistribute it and/or modify it under the terms of the
+ GNU General Public License as published by the Free Software Foundation, either version 3
+   of the License, or (at your option) any later version.
+
+SFDEsim is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+ even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+ See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with SFDEsim.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+# pylint: disable=E0611
+import time
+from PySide6.QtCore import QObject, QTimer
+
+
+RENDER_RATE = 60            # Default frames per second
+
+_scheduler = None           # Shared RenderScheduler, see render_scheduler()
+
+
+
+def render_scheduler():
+    '''Returns the RenderScheduler shared by the graph widgets, created on first use'''
+    global _scheduler   # pylint: disable=W0603
+    if _scheduler is None:
+        _scheduler = RenderScheduler()
+    return _scheduler
+
+
+def schedule(widget):
+    '''Marks the widget dirty, it is rendered with the next frame'''
+    render_scheduler().schedule(widget)
+
+
+
+class RenderScheduler(QObject):
+    '''Renders widgets marked dirty once per frame, see module description.\n
+       Timer runs only while widgets are waiting, first widget marked after an idle period
+       is rendered when a frame interval has passed from the previous render.'''
+    def __init__(self, frame_rate:int=RENDER_RATE):
+        super().__init__()
+        self.dirty = {}             # Widgets waiting for render, dict keeps the marking order
+        self.frame_rate = frame_rate
+        self.last_render = 0.0      # time.monotonic() of the previous render
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.render)
+
+
+    def set_frame_rate(self, frame_rate:int):
+        '''Sets frames per second, 0 renders every widget when it is marked'''
+        self.frame_rate = frame_rate
+        if frame_rate <= 0:
+            self.render()
+
+
+    def schedule(self, widget):
+        '''Marks the widget dirty and starts the frame timer'''
+        if self.frame_rate <= 0:
+            widget.render()
+            return
+        self.dirty[widget] = None
+        if not self.timer.isActive():
+            interval = 1/self.frame_rate
+            wait = interval - (time.monotonic() - self.last_render)
+            self.timer.start(max(0, int(1000*wait)))
+
+
+    def render(self):
+        '''Renders the dirty widgets in one pass'''
+        self.timer.stop()
+        self.last_render = time.monotonic()
+        widgets = list(self.dirty)
+        self.dirty = {}
+        for widget in widgets:
+            widget.render()
+
+
+    def clear(self):
+        '''Removes the waiting widgets, used when the simulation view is closed'''
+        self.timer.stop()
+        self.dirty = {}
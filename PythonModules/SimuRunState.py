@@ -0,0 +1,138 @@
+'''SimuRunState has the run state machine controlling the simulation flow.\n
+RunState is shared by the GUI and the simulator thread. GUI sets the state, simulator thread
+reads it once every step and waits on a condition variable when it cannot continue, so that
+start and step wake the simulator immediately.\n
+States:\n
+STOPPED: simulator waits until the state is changed\n
+RUNNING: simulation runs with the set speed, waits for graphs to keep up\n
+STEPPING: simulation runs until the next graphing step has been drawn, then stops\n
+FAST_FORWARD: simulation runs without step delay or waiting for graphs, graphing steps are
+skipped while the previous one is being drawn\n
+Functions given to call() are executed by the simulator thread at the start of its next step,
+this is used to modify the simulator state, for example restoring snapshots, between steps.
+Errors of the functions are logged and call() returns False, the simulator keeps running.'''
+
+## Licensing
+'''
+This file is part of SFDEsim.
+
+SFDEsim is free software: you can redistribute it and/or modify it under the terms of the
+ GNU General Public License as published by the Free Software Foundation, either version 3
+   of the License, or (at your option) any later version.
+
+SFDEsim is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+ even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+ See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with SFDEsim.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import threading
+import traceback
+import UtilityFunctions
+
+
+STOPPED = 0
+RUNNING = 1
+STEPPING = 2
+FAST_FORWARD = 3
+
+CALL_TIMEOUT = 5        # Time in seconds to wait for the simulator thread to execute a call
+
+
+class RunState():
+    '''Run state of the simulation.\n
+       set() is called from the GUI, ready() from the simulator thread every step.
+       graph_sent() and graph_drawn() keep track of the graphing step sent to the graphs.'''
+    def __init__(self):
+        self.state = STOPPED
+        self.graph_pending = False      # Graphing step sent but not yet drawn
+        self.closing = False
+        self.calls = []                 # Functions waiting to be executed in simulator thread
+        self.failed = []                # Executed functions that raised an error
+        self.condition = threading.Condition()
+
+
+    def set(self, state:int):
+        '''Sets new run state and wakes the simulator thread'''
+        with self.condition:
+            self.state = state
+            self.condition.notify_all()
+
+
+    def close(self):
+        '''Stops the simulation and releases the simulator thread from waiting'''
+        with self.condition:
+            self.state = STOPPED
+            self.closing = True
+            self.condition.notify_all()
+
+
+    def ready(self, graph_due:bool):
+        '''Returns True when simulator can take the next step, blocks while it cannot.
+           graph_due is True when the next graphing step is near, then simulator waits for
+           the previous graphing step to be drawn. Returns False when closing'''
+        if not self.calls:
+            if self.state == RUNNING and not self.graph_pending:
+                return True
+            if self.state == FAST_FORWARD:
+                return True
+        with self.condition:
+            while not self.closing:
+                if self.calls:
+                    self.execute_calls()
+                elif self.state == STOPPED:
+                    self.condition.wait()
+                elif self.graph_pending and (graph_due or self.state == STEPPING):
+                    self.condition.wait()
+                else:
+                    return True
+            return False
+
+
+    def call(self, function, timeout:float=CALL_TIMEOUT):
+        '''Executes function in the simulator thread at the start of its next step and waits
+           until it has been executed. Returns False if the function raised an error or was
+           not executed before the timeout or closing'''
+        with self.condition:
+            self.calls.append(function)
+            self.condition.notify_all()
+            self.condition.wait_for(lambda: function not in self.calls or self.closing, timeout)
+            if function in self.calls:
+                self.calls.remove(function)
+                return False
+            if function in self.failed:
+                self.failed.remove(function)
+                return False
+            return True
+
+
+    def execute_calls(self):
+        '''Executes waiting calls, executed in the simulator thread with the condition locked.
+           Functions raising an error are logged and marked failed for call()'''
+        for function in self.calls:
+            try:
+                function()
+            except Exception:
+                UtilityFunctions.txt_log("Simulator call failed > " + traceback.format_exc())
+                self.failed.append(function)
+        self.calls = []
+        self.condition.notify_all()
+
+
+    def graph_sent(self):
+        '''Marks graphing step sent, executed in the simulator thread'''
+        self.graph_pending = True
+
+
+    def graph_drawn(self):
+        '''Marks graphing step drawn and wakes the simulator thread.
+           Returns True if a step was completed and the simulation stopped'''
+        with self.condition:
+            self.graph_pending = False
+            step_done = self.state == STEPPING
+            if step_done:
+                self.state = STOPPED
+            self.condition.notify_all()
+        return step_done
@@ -0,0 +1,278 @@
+'''SimuSnapshot has the in-memory snapshot of the simulator object state.\n
+Snapshot copies the numerical state of the simulator, its inputs and the simulation time into
+a single NumPy structured record. Restoring a snapshot returns the simulation to the captured
+state without creating the simulator again or executing update_matrixes(), which is used to
+reset simulations and to retry parts of them, for example a fault, with different inputs.\n
+Captured attributes of the simulator object:\n
+number, NumPy array and numerical list attributes, stored in the record\n
+string and string list attributes, such as input_texts, stored as copies\n
+SimuChannels.ChannelSet values and published static values, static values are sent to the
+graphs again with the next frame after restoring\n
+SimuStateSpace.StateSpaceModel states\n
+Other objects, such as the parameter object, signals and methods of the parent are not part of
+the snapshot.\n
+Snapshot can also be migrated to a simulator of a reloaded simulation module, then only the
+attributes which exist in the new simulator with the same type and shape are written.\n
+CheckpointRing holds snapshots taken periodically in simulation time, which are used to rewind
+the simulation. Memory use is bounded by the number of slots in the ring.'''
+
+## Licensing
+'''
+This file is part of SFDEsim.
+
+SFDEsim is free software: you can redistribute it and/or modify it under the terms of the
+ GNU General Public License as published by the Free Software Foundation, either version 3
+   of the License, or (at your option) any later version.
+
+SFDEsim is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+ even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+ See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with SFDEsim.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+# pylint: disable=E0611
+from copy import copy
+from collections import deque
+from PySide6.QtCore import QObject
+import numpy as np
+from SimuChannels import ChannelSet
+from SimuStateSpace import StateSpaceModel
+
+
+NUMERIC_KINDS = "biufc"     # NumPy dtype kinds stored in the snapshot record
+CHECKPOINT_SLOTS = 32       # Checkpoints kept in CheckpointRing
+CHECKPOINT_STEPS = 500      # Default checkpoint interval in simulation steps
+
+
+
+def numeric_kind(value):
+    '''Returns how the attribute value is stored in the snapshot record:
+       "array", "list", "tuple", "scalar", or None if it is not numerical'''
+    if isinstance(value, np.ndarray):
+        return "array" if value.dtype.kind in NUMERIC_KINDS else None
+    if isinstance(value, (bool, int, float, complex, np.number, np.bool_)):
+        return "scalar"
+    if isinstance(value, (list, tuple)):
+        try:
+            array = np.asarray(value)
+        except ValueError:
+            return None
+        if array.dtype.kind in NUMERIC_KINDS:
+            return type(value).__name__
+    return None
+
+
+def is_text(value):
+    '''Returns True for strings and lists of strings'''
+    if isinstance(value, str):
+        return True
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+
+
+class Snapshot():
+    '''Captured state of a simulator object.\n
+       Snapshot(simulation, params) captures the current state and
+       snapshot.restore(simulation, params) writes it back to the same simulator.
+       Both must be executed between simulation steps in the thread running the simulator.'''
+    def __init__(self, simulation, params):
+        self.simulation_time = params.simulation_time
+        self.steptime = params.steptime
+        self.kinds = {}         # Holds storage kind of record fields
+        self.types = {}         # Holds types of scalar attributes
+        self.texts = {}         # Holds copies of string attributes
+        self.channels = {}      # Holds ChannelSet values as name: (data, static, versions)
+        self.models = {}        # Holds StateSpaceModel states
+
+        fields = []
+        values = []
+        for name, value in vars(simulation).items():
+            if callable(value) or isinstance(value, QObject):
+                continue
+            if isinstance(value, ChannelSet):
+                self.channels[name] = (value.data.copy(), dict(value.static),
+                                       dict(value.static_versions))
+                continue
+            if isinstance(value, StateSpaceModel):
+                self.models[name] = value.state.copy()
+                continue
+            if is_text(value):
+                self.texts[name] = copy(value)
+                continue
+            kind = numeric_kind(value)
+            if kind is None:
+                continue
+            array = np.asarray(value)
+            fields.append((name, array.dtype, array.shape))
+            values.append(array)
+            self.kinds[name] = kind
+            if kind == "scalar":
+                self.types[name] = type(value)
+
+        self.record = np.zeros((), dtype=fields)
+        for (name, _, _), array in zip(fields, values):
+            self.record[name] = array
+
+
+    def restore(self, simulation, params):
+        '''Writes the captured state back to the simulator object.
+           Arrays and lists are restored in place, so references to them stay valid'''
+        params.simulation_time = self.simulation_time
+        params.steptime = self.steptime
+        for name in self.kinds:
+            self.restore_attribute(simulation, name)
+        for name in self.texts:
+            self.restore_text(simulation, name)
+        for name in self.channels:
+            self.restore_channels(simulation, name)
+        for name, state in self.models.items():
+            getattr(simulation, name).state = state.copy()
+
+
+    def migrate(self, simulation, params):
+        '''Writes the compatible part of the captured state to a new simulator object, used when
+           the simulation module has been reloaded. Attributes are written if they exist in the
+           new simulator with the same type and shape. Simulation time is kept, steptime is
+           the one of the new parameter object. Returns names of the migrated attributes'''
+        params.simulation_time = self.simulation_time
+        migrated = []
+        for name, kind in self.kinds.items():
+            value = self.record[name]
+            current = getattr(simulation, name, None)
+            if numeric_kind(current) != kind or np.shape(current) != value.shape:
+                continue
+            if kind == "array" and current.dtype != value.dtype:
+                continue
+            if kind == "scalar" and type(current) is not self.types[name]:
+                continue
+            self.restore_attribute(simulation, name)
+            migrated.append(name)
+        for name, value in self.texts.items():
+            current = getattr(simulation, name, None)
+            if type(current) is not type(value) or (isinstance(value, list)
+                                                    and len(current) != len(value)):
+                continue
+            self.restore_text(simulation, name)
+            migrated.append(name)
+        for name, (data, _, _) in self.channels.items():
+            current = getattr(simulation, name, None)
+            if not isinstance(current, ChannelSet) or current.dtype != data.dtype:
+                continue
+            self.restore_channels(simulation, name)
+            migrated.append(name)
+        for name, state in self.models.items():
+            current = getattr(simulation, name, None)
+            if not isinstance(current, StateSpaceModel) or current.state.shape != state.shape:
+                continue
+            current.state = state.copy()
+            migrated.append(name)
+        return migrated
+
+
+    def restore_attribute(self, simulation, name:str):
+        '''Writes the captured numerical attribute back to the simulator'''
+        kind = self.kinds[name]
+        value = self.record[name]
+        current = getattr(simulation, name, None)
+        if kind == "array":
+            if (isinstance(current, np.ndarray) and current.shape == value.shape
+                    and current.dtype == value.dtype):
+                current[...] = value
+            else:
+                setattr(simulation, name, value.copy())
+        elif kind == "scalar":
+            setattr(simulation, name, self.types[name](value))
+        elif kind == "list" and isinstance(current, list):
+            current[:] = value.tolist()
+        elif kind == "list":
+            setattr(simulation, name, value.tolist())
+        else:
+            setattr(simulation, name, tuple(value.tolist()))
+
+
+    def restore_text(self, simulation, name:str):
+        '''Writes the captured string attribute back to the simulator'''
+        value = self.texts[name]
+        current = getattr(simulation, name, None)
+        if isinstance(value, list) and isinstance(current, list):
+            current[:] = value
+        else:
+            setattr(simulation, name, copy(value))
+
+
+    def restore_channels(self, simulation, name:str):
+        '''Writes the captured ChannelSet values back to the simulator,
+           static values are sent again with the next frame'''
+        data, static, versions = self.channels[name]
+        channels = getattr(simulation, name)
+        channels.data[...] = data
+        channels.static = dict(static)
+        channels.static_versions = dict(versions)
+        channels.aggregated_steps = 0
+        channels.resend_static()
+
+
+    def size(self):
+        '''Returns size of the snapshot record in bytes'''
+        return self.record.nbytes
+
+
+
+class CheckpointRing():
+    '''Bounded ring of simulator snapshots taken every interval of simulation time.\n
+       Interval is read from checkpoint_interval of the parameter object if it is declared,
+       otherwise it is CHECKPOINT_STEPS simulation steps. When the ring is full the oldest
+       checkpoint is dropped.\n
+       Checkpoint can be requested for the next step with request(), this is done when inputs
+       are updated or snapshots saved, so that simulating forward from the nearest checkpoint
+       gives the same result.'''
+    def __init__(self, params, slots:int=CHECKPOINT_SLOTS):
+        self.interval = getattr(params, "checkpoint_interval", CHECKPOINT_STEPS*params.steptime)
+        self.checkpoints = deque(maxlen=slots)
+        self.next_time = params.simulation_time
+        self.requested = False
+
+
+    def due(self, simulation_time:float):
+        '''Returns True if checkpoint should be taken at the given simulation time'''
+        return self.requested or simulation_time >= self.next_time
+
+
+    def add(self, simulation, params):
+        '''Takes checkpoint of the simulator, executed between simulation steps'''
+        self.checkpoints.append(Snapshot(simulation, params))
+        self.next_time = params.simulation_time + self.interval
+        self.requested = False
+
+
+    def request(self):
+        '''Requests checkpoint to be taken at the next step'''
+        self.requested = True
+
+
+    def nearest(self, simulation_time:float):
+        '''Returns the latest checkpoint taken at or before the given time,
+           None if there is no such checkpoint'''
+        for checkpoint in reversed(self.checkpoints):
+            if checkpoint.simulation_time <= simulation_time:
+                return checkpoint
+        return None
+
+
+    def discard_after(self, simulation_time:float):
+        '''Removes checkpoints taken after the given time, used when simulation is returned
+           to earlier time and continues from there'''
+        while self.checkpoints and self.checkpoints[-1].simulation_time > simulation_time:
+            self.checkpoints.pop()
+        self.next_time = simulation_time + self.interval
+        if not self.checkpoints:
+            self.next_time = simulation_time
+
+
+    def start_time(self):
+        '''Returns time of the oldest checkpoint, None if the ring is empty'''
+        if not self.checkpoints:
+            return None
+        return self.checkpoints[0].simulation_time
@@ -0,0 +1,269 @@
+'''SimuStaging computes input updates of a running simulator outside the simulator thread.\n
+Update methods of the simulator, update_matrixes() or the methods declared in
+update_dependencies, are executed in a background thread on a staging copy of the simulator,
+while the simulator continues stepping with the previous values. The result is committed to
+the simulator in the simulator thread between two steps, so the simulator never sees partly
+updated values and the GUI is not blocked by expensive updates.\n
+Staging copy does not share the objects which update methods modify:\n
+NumPy arrays and lists are copied, they are written back if the update modified them\n
+parameter object is copied, attributes assigned by the update are written back\n
+ChannelSet static values published by the update are published to the simulator at commit\n
+StateSpaceModel matrices and input sources are committed, the simulator keeps its state\n
+Attributes assigned by the update are written to the simulator, other attributes, such as the
+state advanced by the simulator meanwhile, are kept. Methods of the staging copy assigned as
+values, for example model input sources, are bound to the simulator at commit.\n
+Updates are computed one at a time, inputs changed during an update are computed after it
+with the latest values.'''
+
+## Licensing
+'''
+This file is part of SFDEsim.
+
+SFDEsim is free software: you can redistribute it and/or modify it under the terms of the
+ GNU General Public License as published by the Free Software Foundation, either version 3
+   of the License, or (at your option) any later version.
+
+SFDEsim is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+ even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+ See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with SFDEsim.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+from copy import copy
+import threading
+import traceback
+import numpy as np
+from SimuChannels import ChannelSet
+from SimuStateSpace import StateSpaceModel
+from SimuBindings import update_changed
+import UtilityFunctions
+
+
+MODEL_MATRICES = ("A", "B", "C", "D")     # StateSpaceModel attributes committed by the update
+
+
+
+def staging_class(simulator_class, assigned:set):
+    '''Returns subclass of the simulator class which records names of assigned attributes'''
+    def record_assignment(self, name, value):
+        simulator_class.__setattr__(self, name, value)
+        assigned.add(name)
+    return type("Staged" + simulator_class.__name__, (simulator_class,),
+                {"__setattr__": record_assignment})
+
+
+def merge_changed(pending, changed):
+    '''Returns changed input names of two updates, None means that all inputs have changed'''
+    if pending is None or changed is None:
+        return None
+    return pending + [name for name in changed if name not in pending]
+
+
+
+class StagedUpdate():
+    '''Update of the simulator inputs computed on a staging copy.\n
+       StagedUpdate(simulation, params, input_variables, input_texts, changed) creates the
+       staging copy with the given inputs, compute() executes the update methods of the
+       changed inputs, see SimuBindings, and commit() writes the result to the simulator.
+       The copy is created between simulator steps, compute() can be executed in any thread
+       and commit() is executed in the simulator thread between steps.'''
+    def __init__(self, simulation, params, input_variables, input_texts, changed):
+        self.simulation = simulation
+        self.params = params
+        self.changed = changed
+        self.assigned = set()       # Names of the attributes assigned by the update
+        self.baseline = {}          # Holds copies of arrays, lists and parameters at staging
+
+        cls = staging_class(type(simulation), self.assigned)
+        self.staged = cls.__new__(cls)
+        values = vars(self.staged)
+        for name, value in vars(simulation).items():
+            values[name] = self.staged_value(name, value)
+        # inputs are compared with the simulator inputs and written in place at commit
+        values["input_variables"] = np.array(input_variables, copy=True)
+        values["input_texts"] = list(input_texts)
+
+
+    def staged_value(self, name:str, value):
+        '''Returns the value used in the staging copy'''
+        if value is self.params:
+            self.baseline[name] = dict(vars(value))
+            return copy(value)
+        if isinstance(value, (np.ndarray, list)):
+            self.baseline[name] = copy(value)
+            return copy(value)
+        if isinstance(value, ChannelSet):
+            self.baseline[name] = dict(value.static_versions)
+            channels = copy(value)
+            channels.static = dict(value.static)
+            channels.static_versions = dict(value.static_versions)
+            return channels
+        if isinstance(value, StateSpaceModel):
+            self.baseline[name] = (value.method, value.A, value.B, value.C, value.D,
+                                   list(value.sources))
+            model = copy(value)
+            model.sources = list(value.sources)
+            return model
+        return value
+
+
+    def compute(self):
+        '''Executes the update methods on the staging copy'''
+        update_changed(self.staged, self.changed)
+
+
+    def commit(self):
+        '''Writes the result of the update to the simulator, executed in the simulator thread
+           between steps'''
+        staged_values = vars(self.staged)
+        for name, value in staged_values.items():
+            if name in self.assigned:
+                setattr(self.simulation, name, self.bound(value))
+            elif name in self.baseline:
+                self.commit_value(name, value)
+
+
+    def commit_value(self, name:str, value):
+        '''Writes copied value back to the simulator if the update has modified it'''
+        current = getattr(self.simulation, name)
+        baseline = self.baseline[name]
+        if current is self.params:
+            for attribute, attribute_value in vars(value).items():
+                if attribute not in baseline or attribute_value is not baseline[attribute]:
+                    setattr(current, attribute, attribute_value)
+        elif isinstance(value, np.ndarray):
+            if value.shape != baseline.shape or not np.array_equal(value, baseline):
+                if current.shape == value.shape and current.dtype == value.dtype:
+                    current[...] = value
+                else:
+                    setattr(self.simulation, name, value)
+        elif isinstance(value, list):
+            if value != baseline:
+                current[:] = [self.bound(item) for item in value]
+        elif isinstance(value, ChannelSet):
+            for static_name, version in value.static_versions.items():
+                if baseline.get(static_name) != version:
+                    current.publish(static_name, value.static[static_name])
+        elif isinstance(value, StateSpaceModel):
+            self.commit_model(current, value, baseline)
+
+
+    def commit_model(self, model, staged, baseline):
+        '''Writes StateSpaceModel matrices and sources to the simulator model, the model keeps
+           its state unless the number of states has changed'''
+        method, sources = baseline[0], baseline[-1]
+        matrices = [getattr(staged, matrix) for matrix in MODEL_MATRICES]
+        if (staged.method != method or staged.sources != sources
+                or any(new is not old for new, old in zip(matrices, baseline[1:5]))):
+            model.method = staged.method
+            model.set_matrices(*matrices)
+            model.sources = [self.bound(source) for source in staged.sources]
+            model.discrete = None
+
+
+    def bound(self, value):
+        '''Returns methods of the staging copy as methods of the simulator'''
+        if callable(value) and getattr(value, "__self__", None) is self.staged:
+            return getattr(self.simulation, value.__name__)
+        return value
+
+
+
+class UpdateStager():
+    '''Computes the input updates of a simulator running in a thread, see module description.\n
+       input_variables and input_texts are the latest inputs given by the GUI, inputs are
+       written to them and submit(changed) is called, changed being the changed input names or
+       None for a full update. run_state is the SimuRunState.RunState of the simulator, its
+       call() commits the update. committed is called in the simulator thread after commit'''
+    def __init__(self, simulation, params, run_state, committed=None):
+        self.simulation = simulation
+        self.params = params
+        self.run_state = run_state
+        self.committed = committed
+        self.input_variables = None
+        self.input_texts = None
+        self.pending = []           # Changed input names of the next update
+        self.waiting = False        # Update waiting to be computed
+        self.generation = 0         # Incremented when inputs are synced, older updates are dropped
+        self.closed = False
+        self.thread = None
+        self.lock = threading.Lock()
+        self.sync()
+
+
+    def sync(self):
+        '''Copies the inputs of the simulator, used after the simulator has been restored.
+           Update being computed is not committed'''
+        with self.lock:
+            self.generation += 1
+            self.waiting = False
+            self.input_variables = np.array(self.simulation.input_variables, copy=True)
+            self.input_texts = list(self.simulation.input_texts)
+
+
+    def read(self, bindings):
+        '''Reads the input widgets with SimuBindings.BindingTable, returns names of the changed
+           inputs'''
+        with self.lock:
+            return bindings.read(self.input_variables, self.input_texts)
+
+
+    def submit(self, changed):
+        '''Requests update of the changed inputs, computed in the background thread'''
+        with self.lock:
+            if self.closed:
+                return
+            self.pending = merge_changed(self.pending, changed) if self.waiting else changed
+            self.waiting = True
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+
+    def close(self):
+        '''Stops computing updates, update being computed is not committed'''
+        with self.lock:
+            self.closed = True
+            self.waiting = False
+
+
+    def run(self):
+        '''Background thread computing updates until no update is waiting'''
+        while True:
+            with self.lock:
+                if not self.waiting or self.closed:
+                    self.thread = None
+                    return
+                changed = self.pending
+                generation = self.generation
+                input_variables = self.input_variables.copy()
+                input_texts = list(self.input_texts)
+                self.waiting = False
+            update = None
+
+            def stage():
+                nonlocal update
+                update = StagedUpdate(self.simulation, self.params, input_variables,
+                                      input_texts, changed)
+            if not self.run_state.call(stage):
+                UtilityFunctions.txt_log("Simulation update not staged, simulator not responding")
+                continue
+            try:
+                update.compute()
+            except Exception:
+                UtilityFunctions.txt_log("Simulation update failed > " + traceback.format_exc())
+                continue
+            if not self.run_state.call(lambda: self.commit(update, generation)):
+                UtilityFunctions.txt_log("Simulation update not committed, "
+                                         "simulator not responding")
+
+
+    def commit(self, update, generation:int):
+        '''Commits the update and notifies, executed in the simulator thread'''
+        if self.closed or generation != self.generation:
+            return
+        update.commit()
+        if self.committed is not None:
+            self.committed()
@@ -0,0 +1,192 @@
+'''SimuStateSpace has the linear state-space model stepped by the framework.\n
+Simulation declares the model matrices of\n
+dx/dt = A x + B u\n
+y = C x + D u\n
+usually in update_matrixes(), and the input sources, which are constants or functions of a
+time array. The model is discretized once for each steptime and stepped over blocks of steps
+with step_block(), see SimuBlocks. Simulation does not need its own integration code.\n
+Methods:\n
+ZOH: exact discretization for inputs held constant over the step, with matrix exponential\n
+RK4: fourth order Runge-Kutta, inputs are evaluated at the start, middle and end of the step\n
+TRAPEZOIDAL: implicit trapezoidal rule, inputs are evaluated at the start and end of the step\n
+EULER: forward Euler, inputs are evaluated at the start of the step\n
+AUTO: ZOH when inputs are constant or given as held values, otherwise RK4\n
+All methods reduce to a linear recurrence x[k+1] = Phi x[k] + w[k], where the input terms w of
+the whole block are computed as arrays before the recurrence.'''
+
+## Licensing
+'''
+This file is part of SFDEsim.
+
+SFDEsim is free software: you can redistribute it and/or modify it under the terms of the
+ GNU General Public License as published by the Free Software Foundation, either version 3
+   of the License, or (at your option) any later version.
+
+SFDEsim is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+ even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+ See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with SFDEsim.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import numpy as np
+
+
+ZOH = "zoh"
+RK4 = "rk4"
+TRAPEZOIDAL = "trapezoidal"
+EULER = "euler"
+AUTO = "auto"
+
+EXPM_TERMS = 18         # Taylor series terms of the scaled matrix exponential
+
+
+
+def expm(matrix):
+    '''Returns matrix exponential, computed with scaling and squaring of the Taylor series'''
+    matrix = np.asarray(matrix, dtype=float)
+    norm = np.linalg.norm(matrix, np.inf)
+    squarings = max(0, int(np.ceil(np.log2(norm))) + 1) if norm > 0.5 else 0
+    scaled = matrix/(2**squarings)
+    result = np.eye(len(matrix))
+    term = np.eye(len(matrix))
+    for i in range(1, EXPM_TERMS):
+        term = term.dot(scaled)/i
+        result = result + term
+    for _ in range(squarings):
+        result = result.dot(result)
+    return result
+
+
+def discretize(A, B, steptime:float, method:str):
+    '''Returns state transition matrix Phi and input terms of one step as a list of
+       (offset, Gamma), where offset is the input time as part of the step'''
+    states = len(A)
+    identity = np.eye(states)
+    h = steptime
+    if method == ZOH:
+        inputs = B.shape[1]
+        augmented = np.zeros((states + inputs, states + inputs))
+        augmented[0:states, 0:states] = A*h
+        augmented[0:states, states:] = B*h
+        exponent = expm(augmented)
+        return exponent[0:states, 0:states], [(0, exponent[0:states, states:])]
+    if method == RK4:
+        Ah = A*h
+        phi = identity + Ah + Ah.dot(Ah)/2 + Ah.dot(Ah).dot(Ah)/6 + Ah.dot(Ah).dot(Ah).dot(Ah)/24
+        AB = A.dot(B)
+        AAB = A.dot(AB)
+        AAAB = A.dot(AAB)
+        start = h/6*(B + h*AB + h**2/2*AAB + h**3/4*AAAB)
+        middle = h/6*(4*B + 2*h*AB + h**2/2*AAB)
+        end = h/6*B
+        return phi, [(0, start), (0.5, middle), (1, end)]
+    if method == TRAPEZOIDAL:
+        inverse = np.linalg.inv(identity - A*h/2)
+        gamma = inverse.dot(B)*h/2
+        return inverse.dot(identity + A*h/2), [(0, gamma), (1, gamma)]
+    if method == EULER:
+        return identity + A*h, [(0, B*h)]
+    raise ValueError("Unknown state-space method " + str(method))
+
+
+
+class StateSpaceModel():
+    '''Linear state-space model, see module description.\n
+       Matrices are given with set_matrices(A, B, C, D), C defaults to identity, so that the
+       outputs are the states, and D to zeros. Input sources are set with
+       set_source(index, source), where source is a number or a function returning the input
+       values at the given times. State is in model.state and it is saved in simulator
+       snapshots.'''
+    def __init__(self, method:str=AUTO):
+        self.method = method
+        self.A = np.zeros((0, 0))
+        self.B = np.zeros((0, 0))
+        self.C = np.zeros((0, 0))
+        self.D = np.zeros((0, 0))
+        self.state = np.zeros(0)
+        self.sources = []
+        self.discrete = None        # Holds (steptime, method, Phi, input terms)
+
+
+    def set_matrices(self, A, B, C=None, D=None):
+        '''Sets the model matrices. State is kept if the number of states is unchanged,
+           otherwise it is set to zeros'''
+        A = np.atleast_2d(np.asarray(A, dtype=float))
+        B = np.asarray(B, dtype=float).reshape(len(A), -1)
+        if C is None:
+            C = np.eye(len(A))
+        C = np.atleast_2d(np.asarray(C, dtype=float))
+        if D is None:
+            D = np.zeros((len(C), B.shape[1]))
+        D = np.asarray(D, dtype=float).reshape(len(C), B.shape[1])
+        if len(self.state) != len(A):
+            self.state = np.zeros(len(A))
+        if len(self.sources) != B.shape[1]:
+            self.sources = [0.0]*B.shape[1]
+        self.A, self.B, self.C, self.D = A, B, C, D
+        self.discrete = None
+
+
+    def set_source(self, index:int, source):
+        '''Sets input source, a number or a function of time array'''
+        self.sources[index] = source
+        self.discrete = None
+
+
+    def selected_method(self, held_inputs:bool=False):
+        '''Returns the method used, AUTO is resolved by the input sources'''
+        if self.method != AUTO:
+            return self.method
+        if held_inputs or not any(callable(source) for source in self.sources):
+            return ZOH
+        return RK4
+
+
+    def discretized(self, steptime:float, method:str):
+        '''Returns Phi and input terms of the steptime, recomputed when steptime, method or
+           matrices have changed'''
+        discrete = self.discrete
+        if discrete is None or discrete[0] != steptime or discrete[1] != method:
+            discrete = (steptime, method) + discretize(self.A, self.B, steptime, method)
+            self.discrete = discrete
+        return discrete[2], discrete[3]
+
+
+    def source_values(self, times):
+        '''Returns values of the input sources at the given times, shape (times, inputs)'''
+        values = np.empty((len(times), len(self.sources)))
+        for i, source in enumerate(self.sources):
+            if callable(source):
+                values[:, i] = source(times)
+            else:
+                values[:, i] = source
+        return values
+
+
+    def step_block(self, times, steptime:float, inputs=None):
+        '''Advances the model over the steps ending at the given times and returns the
+           outputs at the end of each step, shape (times, outputs).
+           If inputs is given, it holds the input values of each step, which are held
+           constant over the step, otherwise inputs are read from the sources'''
+        steps = len(times)
+        held_inputs = inputs is not None
+        phi, input_terms = self.discretized(steptime, self.selected_method(held_inputs))
+        if held_inputs:
+            end_inputs = np.asarray(inputs, dtype=float).reshape(steps, -1)
+            forcing = end_inputs.dot(sum(gamma for _, gamma in input_terms).T)
+        else:
+            starts = np.asarray(times) - steptime
+            forcing = np.zeros((steps, len(self.state)))
+            for offset, gamma in input_terms:
+                forcing += self.source_values(starts + offset*steptime).dot(gamma.T)
+            end_inputs = self.source_values(times)
+
+        states = np.empty((steps, len(self.state)))
+        state = self.state
+        for k in range(steps):
+            state = phi.dot(state) + forcing[k]
+            states[k] = state
+        self.state[:] = state
+        return states.dot(self.C.T) + end_inputs.dot(self.D.T)
@@ -23,11 +23,13 @@ import os
 from PySide6.QtCore import QObject, Slot
 from PySide6.QtWidgets import (QGridLayout, QWidget)
 import numpy as np
-from numpy.linalg import inv
 parent_directory = os.path.abspath('../Z_DI_Simulator')
 sys.path.append('..')
 from LinePlotWidget import LinePlotWidget
 from SimulationWindowWidgets import PictureViewWidget
+from SimuChannels import ChannelSet
+from SimuBlocks import step_times
+from SimuStateSpace import StateSpaceModel, ZOH
 
 
 
@@ -163,10 +165,11 @@ class simulator(QObject):
     By default the simulation includes methods:
     init: should contain variable definitions.
     update_matrixes: should contain computations for simulation varible changes.
-    run (Slot): should contain the mathematics run every simulation step.
+    step_block: computes the simulation steps in blocks, see SimuBlocks.
     The simulator object is executed in separate thread to enable paraller execution,
     with the GUI. 
     '''
+    process_safe = True     # outputs only through ChannelSet, can run in a process
     def __init__(self, parent, params, signals, send_to_graph):
         super().__init__()
 
@@ -179,8 +182,7 @@ class simulator(QObject):
         ### Do not change ###
 
         self.steps = 0
-        self.update_static_graphs = True
-        self.update_static_graphs_wait = 0
+        self.steps_reset = True
 
 
         self.input_variables = np.array(
@@ -206,14 +208,11 @@ class simulator(QObject):
 
         ]
 
-        self.state_vector = np.array([[0.0, 0.0],
-                                      [0.0, 0.0],
-                                      [0.0, 0.0]])
+        # load model of the three phases, states of each phase are capacitor voltage
+        # derivative and capacitor voltage, inputs are held over the step
+        self.load_model = StateSpaceModel(ZOH)
 
-        self.voltages = np.array([0,0,0],dtype=float)
         self.I_prev = np.array([0,0,0],dtype=float)
-        self.delta_i = np.array([0,0,0],dtype=float)
-        self.V_L_load = np.array([0,0,0],dtype=float)
 
 
         self.old_frequency = 0
@@ -221,6 +220,12 @@ class simulator(QObject):
         self.frequency_change_enabled = False
         self.new_step_num = 0
 
+        # output channels sent to graphs, modulation and pwm arrays are published as static
+        # data in update_matrixes()
+        self.channels = ChannelSet({"currents": (float, 3),
+                                    "voltages": (float, 3),
+                                    "time_marker": (float, ())})
+
         self.update_matrixes()
 
 
@@ -231,8 +236,7 @@ class simulator(QObject):
            Additionally fun at startup.
            This fuction should include all calculations not necessary to run every cycle but after 
            user action.'''
-        self.update_static_graphs = True
-        self.update_static_graphs_wait = 0
+        self.steps_reset = True
         sine_len = 1/self.input_variables[1]
         self.step_num = round(sine_len/self.params.steptime)
         # modulation sine wave array
@@ -245,10 +249,6 @@ class simulator(QObject):
         self.pwm_array = np.array([np.zeros((self.step_num,),dtype=float),
                                    np.zeros((self.step_num,),dtype=float),
                                    np.zeros((self.step_num,),dtype=float)])
-        # pwm switching point array
-        self.pwm_sw_array = np.array([np.zeros((self.step_num,),dtype=float),
-                                      np.zeros((self.step_num,),dtype=float),
-                                      np.zeros((self.step_num,),dtype=float)])
         # time array
         self.x_time = np.linspace(0,sine_len,self.step_num)
         # sine wave y-value over time over one wave period
@@ -278,17 +278,13 @@ class simulator(QObject):
                     self.pwm_array[j][i] = -1
                 else:
                     self.pwm_array[j][i] = 1
-                if i == 0:
-                    self.pwm_sw_array[j][i] = 1
-                    continue
-                if self.pwm_array[j][i] == self.pwm_array[j][i-1]:
-                    self.pwm_sw_array[j][i] = 1
-                else:
-                    self.pwm_sw_array[j][i] = 0
 
         # time_len is lenght of time vector
         self.time_len = len(self.pwm_array[0])#/graph_var
-        self.time_len_i = self.time_len-1
+
+        # modulation graphs are only redrawn when these arrays are recomputed
+        self.channels.publish("modulation", (self.x_time, self.sine_array, self.tri_array))
+        self.channels.publish("pwm", (self.x_time, self.pwm_array))
 
         # load and filter parameters
         self.R_load = self.input_variables[4]
@@ -304,105 +300,48 @@ class simulator(QObject):
         self.L_ratio = self.L/self.L_filter
         self.R_ratio = self.R/self.R_filter
 
-        # system matrix
-        A00 = self.L*self.C
-        A01 = 0
-        A10 = 0
-        A11 = 1
-
-        self.A_matrix = np.array([[A00,A01],
-                                  [A10,A11]], dtype=float)
-        # inversion of system matrix
-        self.A_INV = inv(self.A_matrix)
-
-        # output matrix
-        B00 = self.R*self.C
-        B01 = 1
-        B10 = -1
-        B11 = 0
-        self.B_matrix = np.array([[B00,B01],
-                                  [B10,B11]], dtype=float)
+        # L*C*d2Vc/dt2 = u - R*C*dVc/dt - Vc for each phase
+        A_phase = np.array([[-self.R/self.L, -1/(self.L*self.C)],
+                            [1, 0]], dtype=float)
+        B_phase = np.array([[1/(self.L*self.C)],
+                            [0]], dtype=float)
+        # outputs of each phase are current and capacitor voltage
+        C_phase = np.array([[self.C, 0],
+                            [0, 1]], dtype=float)
+        self.load_model.set_matrices(np.kron(np.eye(3), A_phase),
+                                     np.kron(np.eye(3), B_phase),
+                                     np.kron(np.eye(3), C_phase))
 
         self.U_in = self.input_variables[0]/2
 
-        # input vector
-        self.input_vect = np.array([self.U_in,0], dtype=float)
-
-
-
-    @Slot(bool)
-    def run(self, _):
-        '''Simulation calculation method. 
-        This method shoud include simulation step calculation and method for sending data to graph.
-        Calculation loop is run as long as simulation is set ON by user.
-        Data is sent to the graph via self.send_to_graph() function which should be called at the
-        end of the method. This fucntion takes 1 input type=list, which should contain all data to
-        be send for graphs or other visual elements in graphicsViewWidget'''
-        while self.flow_control():
-            if self.update_static_graphs:
-                self.steps = 0
-            # loops over all three phases and computes the state vector using trapezoidal
-            # approximation
-            for phase in range(0,3):
-                self.state_vector[phase] = (self.state_vector[phase]+
-                                            self.trapz_step(self.state_vector[phase],
-                                            self.params.steptime, phase))
-
-            # computes the system currents from the state values and capacitances for all phases
-            currents = [self.state_vector[0][0]*self.C,
-                        self.state_vector[1][0]*self.C,
-                        self.state_vector[2][0]*self.C]
-
-            for phase in range(0,3):
-                # delta_i is the current difference between steps
-                self.delta_i[phase] = currents[phase]-self.I_prev[phase]
-                # I_prev is current vector of previous step, used to compute delta_i and rewritten after it
-                self.I_prev[phase] = currents[phase]
-                # V_L_load is the voltage over load inductance U=L*(di/dt)
-                self.V_L_load[phase] = (self.L/self.L_ratio)*(self.delta_i[phase]/self.params.steptime)
-                # voltages is load voltage vector, sum of load inductor capacitor and resistor voltages
-                self.voltages[phase] = self.V_L_load[phase]+self.state_vector[phase][1]+(currents[phase]*self.R/self.R_ratio)
-
-
-            # sends data to graphs
-            self.send_to_graph([[self.x_time,self.sine_array,self.tri_array],#0
-                                [self.x_time, self.pwm_array],#1
-                                currents[0],#2
-                                currents[1],#3
-                                currents[2],#4
-                                self.x_time[self.steps],#5
-                                self.update_static_graphs,#6
-                                self.voltages
-                                ])
-
-            # handles the updates of the modulation graphs. Only updated when input is changed
-            # to reduce computational load
-            self.steps += 1
-            if self.steps >= self.time_len_i:
-                self.steps = -1
-            if self.update_static_graphs:
-                self.update_static_graphs_wait += 1
-                if self.update_static_graphs_wait > self.params.graphing_interval:
-                    self.update_static_graphs = False
-
-
-
-    def compute_input(self, t_fi, phase):
-        '''computes the input at given sub-timestep'''
-        self.input_vect[0] = self.pwm_array[phase][self.steps]*self.U_in*t_fi
-        return self.input_vect
-
-
-    def trapz_step(self, y_tz, dt, phase):
-        '''computes step using trapezoidal approximation'''
-        # voltage and change calculation for the timestep n
-        u_t = self.compute_input(self.pwm_sw_array[phase][self.steps], phase)
-        y0 = (self.A_INV.dot(u_t - self.B_matrix.dot(y_tz)))
-        # voltage and change calculation for the timestep n+1
-        u_t = self.compute_input(self.pwm_sw_array[phase][self.steps+1], phase)
-        y1 = (self.A_INV.dot(u_t - self.B_matrix.dot(y_tz)))
-        dy = dt/2*(y1+y0)
-        return dy
+
+
+    def step_block(self, n, out):
+        '''Computes n simulation steps and writes the channel values of every step to out,
+           see SimuBlocks. Load model is stepped by SimuStateSpace with the pwm voltages of
+           the steps as inputs'''
+        if self.steps_reset:
+            self.steps = 0
+            self.steps_reset = False
+        # modulation array index of each step
+        indices = (self.steps + np.arange(n)) % self.time_len
+        inputs = self.pwm_array[:, indices].T*self.U_in
+        outputs = self.load_model.step_block(step_times(self.params, n),
+                                             self.params.steptime, inputs)
+        currents = outputs[:, 0::2]
+        # delta_i is the current difference between steps
+        delta_i = np.diff(currents, axis=0, prepend=self.I_prev[np.newaxis, :])
+        self.I_prev[:] = currents[-1]
+        # load voltage is sum of load inductor, capacitor and resistor voltages, U=L*(di/dt)
+        voltages = ((self.L/self.L_ratio)*(delta_i/self.params.steptime) + outputs[:, 1::2]
+                    + currents*self.R/self.R_ratio)
+
+        # data sent to graphs
+        out["currents"] = currents
+        out["voltages"] = voltages
+        out["time_marker"] = self.x_time[indices]
+        self.steps = (self.steps + n) % self.time_len
+        return n
 
 
 
@@ -420,6 +359,9 @@ class graphicsViewWidget(QWidget):
         self.graphing_flow_control = graphing_flow_control
         ### Do not change ###
 
+        # graphed steps kept in the plot history, the whole run can be zoomed out
+        self.history_length = self.parameters.data_length//self.parameters.graphing_interval
+
         self.simulation_view_layout = QGridLayout()
         screen_width = parent.screen_geometry.width()
         parent.parameter_view_size = 210
@@ -460,6 +402,7 @@ class graphicsViewWidget(QWidget):
 
         self.output_I_graph = LinePlotWidget(simu_steptime=self.parameters.steptime,
                                         plot_step=self.parameters.graphing_interval,
+                                        history_length=self.history_length,
                                         x_lenght=5000, enable_legend=True,
                                         x_name="time [s]", y_name="load current [A]")
         self.output_I_graph.add_plotline("Phase a",x_data=np.array([0,1,2]),
@@ -469,11 +412,16 @@ class graphicsViewWidget(QWidget):
         self.output_I_graph.add_plotline("Phase c",x_data=np.array([0,1,2]),
                                     y_data=np.array([0,0,0]),color="blue")
         self.output_I_graph.set_text(title="Output currents")
+        for i, name in enumerate(["Phase a", "Phase b", "Phase c"]):
+            # envelope shows switching ripple between graphed steps
+            self.output_I_graph.add_envelope(name)
+            self.output_I_graph.bind_channel(name, "currents", i)
         self.output_I_graph.setMaximumWidth((screen_width-space_for_param_edit)*0.6)
 
 
         self.output_U_graph = LinePlotWidget(simu_steptime=self.parameters.steptime,
                                         plot_step=self.parameters.graphing_interval,
+                                        history_length=self.history_length,
                                         x_lenght=5000, enable_legend=True,
                                         x_name="time [s]", y_name="Load voltage [V]")
         self.output_U_graph.add_plotline("Phase a",x_data=np.array([0,1,2]),
@@ -483,6 +431,10 @@ class graphicsViewWidget(QWidget):
         self.output_U_graph.add_plotline("Phase c",x_data=np.array([0,1,2]),
                                     y_data=np.array([0,0,0]),color="blue")
         self.output_U_graph.set_text(title="Output voltages")
+        for i, name in enumerate(["Phase a", "Phase b", "Phase c"]):
+            # envelope shows switching ripple between graphed steps
+            self.output_U_graph.add_envelope(name)
+            self.output_U_graph.bind_channel(name, "voltages", i)
         self.output_U_graph.setMaximumWidth((screen_width-space_for_param_edit)*0.6)
 
         self.figure = PictureViewWidget("frequency_converter.png")
@@ -497,35 +449,34 @@ class graphicsViewWidget(QWidget):
 
 
 
-    @Slot(list)
+    @Slot(object)
     def update(self, inp):
         '''update Slot method is run once every graphing interval.
            Should contain updates of all visual elements.
            Data from simulator is contained in input variable with default name "inp".
-           inp is a type=list and the data is in the same order it is send from the simulator
-           as "send_to_graph function call.
+           inp is a ChannelFrame and the data is read by the channel names declared in the
+           simulator object.
            last line of the method must be call for self.graphing_flow_control()'''
 
-        # only updated when inputs are updated
-        if inp[6]:
-            self.modulation_graph.update("Phase a",inp[0][0],inp[0][1][0])
-            self.modulation_graph.update("Phase b",inp[0][0],inp[0][1][1])
-            self.modulation_graph.update("Phase c",inp[0][0],inp[0][1][2])
-            self.modulation_graph.update("Carrier",inp[0][0],inp[0][2])
-
-            self.pwm_graph.update("Phase a",inp[1][0],inp[1][1][0])
-            self.pwm_graph.update("Phase b",inp[1][0],inp[1][1][1])
-            self.pwm_graph.update("Phase c",inp[1][0],inp[1][1][2])
-
-        self.modulation_graph.update("time",x_data_new=[inp[5],inp[5]],y_data_new=[-1,1])
-
-        self.output_I_graph.step("Phase a",inp[2])
-        self.output_I_graph.step("Phase b",inp[3])
-        self.output_I_graph.step("Phase c",inp[4])
-
-        self.output_U_graph.step("Phase a",inp[7][0])
-        self.output_U_graph.step("Phase b",inp[7][1])
-        self.output_U_graph.step("Phase c",inp[7][2])
+        # only included in the frame when inputs are updated
+        if inp.changed("modulation"):
+            x_time, sine_array, tri_array = inp["modulation"]
+            self.modulation_graph.update("Phase a",x_time,sine_array[0])
+            self.modulation_graph.update("Phase b",x_time,sine_array[1])
+            self.modulation_graph.update("Phase c",x_time,sine_array[2])
+            self.modulation_graph.update("Carrier",x_time,tri_array)
+
+        if inp.changed("pwm"):
+            x_time, pwm_array = inp["pwm"]
+            self.pwm_graph.update("Phase a",x_time,pwm_array[0])
+            self.pwm_graph.update("Phase b",x_time,pwm_array[1])
+            self.pwm_graph.update("Phase c",x_time,pwm_array[2])
+
+        time_marker = inp["time_marker"]
+        self.modulation_graph.update("time",x_data_new=[time_marker,time_marker],y_data_new=[-1,1])
+
+        self.output_I_graph.step_channels(inp)
+        self.output_U_graph.step_channels(inp)
 
         ### LAST LINE OF UPDATE METHOD
         self.graphing_flow_control()
@@ -25,6 +25,7 @@ import numpy as np
 parent_directory = os.path.abspath('../Z_DI_Simulator')
 sys.path.append('..')
 from LinePlotWidget import LinePlotWidget
+from SimuChannels import ChannelSet
 
 
 # motor type 3GBA 112 410-ADDIN
@@ -185,10 +186,11 @@ class simulator(QObject):
     By default the simulation includes methods:
     init: should contain variable definitions.
     update_matrixes: should contain computations for simulation varible changes.
-    run (Slot): should contain the mathematics run every simulation step.
+    step_block: computes the simulation steps in blocks, see SimuBlocks.
     The simulator object is executed in separate thread to enable paraller execution,
     with the GUI. 
     '''
+    process_safe = True     # outputs only through ChannelSet, can run in a process
     def __init__(self, parent, params, signals, send_to_graph):
         super().__init__()
 
@@ -241,6 +243,13 @@ class simulator(QObject):
                                 -4*np.pi/3],
                                 dtype=float)
 
+        # output channels sent to graphs
+        self.channels = ChannelSet({"rpm": (float, ()),
+                                    "torques": (float, 3),
+                                    "power": (float, ()),
+                                    "current": (float, ()),
+                                    "target_rpm": (float, ())})
+
         self.update_matrixes()
 
 
@@ -291,15 +300,16 @@ class simulator(QObject):
             self.T_dir = -1
 
 
-    @Slot(bool)
-    def run(self, _):
-        '''Simulation calculation method. 
-        This method shoud include simulation step calculation and method for sending data to graph.
-        Calculation loop is run as long as simulation is set ON by user.
-        Data is sent to the graph via self.send_to_graph() function which should be called at the
-        end of the method. This fucntion takes 1 input type=list, which should contain all data to
-        be send for graphs or other visual elements in graphicsViewWidget'''
-        while self.flow_control():
+    def step_block(self, n, out):
+        '''Computes n simulation steps and writes the channel values of every step to out,
+           see SimuBlocks. Motor speed of a step depends on the previous step, so the steps
+           are computed one by one'''
+        rpm = out["rpm"]
+        torques = out["torques"]
+        power = out["power"]
+        current = out["current"]
+        out["target_rpm"] = self.target_rpm
+        for i in range(n):
 
             self.J_tot = self.J_m+self.J_load
             # dynamic torque due acceleration
@@ -341,11 +351,11 @@ class simulator(QObject):
 
 
             # data sent to graphs
-            self.send_to_graph([self.current_rpm,#0
-                                [T,self.T_load, self.T_dyn_acc],#1
-                                [self.P_out],#2
-                                [I],#3
-                                self.target_rpm])#4
+            rpm[i] = self.current_rpm
+            torques[i] = (T, self.T_load, self.T_dyn_acc)
+            power[i] = self.P_out
+            current[i] = I
+        return n
 
 
     def get_dynamic_torque_J(self):
@@ -392,6 +402,9 @@ class graphicsViewWidget(QWidget):
         self.graphing_flow_control = graphing_flow_control
         ### Do not change ###
 
+        # graphed steps kept in the plot history, the whole run can be zoomed out
+        self.history_length = self.parameters.data_length//self.parameters.graphing_interval
+
         self.simulation_view_layout = QGridLayout()
         parent.parameter_view_size = 200
         pen_widht = 2
@@ -399,6 +412,7 @@ class graphicsViewWidget(QWidget):
 
         self.rpm_graph = LinePlotWidget(simu_steptime=self.parameters.steptime/10,
                                               plot_step=self.parameters.graphing_interval,
+                                              history_length=self.history_length,
                                               x_lenght=x_len, enable_legend=True,
                                               x_name="time [s]", y_name="n [rpm]")
         self.rpm_graph.add_plotline("motor speed",x_data=np.array([0,1,2]),
@@ -408,10 +422,13 @@ class graphicsViewWidget(QWidget):
         self.rpm_graph.set_text(title="Motor speed")
         self.rpm_graph.change_line_pen("motor speed",width=pen_widht)
         self.rpm_graph.change_line_pen("target speed",width=pen_widht, linetype="..")
+        self.rpm_graph.bind_channel("motor speed", "rpm")
+        self.rpm_graph.bind_channel("target speed", "target_rpm")
 
 
         self.torque_graph = LinePlotWidget(simu_steptime=self.parameters.steptime/10,
                                               plot_step=self.parameters.graphing_interval,
+                                              history_length=self.history_length,
                                               x_lenght=x_len, enable_legend=True,
                                               x_name="time [s]", y_name="Torque [Nm]")
         self.torque_graph.add_plotline("T_total",x_data=np.array([0,1,2]),
@@ -424,26 +441,33 @@ class graphicsViewWidget(QWidget):
         self.torque_graph.change_line_pen("T_total",width=pen_widht)
         self.torque_graph.change_line_pen("T_load",width=pen_widht)
         self.torque_graph.change_line_pen("T_acceleration",width=pen_widht)
+        self.torque_graph.bind_channel("T_total", "torques", 0)
+        self.torque_graph.bind_channel("T_load", "torques", 1)
+        self.torque_graph.bind_channel("T_acceleration", "torques", 2)
 
 
         self.power_graph = LinePlotWidget(simu_steptime=self.parameters.steptime/10,
                                               plot_step=self.parameters.graphing_interval,
+                                              history_length=self.history_length,
                                               x_lenght=x_len, enable_legend=True,
                                               x_name="time [s]", y_name="Power [kW]")
         self.power_graph.add_plotline("P_out",x_data=np.array([0,1,2]),
                                     y_data=np.array([0,0,0]),color="red")
         self.power_graph.set_text(title="Motor power")
         self.power_graph.change_line_pen("P_out",width=pen_widht)
+        self.power_graph.bind_channel("P_out", "power")
 
 
         self.current_graph = LinePlotWidget(simu_steptime=self.parameters.steptime/10,
                                               plot_step=self.parameters.graphing_interval,
+                                              history_length=self.history_length,
                                               x_lenght=x_len, enable_legend=True,
                                               x_name="time [s]", y_name="current [A]")
         self.current_graph.add_plotline("I",x_data=np.array([0,1,2]),
                                     y_data=np.array([0,0,0]),color="red")
         self.current_graph.set_text(title="Motor current")
         self.current_graph.change_line_pen("I",width=pen_widht)
+        self.current_graph.bind_channel("I", "current")
 
 
         self.simulation_view_layout.addWidget(self.rpm_graph,0,0,1,1)
@@ -455,25 +479,19 @@ class graphicsViewWidget(QWidget):
 
 
 
-    @Slot(list)
+    @Slot(object)
     def update(self, inp):
         '''update Slot method is run once every graphing interval.
            Should contain updates of all visual elements.
            Data from simulator is contained in input variable with default name "inp".
-           inp is a type=list and the data is in the same order it is send from the simulator
-           as "send_to_graph function call.
+           inp is a ChannelFrame and the data is read by the channel names declared in the
+           simulator object.
            last line of the method must be call for self.graphing_flow_control()'''
 
-        self.rpm_graph.step("motor speed",inp[0])
-        self.rpm_graph.step("target speed",inp[4])
-
-        self.torque_graph.step("T_total",inp[1][0])
-        self.torque_graph.step("T_load",inp[1][1])
-        self.torque_graph.step("T_acceleration",inp[1][2])
-
-        self.power_graph.step("P_out",inp[2][0])
-
-        self.current_graph.step("I",inp[3][0])
+        self.rpm_graph.step_channels(inp)
+        self.torque_graph.step_channels(inp)
+        self.power_graph.step_channels(inp)
+        self.current_graph.step_channels(inp)
 
         ### LAST LINE OF UPDATE METHOD
         self.graphing_flow_control()
@@ -26,7 +26,8 @@ parent_directory = os.path.abspath('../Z_DI_Simulator')
 sys.path.append('..')
 from PhasorPlotWidget import PhasorGraphWidget
 from LinePlotWidget import LinePlotWidget
-from SimuMath import angle_loop_rad, np_abc_to_alpha_beta, np_alpha_beta_to_dq
+from SimuMath import np_abc_to_alpha_beta
+from SimuChannels import ChannelSet
 
 
 
@@ -93,6 +94,7 @@ class parameters():
 
 
 class simulator(QObject):
+    process_safe = True     # outputs only through ChannelSet, can run in a process
     def __init__(self, parent, params, signals, send_to_graph):
         super().__init__()
 
@@ -124,111 +126,66 @@ class simulator(QObject):
              
         ]
 
-        self.albet = np.array([0,0],dtype=float)
-
-        self.dq = np.array([0,0],dtype=float)
-
         self.angle = 0
+        # angles are computed from the number of steps taken with the same angle step,
+        # so that they do not depend on how the steps are divided into blocks
+        self.angle_origin = 0.0
+        self.angle_step = 0.0
+        self.angle_step_count = 0
+
+        # phase angles of the three phasors
+        self.phase_shifts = np.array([0, 2*np.pi/3, 4*np.pi/3], dtype=float)
+
+        # output channels sent to graphs, phase_x and phase_y hold the phasor components,
+        # phase_sum holds the phase components summed tip to tail as x, y pairs
+        self.channels = ChannelSet({"phase_x": (float, 3),
+                                    "phase_y": (float, 3),
+                                    "alpha_beta": (float, 2),
+                                    "dq": (float, 2),
+                                    "phase_sum": (float, 6)})
 
         self.update_matrixes()
 
 
     def update_matrixes(self):
-        self.abc = np.array(
-            [0,
-             0,
-             0], dtype=float
-        )
-
-        self.albet = np.array(
-            [0,
-             0
-            ], dtype=float
-        )
-
-        self.dq = np.array(
-            [0,
-             0
-            ], dtype=float
-        )
-
-        self.phasor1 = np.array(
-            [0,
-             0,
-             0,
-             0,
-             0,
-             0
-            ], dtype=float
-        )
-
-        self.phasor2 = np.array(
-            [0,
-             0,
-             0,
-             0,
-             0,
-             0
-            ], dtype=float
-        )
-
-
         self.frequency = self.input_variables[0]
         self.amplitude_a = self.input_variables[1]
         self.amplitude_b = self.input_variables[2]
         self.amplitude_c = self.amplitude_a
 
 
-    @Slot(bool)
-    def run(self, _):
-        '''Simulation calculation method. 
-        This method shoud include simulation step calculation and method for sending data to graph.
-        Calculation loop is run as long as simulation is set ON by user.
-        Data is sent to the graph via self.send_to_graph() function which should be called at the
-        end of the method. This fucntion takes 1 input type=list, which should contain all data to
-        be send for graphs or other visual elements in graphicsViewWidget'''
-        while self.flow_control():
-
-            ang = ((np.pi*2)/((1/self.frequency)/self.params.steptime))
-            self.angle += ang
-            self.angle = angle_loop_rad(self.angle)
-
-            y1 = float(np.sin(self.angle)*self.amplitude_a)
-            x1 = float(np.cos(self.angle)*self.amplitude_a)
-            y2 = float(np.sin((self.angle-2*np.pi/3))*self.amplitude_b)
-            x2 = float(np.cos((self.angle-2*np.pi/3))*self.amplitude_b)
-            y3 = float(np.sin((self.angle-4*np.pi/3))*self.amplitude_c)
-            x3 = float(np.cos((self.angle-4*np.pi/3))*self.amplitude_c)
+    def step_block(self, n, out):
+        '''Computes n simulation steps at once and writes the channel values of every step
+           to out, see SimuBlocks. All phasors rotate with the same angle step, so the steps
+           are computed as arrays'''
+        ang = ((np.pi*2)/((1/self.frequency)/self.params.steptime))
+        if ang != self.angle_step:
+            self.angle_origin = self.angle
+            self.angle_step = ang
+            self.angle_step_count = 0
+        step_counts = self.angle_step_count + np.arange(1, n+1)
+        angles = np.mod(self.angle_origin + ang*step_counts, 2*np.pi)
+        self.angle_step_count += n
+        self.angle = float(angles[-1])
 
-            self.abc[0] = y1
-            self.abc[1] = y2
-            self.abc[2] = y3
+        amplitudes = np.array([self.amplitude_a, self.amplitude_b, self.amplitude_c])
+        phase_angles = angles[:, np.newaxis] - self.phase_shifts
+        abc = np.sin(phase_angles)*amplitudes
+        out["phase_y"] = abc
+        out["phase_x"] = np.cos(phase_angles)*amplitudes
 
-            self.phasor1[0] = y1
-            self.phasor1[1] = x1
-            self.phasor1[2] = y2
-            self.phasor1[3] = x2
-            self.phasor1[4] = y3
-            self.phasor1[5] = x3
+        albet = np_abc_to_alpha_beta(abc.T)
+        out["alpha_beta"] = albet.T
 
-            self.albet = np_abc_to_alpha_beta(self.abc)
+        # dq frame is aligned with the alpha-beta vector
+        theta = np.arctan2(albet[1], albet[0])
+        out["dq"][:, 0] = np.cos(theta)*albet[0] + np.sin(theta)*albet[1]
+        out["dq"][:, 1] = -np.sin(theta)*albet[0] + np.cos(theta)*albet[1]
 
-            self.dq = np_alpha_beta_to_dq(self.albet,
-                                      np.arctan2(self.albet[1],self.albet[0]))
-
-            self.phasor2[0] = y1*np.cos(0)
-            self.phasor2[1] = y1*np.sin(0)
-            self.phasor2[2] = y2*np.cos(2*np.pi/3)+self.phasor2[0]
-            self.phasor2[3] = y2*np.sin(2*np.pi/3)+self.phasor2[1]
-            self.phasor2[4] = y3*np.cos(4*np.pi/3)+self.phasor2[2]
-            self.phasor2[5] = y3*np.sin(4*np.pi/3)+self.phasor2[3]
-
-
-            self.send_to_graph([self.phasor1,
-                                self.albet,
-                                self.dq,
-                                self.phasor2
-                                ])
+        phase_sum = out["phase_sum"]
+        phase_sum[:, 0::2] = np.cumsum(abc*np.cos(self.phase_shifts), axis=1)
+        phase_sum[:, 1::2] = np.cumsum(abc*np.sin(self.phase_shifts), axis=1)
+        return n
 
 
 
@@ -245,6 +202,9 @@ class graphicsViewWidget(QWidget):
         self.parameters = params
         self.graphing_flow_control = graphing_flow_control
 
+        # graphed steps kept in the plot history, the whole run can be zoomed out
+        self.history_length = self.parameters.data_length//self.parameters.graphing_interval
+
         self.simulation_view_layout = QGridLayout()
         parent.parameter_view_size = 150
 
@@ -285,6 +245,7 @@ class graphicsViewWidget(QWidget):
 
         self.lin_graph = LinePlotWidget(simu_steptime=self.parameters.steptime,
                                               plot_step=self.parameters.graphing_interval,
+                                              history_length=self.history_length,
                                               x_lenght=1000, enable_legend= True)
         self.lin_graph.add_plotline("L1",x_data=np.array([0,1,2]),
                                     y_data=np.array([0,0,0]),color="red")
@@ -299,6 +260,7 @@ class graphicsViewWidget(QWidget):
 
         self.lin_graph2 = LinePlotWidget(simu_steptime=self.parameters.steptime,
                                              plot_step=self.parameters.graphing_interval,
+                                             history_length=self.history_length,
                                              x_lenght=1000, enable_legend= True)
         self.lin_graph2.add_plotline("Alpha",x_data=np.array([0,1,2]),
                                      y_data=np.array([0,0,0]),color="red")
@@ -310,6 +272,7 @@ class graphicsViewWidget(QWidget):
 
         self.lin_graph3 = LinePlotWidget(simu_steptime=self.parameters.steptime,
                                              plot_step=self.parameters.graphing_interval,
+                                             history_length=self.history_length,
                                              x_lenght=1000, enable_legend= True)
         self.lin_graph3.add_plotline("d",x_data=np.array([0,1,2]),
                                      y_data=np.array([0,0,0]),color="red")
@@ -335,24 +298,14 @@ class graphicsViewWidget(QWidget):
         '''update Slot method is run once every graphing interval.
            Should contain updates of all visual elements.
            Data from simulator is contained in input variable with default name "inp".
-           inp is a type=list and the data is in the same order it is send from the simulator
-           as "send_to_graph function call.
+           inp is ChannelFrame and data is read by channel name.
            last line of the method must be call for self.graphing_flow_control()'''
 
-        y1 = inp[0][0]
-        x1 = inp[0][1]
-        y2 = inp[0][2]
-        x2 = inp[0][3]
-        y3 = inp[0][4]
-        x3 = inp[0][5]
-        alpha_beta = inp[1]
-        d_q = inp[2]
-        yt1 = inp[3][1]
-        xt1 = inp[3][0]
-        yt2 = inp[3][3]
-        xt2 = inp[3][2]
-        yt3 = inp[3][5]
-        xt3 = inp[3][4]
+        y1, y2, y3 = inp["phase_y"]
+        x1, x2, x3 = inp["phase_x"]
+        alpha_beta = inp["alpha_beta"]
+        d_q = inp["dq"]
+        xt1, yt1, xt2, yt2, xt3, yt3 = inp["phase_sum"]
 
         self.graph.update("Phasor1",x1,y1)
         self.graph.update("Phasor2",x2,y2)
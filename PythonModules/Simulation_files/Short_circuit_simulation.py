@@ -25,6 +25,7 @@ import numpy as np
 parent_directory = os.path.abspath('../Z_DI_Simulator')
 sys.path.append('..')
 from LinePlotWidget import LinePlotWidget
+from SimuChannels import ChannelSet
 from SimulationWindowWidgets import ParameterViewWidget, PictureViewWidget
 from SimuMath import sign, angle_loop_rad, solve_2bus_NR, pol2cart
 
@@ -292,6 +293,7 @@ class simulator(QObject):
         self.flow_control = parent.simulation_flow_control
         self.send_to_graph = send_to_graph
         ### Do not change ###
+        self.save_snapshot = parent.save_snapshot
 
 
         self.input_variables = np.array(
@@ -342,10 +344,8 @@ class simulator(QObject):
         self.I_last_n = [0,0,0]
         self.I_peaks = [0,0,0]
         self.zero_crossing = [True,True,True]
-        self.updated = 0
         self.slow_update_time = 0
         self.fault_slowdown = False
-        self.end_fault_slowdown = False
         self.new_steptime = 0
         self.fault_slowdown_multiplier = 0.1
 
@@ -357,6 +357,14 @@ class simulator(QObject):
 
         self.angle_steps = 0
 
+        # output channels sent to graphs, reactances and plot steptime are published at fault
+        self.channels = ChannelSet({"currents": (float, 3),
+                                    "max_currents": (float, 3),
+                                    "peaks": (float, 3),
+                                    "fault_time": (float, ())})
+        # published at start, so that snapshots taken before the fault include the steptime
+        self.channels.publish("plot_steptime", self.params.steptime)
+
         self.update_matrixes()
 
 
@@ -387,7 +395,6 @@ class simulator(QObject):
         self.Taud0_dd = self.input_variables[15]
         self.Taud0_d = self.input_variables[16]
 
-        self.updated = self.params.graphing_interval+1
         self.slow_update_interval = 1/self.frequency/6
         self.line_len = self.input_variables[1]
         self.line_len_fault = self.input_variables[4]
@@ -507,12 +514,16 @@ class simulator(QObject):
         while self.flow_control():
             # Checks if fault has been activated. If True, shortenes the steptime for 0.02 s 
             if getattr(simulator,"fault"):
+                # state before the fault can be restored to retry the fault
+                self.save_snapshot("before fault")
                 self.fault = True
                 self.new_steptime = self.params.steptime*self.fault_slowdown_multiplier
                 self.params.steptime = self.new_steptime
                 self.fault_slowdown = True
-                self.updated = self.params.graphing_interval+1
                 self.update_matrixes()
+                self.channels.publish("plot_steptime", self.new_steptime)
+                self.channels.publish("reactances", (self.Xd_dd, self.Xd_d, self.Xd, self.Rd,
+                                                     self.X_fault, self.R_fault))
                 setattr(simulator,"fault",False)
 
             # calculates the phase angels
@@ -566,11 +577,10 @@ class simulator(QObject):
 
                 if self.fault_slowdown:
                     if self.fault_time > 0.005:
-                        self.end_fault_slowdown = True
                         self.fault_slowdown = False
                         self.new_steptime = self.params.steptime*(1/self.fault_slowdown_multiplier)
                         self.params.steptime = self.new_steptime
-                        self.updated = self.params.graphing_interval+1
+                        self.channels.publish("plot_steptime", self.new_steptime)
                         # If short circuit has been going on more than 0.02 seconds, steptime is
                         # returned to the original
 
@@ -598,20 +608,11 @@ class simulator(QObject):
                 self.slow_update_time = 0
                 #self.update_long_graph = True
 
-            if self.updated >= 0:
-                self.updated -= 1
-
-            self.send_to_graph([I,#0
-                                self.max_currents,#1
-                                self.I_peaks,#2
-                                self.fault_time,#3
-                                self.slow_update_interval,#4
-                                self.updated,#5
-                                self.fault_slowdown,#6
-                                self.new_steptime,#7
-                                self.end_fault_slowdown,#8
-                                [self.Xd_dd, self.Xd_d, self.Xd, self.Rd, self.X_fault, self.R_fault]
-                                ])
+            self.channels["currents"] = I
+            self.channels["max_currents"] = self.max_currents
+            self.channels["peaks"] = self.I_peaks
+            self.channels["fault_time"] = self.fault_time
+            self.send_to_graph(self.channels)
 
 
     def pause_at_fault_time(self, time):
@@ -638,11 +639,15 @@ class graphicsViewWidget(QWidget):
         self.graphing_flow_control = graphing_flow_control
         ### Do not change ###
 
+        # graphed steps kept in the plot history, the whole run can be zoomed out
+        self.history_length = self.parameters.data_length//self.parameters.graphing_interval
+
         self.simulation_view_layout = QGridLayout()
         parent.parameter_view_size = 270
 
         self.current_graph = LinePlotWidget(simu_steptime=self.parameters.steptime,
                                               plot_step=self.parameters.graphing_interval,
+                                              history_length=self.history_length,
                                               x_lenght=2000, enable_legend=True,
                                               x_name="time [s]", y_name="Current [A]")
         self.current_graph.add_plotline("Ia",x_data=np.array([0,1,2]),
@@ -652,6 +657,9 @@ class graphicsViewWidget(QWidget):
         self.current_graph.add_plotline("Ic",x_data=np.array([0,1,2]),
                                     y_data=np.array([0,0,0]),color="green")
         self.current_graph.set_text(title="System current")
+        for i, name in enumerate(["Ia", "Ib", "Ic"]):
+            self.current_graph.add_envelope(name)
+            self.current_graph.bind_channel(name, "currents", i)
 
 
         a = "<sub>" + "a" + "</sub>"
@@ -684,12 +692,20 @@ class graphicsViewWidget(QWidget):
         def fault_button_clicked():
             setattr(simulator,"fault",True)
             self.fault_button.setDisabled(True)
+            self.retry_button.setDisabled(False)
 
         self.fault_button = QPushButton(self)
         self.fault_button.setText("Create 3-phase short circuit")
         self.fault_button.setCheckable(True)
         self.fault_button.clicked.connect(fault_button_clicked)
 
+        self.retry_button = QPushButton(self)
+        self.retry_button.setText("Retry from before fault")
+        self.retry_button.setToolTip("Return to the moment before the short circuit,\n"
+                                     "short circuit can be created again with new parameters")
+        self.retry_button.setDisabled(True)
+        self.retry_button.clicked.connect(lambda: parent.restore_snapshot("before fault"))
+
         k = "<sub>" + "k" + "</sub>"
         self.slider_value = QLabel(self)
         self.slider_value.setText("Short circuit power (S"+k+")= " +
@@ -710,7 +726,8 @@ class graphicsViewWidget(QWidget):
         self.simulation_view_layout.addWidget(self.image,0,0,1,2)
         self.simulation_view_layout.addWidget(self.parameter_view,0,2,1,1)
         self.simulation_view_layout.addWidget(self.x_parameter_view,0,3,1,1)
-        self.simulation_view_layout.addWidget(self.fault_button,1,0,1,4)
+        self.simulation_view_layout.addWidget(self.fault_button,1,0,1,3)
+        self.simulation_view_layout.addWidget(self.retry_button,1,3,1,1)
         self.simulation_view_layout.addWidget(self.power_slider,2,0,1,3)
         self.simulation_view_layout.addWidget(self.slider_value,2,3,1,1)
         self.current_graph.setSizePolicy(QSizePolicy.Expanding,QSizePolicy.Expanding)
@@ -721,39 +738,44 @@ class graphicsViewWidget(QWidget):
 
 
 
-    @Slot(list)
+    def simulation_restored(self, name):
+        '''Executed after simulator snapshot has been restored, enables creating the fault
+           again. Retry is not available after reset'''
+        setattr(simulator,"fault",False)
+        self.fault_button.setChecked(False)
+        self.fault_button.setDisabled(False)
+        self.retry_button.setDisabled(name != "before fault")
+        self.parameter_view.update_row(6,0)
+
+
+
+    @Slot(object)
     def update(self, inp):
         '''update Slot method is run once every graphing interval.
            Should contain updates of all visual elements.
            Data from simulator is contained in input variable with default name "inp".
-           inp is a type=list and the data is in the same order it is send from the simulator
-           as "send_to_graph function call.
+           inp is a SimuChannels.ChannelFrame and channels are read by name, current envelopes
+           show the minimum and maximum currents of the graphing interval.
            last line of the method must be call for self.graphing_flow_control()'''
 
-        self.current_graph.step("Ia",inp[0][0])
-        self.current_graph.step("Ib",inp[0][1])
-        self.current_graph.step("Ic",inp[0][2])
-
-        self.parameter_view.update_row(0,inp[2][0])
-        self.parameter_view.update_row(1,inp[1][0])
-        self.parameter_view.update_row(2,inp[2][1])
-        self.parameter_view.update_row(3,inp[1][1])
-        self.parameter_view.update_row(4,inp[2][2])
-        self.parameter_view.update_row(5,inp[1][2])
-        if inp[3] > 0:
-            self.parameter_view.update_row(6,inp[3])
-
-        if inp[5] >= 0:
-            if inp[6]:
-                self.current_graph.steptime = inp[7]
-                self.x_parameter_view.update_row(0,inp[9][0])
-                self.x_parameter_view.update_row(1,inp[9][1])
-                self.x_parameter_view.update_row(2,inp[9][2])
-                self.x_parameter_view.update_row(3,inp[9][3])
-                self.x_parameter_view.update_row(4,inp[9][4])
-                self.x_parameter_view.update_row(5,inp[9][5])
-            if inp[8]:
-                self.current_graph.steptime = inp[7]
+        self.current_graph.step_channels(inp)
+
+        peaks = inp["peaks"]
+        max_currents = inp["max_currents"]
+        self.parameter_view.update_row(0,peaks[0])
+        self.parameter_view.update_row(1,max_currents[0])
+        self.parameter_view.update_row(2,peaks[1])
+        self.parameter_view.update_row(3,max_currents[1])
+        self.parameter_view.update_row(4,peaks[2])
+        self.parameter_view.update_row(5,max_currents[2])
+        if inp["fault_time"] > 0:
+            self.parameter_view.update_row(6,inp["fault_time"])
+
+        if inp.changed("plot_steptime"):
+            self.current_graph.steptime = inp["plot_steptime"]
+        if inp.changed("reactances"):
+            for i, value in enumerate(inp["reactances"]):
+                self.x_parameter_view.update_row(i,value)
 
 
 
@@ -28,6 +28,7 @@ from PhasorPlotWidget import PhasorGraphWidget
 from LinePlotWidget import LinePlotWidget
 from SimulationWindowWidgets import ParameterViewWidget, PictureViewWidget
 from SimuMath import (cart2pol, angle_loop_rad, pol2cart, solve_2bus_NR, solve_power_flow_GS)
+from SimuChannels import ChannelSet
 
 
 
@@ -87,9 +88,19 @@ class simulator(QObject):
     init: should contain variable definitions.
     update_matrixes: should contain computations for simulation varible changes.
     run (Slot): should contain the mathematics run every simulation step.
+    Instead of run, the simulator can have step_block method computing many steps at once,
+    see the example after run.
     The simulator object is executed in separate thread to enable paraller execution,
     with the GUI. 
     '''
+    # Set True if the simulator sends its outputs only with ChannelSet and does not share
+    # variables with graphicsViewWidget, allows running the simulator in a separate process
+    process_safe = False
+    # Update methods can be declared with the inputs they depend on, then only the methods
+    # of the changed inputs are executed instead of update_matrixes, see SimuBindings
+    # update_dependencies = {"update_method": ("input_name_1", "input_name_2")}
+    # Updates of a running simulation are computed on a copy of the simulator and committed
+    # between steps, see SimuStaging
     def __init__(self, parent, params, signals, send_to_graph):
         super().__init__()
 
@@ -125,6 +136,18 @@ class simulator(QObject):
              self.params.input_parameters["parameter3"]["items"][0]
         ]
 
+        # Output channels can be declared with name, type and shape instead of sending a list.
+        # Channel values are then read by name in graphicsViewWidget update method
+        # self.channels = ChannelSet({"variable_i": (float, ()),
+        #                             "variable_j": (complex, ()),
+        #                             "variable_k": (float, 3)})
+
+        # Numerical attributes, inputs and channels are saved in snapshots, see SimuSnapshot.
+        # State can be saved in the run loop and restored from graphicsViewWidget with
+        # parent.restore_snapshot("name"), snapshot "initial" is used to reset the simulation
+        # self.save_snapshot = parent.save_snapshot
+        # self.save_snapshot("name")
+
         # Variables which are only set manually at launch can be declared here
         # self.variable_x = 14
         # self.variable_y = 3
@@ -183,6 +206,11 @@ class simulator(QObject):
 
 
 
+            # data sending to graphs when output channels are declared
+            # self.channels["variable_i"] = variable_i
+            # self.channels["variable_j"] = variable_j
+            # self.send_to_graph(self.channels)
+
             # data sending to graphs
             self.send_to_graph([#variable_i,
                                 #variable_j,
@@ -193,6 +221,30 @@ class simulator(QObject):
                                 ])
 
 
+    # When output channels are declared, the steps can be computed in blocks with step_block
+    # instead of run. Then run is not needed and it is not used, see SimuBlocks.
+    # step_block computes the next n steps and writes the channel values of every step to out,
+    # which is an array of n elements, and returns the number of steps taken.
+    # Times of the steps are given by step_times(self.params, n) from SimuBlocks, simulation
+    # time is advanced after the block and it must not be changed in step_block.
+    # def step_block(self, n, out):
+    #     '''Computes n simulation steps, see SimuBlocks'''
+    #     times = step_times(self.params, n)
+    #     # calculations without dependency between the steps can be done with arrays
+    #     out["variable_i"] = self.variable_a*np.sin(times)
+    #     # steps depending on the previous step are computed one by one
+    #     for i in range(n):
+    #         self.variable_x = self.variable_x*0.99 + self.variable_b
+    #         out["variable_k"][i] = self.variable_x
+    #     return n
+    # Linear differential equations dx/dt = A x + B u, y = C x + D u do not need own
+    # integration code. Declare the model in __init__ with
+    # self.model = StateSpaceModel(method) from SimuStateSpace, set its matrices in
+    # update_matrixes with self.model.set_matrices(A, B, C, D) and input sources with
+    # self.model.set_source(index, source), then in step_block:
+    #     out["variable_j"] = self.model.step_block(times, self.params.steptime)[:, 0]
+
+
 
 class graphicsViewWidget(QWidget):
     '''Simulation graphics containment widdget.
@@ -214,6 +266,8 @@ class graphicsViewWidget(QWidget):
         parent.parameter_view_size = 220
 
         # example of time domain plot
+        # history_length=graphed steps keeps min/max history of the run, which allows zooming
+        # out beyond x_lenght up to the whole run
         self.example_line_graph = LinePlotWidget(simu_steptime=self.parameters.steptime,
                                 plot_step=self.parameters.graphing_interval,
                                 x_lenght=1000, enable_legend=True,
@@ -227,6 +281,8 @@ class graphicsViewWidget(QWidget):
         # plotline linetype type can be changed as shown
         # for line type '-'=continuous, '--'=dashed, '..'=dotted
         self.example_line_graph.change_line_pen("variable_i",width=2)
+        # plotline can be bound to output channel and updated with step_channels(inp)
+        # self.example_line_graph.bind_channel("variable_i", "variable_i")
 
         # example of phasor domain plot
         self.example_phasor_graph = PhasorGraphWidget("example phasors","x","y")
@@ -272,6 +328,8 @@ class graphicsViewWidget(QWidget):
            Data from simulator is contained in input variable with default name "inp".
            inp is a type=list and the data is in the same order it is send from the simulator
            as "send_to_graph function call.
+           If output channels are declared, inp is ChannelFrame and data is read by channel
+           name, for example inp["variable_i"]
            last line of the method must be call for self.graphing_flow_control()'''
 
         # time domain graphs are best updated with "step" method, which only appends the last step
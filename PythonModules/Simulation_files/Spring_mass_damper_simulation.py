@@ -22,10 +22,12 @@ import os
 from PySide6.QtCore import QObject, Slot
 from PySide6.QtWidgets import (QGridLayout, QWidget, QComboBox)
 import numpy as np
-from numpy.linalg import inv
 parent_directory = os.path.abspath('../Z_DI_Simulator')
 sys.path.append('..')
 from LinePlotWidget import LinePlotWidget
+from SimuChannels import ChannelSet
+from SimuBlocks import step_times
+from SimuStateSpace import StateSpaceModel, RK4, TRAPEZOIDAL, EULER
 
 
 
@@ -133,11 +135,15 @@ class simulator(QObject):
     By default the simulation includes methods:
     init: should contain variable definitions.
     update_matrixes: should contain computations for simulation varible changes.
-    run (Slot): should contain the mathematics run every simulation step.
+    step_block: computes the simulation steps in blocks, see SimuBlocks.
     The simulator object is executed in separate thread to enable paraller execution,
     with the GUI. 
     '''
     shown_graphs = 1
+    # update methods executed when their inputs change, see SimuBindings
+    update_dependencies = {"update_force": ("force_amp", "omega"),
+                           "update_model": ("mass", "spring_constant", "damping_factor"),
+                           "update_steptime": ("steptime",)}
     def __init__(self, parent, params, signals, send_to_graph):
         super().__init__()
 
@@ -145,7 +151,7 @@ class simulator(QObject):
         ### Do not change ###
         self.params = params
         self.signals = signals
-        self.F_rklow_control = parent.simulation_flow_control
+        self.flow_control = parent.simulation_flow_control
         self.send_to_graph = send_to_graph
         ### Do not change ###
 
@@ -170,11 +176,17 @@ class simulator(QObject):
              self.params.input_parameters["force_type"]["items"][0]
         ]
 
-        self.y_vect_rk = np.array([0,0])
-        self.y_vect_tz = np.array([0,0])
-        self.y_vect_fe = np.array([0,0])
+        # the same model stepped with three methods, states are velocity and displacement
+        self.model_rk = StateSpaceModel(RK4)
+        self.model_tz = StateSpaceModel(TRAPEZOIDAL)
+        self.model_fe = StateSpaceModel(EULER)
         self.step_time_mem = [0,0]
-        self.steptime_changed = False
+
+        # output channels sent to graphs as velocity, displacement and force of each method,
+        # steptime is published when it is changed
+        self.channels = ChannelSet({"rk": (float, 3),
+                                    "tz": (float, 3),
+                                    "fe": (float, 3)})
 
         self.update_matrixes()
 
@@ -186,124 +198,71 @@ class simulator(QObject):
            Additionally fun at startup.
            This fuction should include all calculations not necessary to run every cycle but after 
            user action.'''
-        self.omega = self.input_variables[5]        # Force fuction angular frequency 1.0
+        self.update_force()
+        self.update_model()
+        self.update_steptime()
 
-        self.A_matrix = np.array([[self.input_variables[2],0],  #mass
-                                  [0,1]], dtype=float)
-
-        self.B_matrix = np.array([[self.input_variables[4],     #spring
-                                   self.input_variables[3]],    #damping
-                                   [-1,0]], dtype=float)
 
+    def update_force(self):
+        '''Updates force function amplitude and angular frequency'''
+        self.omega = self.input_variables[5]        # Force fuction angular frequency 1.0
         self.F_amp = self.input_variables[0]
 
-        self.F_rk = np.array([0.0,0.0], dtype=float)
-        self.F_tz = np.array([0.0,0.0], dtype=float)
-        self.F_fe = np.array([0.0,0.0], dtype=float)
-
-        self.A_INV = inv(self.A_matrix)
 
+    def update_model(self):
+        '''Updates model matrices from mass, spring constant and damping'''
+        mass = self.input_variables[2]
+        spring = self.input_variables[3]
+        damping = self.input_variables[4]
+
+        # m*dv/dt = F - damping*v - spring*d, dd/dt = v
+        A_matrix = np.array([[-damping/mass, -spring/mass],
+                             [1, 0]], dtype=float)
+        B_matrix = np.array([[1/mass],
+                             [0]], dtype=float)
+        # outputs are velocity, displacement and force
+        C_matrix = np.array([[1, 0],
+                             [0, 1],
+                             [0, 0]], dtype=float)
+        D_matrix = np.array([[0],
+                             [0],
+                             [1]], dtype=float)
+        for model in (self.model_rk, self.model_tz, self.model_fe):
+            model.set_matrices(A_matrix, B_matrix, C_matrix, D_matrix)
+            model.set_source(0, self.force)
+
+
+    def update_steptime(self):
+        '''Updates simulation steptime'''
         self.params.steptime = self.input_variables[1]
 
         self.step_time_mem[1] = self.step_time_mem[0]
         self.step_time_mem[0] = self.input_variables[1]
         if self.step_time_mem[1] != self.step_time_mem[0]:
-            self.steptime_changed = True
-
-
-
-    @Slot(bool)
-    def run(self, _):
-        '''Simulation calculation method. 
-        This method shoud include simulation step calculation and method for sending data to graph.
-        Calculation loop is run as long as simulation is set ON by user.
-        Data is sent to the graph via self.send_to_graph() function which should be called at the
-        end of the method. This fucntion takes 1 input type=list, which should contain all data to
-        be send for graphs or other visual elements in graphicsViewWidget'''
-        while self.F_rklow_control():
-
-            self.y_vect_rk = self.y_vect_rk + self.RK4_step(self.y_vect_rk,
-                                                      self.params.simulation_time,
-                                                      self.params.steptime)
-
-            if getattr(simulator,"shown_graphs"):
-                self.y_vect_tz = self.y_vect_tz + self.trapz_step(self.y_vect_tz,
-                                                        self.params.simulation_time,
-                                                        self.params.steptime)
-
-                self.y_vect_fe = self.y_vect_fe + self.forward_euler_step(self.y_vect_fe,
-                                                        self.params.simulation_time,
-                                                        self.params.steptime)
-
-            self.send_to_graph([[self.y_vect_rk,self.F_rk],
-                                [self.y_vect_tz,self.F_tz],
-                                [self.y_vect_fe,self.F_fe],
-                                [self.steptime_changed,self.params.steptime],
-                                getattr(simulator,"shown_graphs")])
-
-
-    def compute_force_rk(self,t_fi):
-        '''compute force substeps for RK4'''
-        if self.input_texts[0] <= "Sinusoidal":
-            self.F_rk[0] = np.sin(self.omega*t_fi)*self.F_amp
-        else:
-            self.F_rk[0] = self.F_amp
-        f_return = self.F_rk
-        return f_return
-
-
-    def G(self,y_g,t_g):
-        '''compute k values for RK4'''
-        f_t = self.compute_force_rk(t_g)
-        G_t = (self.A_INV.dot(f_t - self.B_matrix.dot(y_g)))
-        return G_t
-
+            self.channels.publish("steptime", self.params.steptime)
 
-    def RK4_step(self, y_rk, t_rk ,dt):
-        '''Compute RK4 step'''
-        k1 = self.G(y_rk, t_rk)
-        k2 = self.G(y_rk+0.5*k1*dt, t_rk+0.5*dt)
-        k3 = self.G(y_rk+0.5*k2*dt, t_rk+0.5*dt)
-        k4 = self.G(y_rk+k3*dt, t_rk+dt)
-        dy = dt * (k1 + 2*k2 + 2*k3 + k4)/6
-        return dy
 
 
-    def compute_force_tz(self,t_fi):
-        '''compute force substep for TZ '''
-        if self.input_texts[0] <= "Sinusoidal":
-            self.F_tz[0] = np.sin(self.omega*t_fi)*self.F_amp
+    def step_block(self, n, out):
+        '''Computes n simulation steps and writes the channel values of every step to out,
+           see SimuBlocks. Models are stepped by SimuStateSpace. Hidden models are not stepped,
+           their channels are written as NaN so values of the previous block are not reused'''
+        times = step_times(self.params, n)
+        out["rk"] = self.model_rk.step_block(times, self.params.steptime)
+        if getattr(simulator,"shown_graphs"):
+            out["tz"] = self.model_tz.step_block(times, self.params.steptime)
+            out["fe"] = self.model_fe.step_block(times, self.params.steptime)
         else:
-            self.F_tz[0] = self.F_amp
-        f_return = self.F_tz
-        return f_return
-
+            out["tz"] = np.nan
+            out["fe"] = np.nan
+        return n
 
-    def trapz_step(self, y_tz, t_tz ,dt):
-        '''Compute TZ step'''
-        f_t = self.compute_force_tz(t_tz)
-        y0 = (self.A_INV.dot(f_t - self.B_matrix.dot(y_tz)))
-        f_t = self.compute_force_tz(t_tz+dt)
-        y1 = (self.A_INV.dot(f_t - self.B_matrix.dot(y_tz)))
-        dy = dt/2*(y1+y0)
-        return dy
 
-
-    def compute_force_fe(self,t_fi):
-        '''compute force for FE'''
+    def force(self, times):
+        '''Returns force at the given times'''
         if self.input_texts[0] <= "Sinusoidal":
-            self.F_fe[0] = np.sin(self.omega*t_fi)*self.F_amp
-        else:
-            self.F_fe[0] = self.F_amp
-        f_return = self.F_fe
-        return f_return
-
-
-    def forward_euler_step(self, y_fe, t_fe, dt):
-        '''Compute FE step'''
-        f_t = self.compute_force_fe(t_fe)
-        y = dt *self.A_INV.dot(f_t - self.B_matrix.dot(y_fe))
-        return y
+            return np.sin(self.omega*times)*self.F_amp
+        return np.full(len(times), self.F_amp)
 
 
 class graphicsViewWidget(QWidget):
@@ -320,11 +279,15 @@ class graphicsViewWidget(QWidget):
         self.graphing_flow_control = graphing_flow_control
         ### Do not change ###
 
+        # graphed steps kept in the plot history, the whole run can be zoomed out
+        self.history_length = self.parameters.data_length//self.parameters.graphing_interval
+
         self.simulation_view_layout = QGridLayout()
         parent.parameter_view_size = 190
 
         self.rk_graph = LinePlotWidget(simu_steptime=self.parameters.steptime,
                                               plot_step=self.parameters.graphing_interval,
+                                              history_length=self.history_length,
                                               x_lenght=1000, enable_legend=True,
                                               x_name="time [s]",
                                               y_name="v [m/s], d [m], F [N]")
@@ -357,6 +320,7 @@ class graphicsViewWidget(QWidget):
         '''creates graphs for trapezoidal method and forward euler'''
         self.tz_graph = LinePlotWidget(simu_steptime=self.parameters.steptime,
                                               plot_step=self.parameters.graphing_interval,
+                                              history_length=self.history_length,
                                               x_lenght=1000, enable_legend=True,
                                               x_name="time [s]",
                                               y_name="v [m/s], d [m], F [N]")
@@ -370,6 +334,7 @@ class graphicsViewWidget(QWidget):
 
         self.fe_graph = LinePlotWidget(simu_steptime=self.parameters.steptime,
                                               plot_step=self.parameters.graphing_interval,
+                                              history_length=self.history_length,
                                               x_lenght=1000, enable_legend=True,
                                               x_name="time [s]",
                                               y_name="v [m/s], d [m], F [N]")
@@ -407,28 +372,19 @@ class graphicsViewWidget(QWidget):
         '''update Slot method is run once every graphing interval.
            Should contain updates of all visual elements.
            Data from simulator is contained in input variable with default name "inp".
-           inp is a type=list and the data is in the same order it is send from the simulator
-           as "send_to_graph function call.
+           inp is ChannelFrame and data is read by channel name.
            last line of the method must be call for self.graphing_flow_control()'''
-
-        self.rk_graph.step("Displacement",inp[0][0][1])
-        self.rk_graph.step("Velocity",inp[0][0][0])
-        self.rk_graph.step("Force",inp[0][1][0])
-
-        if inp[4]:
-            self.tz_graph.step("Displacement",inp[1][0][1])
-            self.tz_graph.step("Velocity",inp[1][0][0])
-            self.tz_graph.step("Force",inp[1][1][0])
-
-            self.fe_graph.step("Displacement",inp[2][0][1])
-            self.fe_graph.step("Velocity",inp[2][0][0])
-            self.fe_graph.step("Force",inp[2][1][0])
-
-        if inp[3][0]:
-            self.rk_graph.steptime = inp[3][1]
-            if inp[4]:
-                self.tz_graph.steptime = inp[3][1]
-                self.fe_graph.steptime = inp[3][1]
+        graphs = [(self.rk_graph, "rk")]
+        if self.tz_graph is not None:
+            graphs += [(self.tz_graph, "tz"), (self.fe_graph, "fe")]
+
+        for graph, channel in graphs:
+            velocity, displacement, force = inp[channel]
+            graph.step("Displacement",displacement)
+            graph.step("Velocity",velocity)
+            graph.step("Force",force)
+            if inp.changed("steptime"):
+                graph.steptime = inp["steptime"]
 
         ### LAST LINE OF UPDATE METHOD
         self.graphing_flow_control()
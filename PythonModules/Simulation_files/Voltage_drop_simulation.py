@@ -27,7 +27,8 @@ sys.path.append('..')
 from PhasorPlotWidget import PhasorGraphWidget
 from LinePlotWidget import LinePlotWidget
 from SimulationWindowWidgets import ParameterViewWidget, PictureViewWidget
-from SimuMath import (cart2pol, angle_loop_rad, pol2cart, solve_2bus_NR, solve_power_flow_GS)
+from SimuMath import (cart2pol, pol2cart, solve_2bus_NR, solve_power_flow_GS)
+from SimuChannels import ChannelSet
 
 
 
@@ -192,11 +193,16 @@ class simulator(QObject):
     By default the simulation includes methods:
     init: should contain variable definitions.
     update_matrixes: should contain computations for simulation varible changes.
-    run (Slot): should contain the mathematics run every simulation step.
+    step_block: computes the simulation steps in blocks, see SimuBlocks.
     The simulator object is executed in separate thread to enable paraller execution,
     with the GUI. 
     '''
     cable_impedances = [-1,-1]
+    # update methods executed when their inputs change, see SimuBindings
+    update_dependencies = {"update_load": ("load_power", "load_cos_phi", "load_type"),
+                           "update_line": ("frequency", "line_length", "line_resistance",
+                                           "line_inductance", "conductance", "capacitance"),
+                           "update_power_flow": ("u_in", "update_load", "update_line")}
     def __init__(self, parent, params, signals, send_to_graph):
         super().__init__()
 
@@ -245,6 +251,19 @@ class simulator(QObject):
                                       -2*np.pi/3,
                                       -4*np.pi/3],
                                       dtype=float)
+        # angles are computed from the number of steps taken with the same angle step,
+        # so that they do not depend on how the steps are divided into blocks
+        self.angle_origins = self.phase_angles.copy()
+        self.angle_steps = 0.0
+        self.angle_step_count = 0
+
+        # output channels sent to graphs, phasor values are published as static data in
+        # update_matrixes()
+        self.channels = ChannelSet({"U_send_amp": (float, ()),
+                                    "U_send_angles": (float, 3),
+                                    "U_load_amp": (float, ()),
+                                    "U_load_angles": (float, 3),
+                                    "I_total": (complex, ())})
 
         self.update_matrixes()
 
@@ -256,13 +275,13 @@ class simulator(QObject):
            Additionally fun at startup.
            This fuction should include all calculations not necessary to run every cycle but after 
            user action.'''
+        self.update_load()
+        self.update_line()
+        self.update_power_flow()
 
-        self.inputs_updated = True
-        self.iter_number = 700          # maximum number of iterations
-        self.phasors_update = self.params.graphing_interval+1
 
-        self.U_send = self.input_variables[0]       #sending end voltage
-        self.frequency = self.input_variables[1]
+    def update_load(self):
+        '''Computes the load power from the load inputs'''
         self.cos_phi = self.input_variables[6]
         if self.cos_phi >= 1:
             self.cos_phi = 0.9999999
@@ -275,6 +294,11 @@ class simulator(QObject):
             self.Q_load = -np.sqrt(self.S_load**2-self.P_load**2)
         self.S_load_complex = self.P_load+self.Q_load*1j
 
+
+    def update_line(self):
+        '''Computes the line impedance and admittance from the line inputs and cable selection'''
+        self.frequency = self.input_variables[1]
+        self.line_cable = list(getattr(simulator,"cable_impedances"))
         self.line_len = self.input_variables[2]     #length of the line [km]
 
         # depending on if cable type is selected or if R and L are given directly, the computation of
@@ -299,6 +323,18 @@ class simulator(QObject):
         self.Z = self.r_line+self.x_line*1j
         self.Y = self.g+self.b*1j
 
+
+    def update_power_flow(self):
+        '''Computes the receiving end voltage and the system current with the power flow
+           solvers'''
+        # cable selection is not an input, so the line is recomputed if it has been changed
+        if getattr(simulator,"cable_impedances") != self.line_cable:
+            self.update_line()
+
+        self.iter_number = 700          # maximum number of iterations
+
+        self.U_send = self.input_variables[0]       #sending end voltage
+
         # Y-bus formulation
         Y_00 = (1/self.Z)+(self.Y/2)
         Y_01 = -(1/self.Z)
@@ -334,49 +370,45 @@ class simulator(QObject):
         # system current
         self.I_total = np.conjugate(self.S_load_complex/(np.sqrt(3)*self.U_r))
 
-
-
-    @Slot(bool)
-    def run(self, _):
-        '''Simulation calculation method. 
-        This method shoud include simulation step calculation and method for sending data to graph.
-        Calculation loop is run as long as simulation is set ON by user.
-        Data is sent to the graph via self.send_to_graph() function which should be called at the
-        end of the method. This fucntion takes 1 input type=list, which should contain all data to
-        be send for graphs or other visual elements in graphicsViewWidget'''
-        while self.flow_control():
-            # phase angles
-            self.angle_steps = (self.pi2/((1/self.frequency)/self.params.steptime))
-            self.phase_angles += self.angle_steps
-            self.phase_angles[0] = angle_loop_rad(self.phase_angles[0])
-
-            # RMS, amplitudes and angles 
-            U_S_rms = np.abs(self.U_send)
-            U_S_amp = U_S_rms*np.sqrt(2)
-            U_S_ang = self.phase_angles
-            U_R_rms = np.abs(self.U_r)
-            U_R_amp = U_R_rms*np.sqrt(2)
-            U_R_ang = self.phase_angles+cart2pol(np.real(self.U_r),np.imag(self.U_r))[1]
-
-            # phasor graphs are only updated when inputs are updated to reduce graphical load
-            if self.phasors_update >= 0:
-                update_phasors = True
-            else:
-                update_phasors = False
-
-            # data sending to graphs
-            self.send_to_graph([U_S_amp,#0
-                                U_S_rms,#1
-                                U_S_ang,#2
-                                U_R_amp,#3
-                                U_R_rms,#4
-                                U_R_ang,#5
-                                self.U_r,#6
-                                self.U_h,#7
-                                self.I_total,#8
-                                update_phasors,#9
-                                self.Z
-                                ])
+        # phasor graphs and numeric parameters are only redrawn when these values change
+        self.channels.publish("phasors", {"U_send_rms": np.abs(self.U_send),
+                                          "U_load_rms": np.abs(self.U_r),
+                                          "U_load": self.U_r,
+                                          "U_loss": self.U_h,
+                                          "I_total": self.I_total,
+                                          "Z": self.Z})
+
+
+
+    def step_block(self, n, out):
+        '''Computes n simulation steps at once and writes the channel values of every step
+           to out, see SimuBlocks. Voltages and current are constant between input updates,
+           only the phase angles rotate'''
+        # phase angles
+        angle_steps = (self.pi2/((1/self.frequency)/self.params.steptime))
+        if angle_steps != self.angle_steps:
+            self.angle_origins[:] = self.phase_angles
+            self.angle_steps = angle_steps
+            self.angle_step_count = 0
+        step_counts = self.angle_step_count + np.arange(1, n+1)
+        angles = self.angle_origins + self.angle_steps*step_counts[:, np.newaxis]
+        angles[:, 0] = np.mod(angles[:, 0], self.pi2)
+        self.angle_step_count += n
+        self.phase_angles[:] = angles[-1]
+
+        # RMS, amplitudes and angles
+        U_S_rms = np.abs(self.U_send)
+        U_S_amp = U_S_rms*np.sqrt(2)
+        U_R_rms = np.abs(self.U_r)
+        U_R_amp = U_R_rms*np.sqrt(2)
+
+        # data sending to graphs
+        out["U_send_amp"] = U_S_amp
+        out["U_send_angles"] = angles
+        out["U_load_amp"] = U_R_amp
+        out["U_load_angles"] = angles + cart2pol(np.real(self.U_r),np.imag(self.U_r))[1]
+        out["I_total"] = self.I_total
+        return n
 
 
 
@@ -470,69 +502,76 @@ class graphicsViewWidget(QWidget):
         self.setLayout(self.simulation_view_layout)
 
 
-    @Slot(list)
+    @Slot(object)
     def update(self, inp):
         '''update Slot method is run once every graphing interval.
            Should contain updates of all visual elements.
            Data from simulator is contained in input variable with default name "inp".
-           inp is a type=list and the data is in the same order it is send from the simulator
-           as "send_to_graph function call.
+           inp is a ChannelFrame and the data is read by the channel names declared in the
+           simulator object.
            last line of the method must be call for self.graphing_flow_control()'''
 
-        self.voltage_graph.step("U Grid",inp[0]*np.cos(inp[2][0]))
-        self.voltage_graph.step("U Load",inp[3]*np.cos(inp[5][0]))
-        I_ang = np.tan(np.imag(inp[8])/np.real(inp[8]))
-        self.voltage_graph.step("I*10",10*np.abs(inp[8])*(np.cos(inp[2][0]+I_ang)))
+        U_send_angles = inp["U_send_angles"]
+        I_total = inp["I_total"]
+        self.voltage_graph.step("U Grid",inp["U_send_amp"]*np.cos(U_send_angles[0]))
+        self.voltage_graph.step("U Load",inp["U_load_amp"]*np.cos(inp["U_load_angles"][0]))
+        I_ang = np.tan(np.imag(I_total)/np.real(I_total))
+        self.voltage_graph.step("I*10",10*np.abs(I_total)*(np.cos(U_send_angles[0]+I_ang)))
 
         # numeric parameters and phasor graphs are only updated when inputs are updated to reduce
         # computational load
-        if inp[9]:
-            x_Ur = np.real(inp[6])
-            y_Ur = np.imag(inp[6])
-            x_r_loss = x_Ur+np.real(inp[7])
-            y_r_loss = y_Ur+np.imag(inp[7])
-            U_r_ang = np.tan(np.imag(inp[6])/np.real(inp[6]))*-1
-            y_U_rh = np.real(inp[7])*np.sin(U_r_ang)
-            x_U_rh = inp[1]-np.real(inp[7])*np.cos(U_r_ang)
+        if inp.changed("phasors"):
+            phasors = inp["phasors"]
+            U_send_rms = phasors["U_send_rms"]
+            U_load = phasors["U_load"]
+            U_loss = phasors["U_loss"]
+            I_phasor = phasors["I_total"]
+            x_Ur = np.real(U_load)
+            y_Ur = np.imag(U_load)
+            x_r_loss = x_Ur+np.real(U_loss)
+            y_r_loss = y_Ur+np.imag(U_loss)
+            U_r_ang = np.tan(np.imag(U_load)/np.real(U_load))*-1
+            y_U_rh = np.real(U_loss)*np.sin(U_r_ang)
+            x_U_rh = U_send_rms-np.real(U_loss)*np.cos(U_r_ang)
 
             i = 0
-            self.parameter_view.update_row(i,inp[1])
+            self.parameter_view.update_row(i,U_send_rms)
             i += 1
-            self.parameter_view.update_complex_row(i,inp[1]+0j)
+            self.parameter_view.update_complex_row(i,U_send_rms+0j)
             i += 1
-            self.parameter_view.update_polar_row(i,inp[1],0)
+            self.parameter_view.update_polar_row(i,U_send_rms,0)
             i += 1
-            self.parameter_view.update_row(i,inp[4])
+            self.parameter_view.update_row(i,phasors["U_load_rms"])
             i += 1
-            self.parameter_view.update_complex_row(i,inp[6])
+            self.parameter_view.update_complex_row(i,U_load)
             i += 1
-            x = cart2pol(np.real(inp[6]),np.imag(inp[6]))
+            x = cart2pol(np.real(U_load),np.imag(U_load))
             self.parameter_view.update_polar_row(i,x[0],np.rad2deg(x[1]))
             i += 1
-            self.parameter_view.update_row(i,np.abs(inp[7]))
+            self.parameter_view.update_row(i,np.abs(U_loss))
             i += 1
-            self.parameter_view.update_complex_row(i,inp[7])
+            self.parameter_view.update_complex_row(i,U_loss)
             i += 1
-            x = cart2pol(np.real(inp[7]),np.imag(inp[7]))
+            x = cart2pol(np.real(U_loss),np.imag(U_loss))
             self.parameter_view.update_polar_row(i,x[0],np.rad2deg(x[1]))
             i += 1
-            self.parameter_view.update_row(i,np.abs(inp[8]))
+            self.parameter_view.update_row(i,np.abs(I_phasor))
             i += 1
-            self.parameter_view.update_complex_row(i,inp[8])
+            self.parameter_view.update_complex_row(i,I_phasor)
             i += 1
-            x = cart2pol(np.real(inp[8]),np.imag(inp[8]))
+            x = cart2pol(np.real(I_phasor),np.imag(I_phasor))
             self.parameter_view.update_polar_row(i,x[0],np.rad2deg(x[1]))
             i += 1
-            self.parameter_view.update_complex_row(i,inp[10])
+            self.parameter_view.update_complex_row(i,phasors["Z"])
 
-            self.U_phasor_graph.update("U_grid",inp[1],0)
+            self.U_phasor_graph.update("U_grid",U_send_rms,0)
             self.U_phasor_graph.update("U_load",x_Ur,y_Ur)
             self.U_phasor_graph.update("U_loss",x_Ur,y_Ur,x_r_loss,y_r_loss)
-            self.U_phasor_graph.update("U_loss_r",x_U_rh,y_U_rh,inp[1],0)
+            self.U_phasor_graph.update("U_loss_r",x_U_rh,y_U_rh,U_send_rms,0)
             self.U_phasor_graph.update("U_loss_x",x_Ur,y_Ur,x_U_rh,y_U_rh)
 
 
-            self.I_phasor_graph.update("I_system",np.real(inp[8]),np.imag(inp[8]))
+            self.I_phasor_graph.update("I_system",np.real(I_phasor),np.imag(I_phasor))
 
 
         ### LAST LINE OF UPDATE METHOD, DO NOT EDIT OR ADD CODE AFTER
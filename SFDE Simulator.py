@@ -3,6 +3,8 @@
     This is the launcher for the simulator.\n
     It tests if computer has all required modules are installed and can install them after user\n
     confirmation. If or after installation, the MainApp.pyw is launched.\n
+    Modules are found without importing them and a successful test is cached for the used\n
+    Python and module versions. Launcher exits when the simulator window has opened.\n
     If this does not work, MainApp.pyw can be run directly from the subdirectory PythonModules
 '''
 
@@ -15,20 +17,28 @@ SFDEsim is free software: you can redistribute it and/or modify it under the ter
    of the License, or (at your option) any later version.
 
 SFDEsim is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
- even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. 
+ even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
  See the GNU General Public License for more details.
 
-You should have received a copy of the GNU General Public License along with SFDEsim. 
+You should have received a copy of the GNU General Public License along with SFDEsim.
 If not, see <https://www.gnu.org/licenses/>.
 '''
 
 import sys
 import os
+import json
+import time
+import tempfile
 import subprocess
-import importlib
 import importlib.util
+import importlib.metadata
 from platform import system as plat_sys
-from time import sleep
+
+
+REQUIRED_LIBRARIES = ("numpy", "PySide6", "pyqtgraph")
+PROBE_CACHE_FILE = "launcher_probe.json"
+WINDOW_TIMEOUT = 120            # Time in seconds to wait for the simulator window
+WINDOW_POLL_INTERVAL = 0.05     # Time in seconds between the window checks
 
 os_type = plat_sys()
 if not os_type in ("Linux", "Windows"):
@@ -36,86 +46,146 @@ if not os_type in ("Linux", "Windows"):
     print("For support, contact course teacher for more infromation")
 
 path = os.path.realpath(__file__)[:-len(os.path.basename(__file__))]
+app_path = os.path.join(path, "PythonModules", "MainApp.pyw")
+probe_cache_path = os.path.join(path, "PythonModules", PROBE_CACHE_FILE)
 
-print("Starting simulator")
-error_list = []
-
-try:
-    full_module_name = "PythonModules." + "MainApp"
-    importlib.util.find_spec(full_module_name, package=None)
-except ModuleNotFoundError:
-    print("Simulator application missing\nExiting program")
-    sleep(14)
+
+def exit_launcher(message=""):
+    '''Prints message and exits. When run from a console, the console stays open until enter
+       is pressed so that the message can be read'''
+    if message != "":
+        print(message)
+    if sys.stdin is not None and sys.stdin.isatty():
+        input("Press enter to exit")
     sys.exit()
 
-try:
-    import numpy
-except ImportError:
-    error_list.append("numpy")
-
-try:
-    import PySide6
-except ImportError:
-    error_list.append("PySide6")
-
-try:
-    import pyqtgraph
-except ImportError:
-    error_list.append("pyqtgraph")
-
-def pip_install(os, lib):
-    '''Installs pip packages using shell commands of used OS'''
-    install_error = False
-    if os == "Linux":
-        try:
-            subprocess.call([sys.executable, "python3", "-m", "pip", "install", lib])
-        except Exception as e1:
-            print("cannot install library:", lib, " >>> ", e1)
-            install_error = True
-    elif os == "Windows":
+
+def probe_key():
+    '''Returns key of the library probe, consisting of the Python interpreter and installed
+       versions of the required libraries'''
+    versions = {}
+    for lib in REQUIRED_LIBRARIES:
         try:
-            subprocess.call([sys.executable, "-m", "pip", "install", lib])
-        except Exception as e2:
-            print("cannot install library:", lib, " >>> ", e2)
-            install_error = True
-    return install_error
-
-if len(error_list) > 0:
-    print("Following Python libraries missing")
-    for _, lib in enumerate(error_list):
-        print(lib)
-    install_confirm = False
-    install_error = False
-
-    while not install_confirm:
-        inp = input("Install libraries from pip [y/n]?")
-        if inp in ("n", "N"):
-            print("Cannot launch simulator without libraries\nExiting program")
-            sleep(14)
-            sys.exit()
-        elif inp.lower() == "y" or inp.lower() == "yes":
-            install_confirm = True
-        else:
-            print("Unknown command")
-
-    for _, lib in enumerate(error_list):
-        install_error = pip_install(os_type, lib)
-
-    if install_error:
-        print("Cannot launch simulator without libraries\nExiting program")
-        sleep(14)
-        sys.exit()
+            versions[lib] = importlib.metadata.version(lib)
+        except importlib.metadata.PackageNotFoundError:
+            versions[lib] = None
+    return {"executable": sys.executable, "python": sys.version, "libraries": versions}
+
+
+def probe_cached(key):
+    '''Returns True if libraries have been found earlier with the same key'''
+    try:
+        with open(probe_cache_path, encoding="utf-8") as file:
+            return json.load(file) == key
+    except (OSError, ValueError):
+        return False
+
+
+def save_probe(key):
+    '''Saves successful probe, if saving fails the probe is only done again next time'''
+    try:
+        with open(probe_cache_path, "w", encoding="utf-8") as file:
+            json.dump(key, file, indent=4)
+    except OSError:
+        pass
+
+
+def missing_libraries():
+    '''Returns required libraries which cannot be found, libraries are not imported'''
+    missing = []
+    for lib in REQUIRED_LIBRARIES:
+        if importlib.util.find_spec(lib) is None:
+            missing.append(lib)
+    return missing
+
+
+def pip_install(lib):
+    '''Installs pip package with the pip of the running Python, returns True on error'''
+    try:
+        return subprocess.call([sys.executable, "-m", "pip", "install", lib]) != 0
+    except Exception as error:
+        print("cannot install library:", lib, " >>> ", error)
+        return True
+
+
+def launch_simulator():
+    '''Starts MainApp.pyw as an independent process and waits until its window is shown.
+       Returns True when the window is shown, False if the simulator exited or did not
+       show its window in time'''
+    ready_file = os.path.join(tempfile.mkdtemp(prefix="sfdesim_"), "window_ready")
+    executable = sys.executable
+    options = {}
+    if os_type == "Windows":
+        windowed = os.path.join(os.path.dirname(executable), "pythonw.exe")
+        if os.path.isfile(windowed):
+            executable = windowed
+        options["creationflags"] = (subprocess.DETACHED_PROCESS |
+                                    subprocess.CREATE_NEW_PROCESS_GROUP)
+    else:
+        options["start_new_session"] = True
+    process = subprocess.Popen([executable, app_path, "--ready-file", ready_file],
+                               cwd=os.path.dirname(app_path),
+                               stdin=subprocess.DEVNULL,
+                               stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL,
+                               **options)
+    deadline = time.monotonic() + WINDOW_TIMEOUT
+    try:
+        while time.monotonic() < deadline:
+            if os.path.exists(ready_file):
+                return True
+            if process.poll() is not None:
+                return False
+            time.sleep(WINDOW_POLL_INTERVAL)
+        return False
+    finally:
+        if os.path.exists(ready_file):
+            os.remove(ready_file)
+        os.rmdir(os.path.dirname(ready_file))
+
+
+print("Starting simulator")
+
+if not os.path.isfile(app_path):
+    exit_launcher("Simulator application missing\nExiting program")
+
+key = probe_key()
+if not probe_cached(key):
+    error_list = missing_libraries()
+
+    if len(error_list) > 0:
+        print("Following Python libraries missing")
+        for _, lib in enumerate(error_list):
+            print(lib)
+        install_confirm = False
+        install_error = False
+
+        while not install_confirm:
+            inp = input("Install libraries from pip [y/n]?")
+            if inp in ("n", "N"):
+                exit_launcher("Cannot launch simulator without libraries\nExiting program")
+            elif inp.lower() == "y" or inp.lower() == "yes":
+                install_confirm = True
+            else:
+                print("Unknown command")
+
+        for _, lib in enumerate(error_list):
+            install_error = pip_install(lib) or install_error
+
+        # path finders cache directory listings, libraries installed now are not found without
+        importlib.invalidate_caches()
+        if install_error or len(missing_libraries()) > 0:
+            exit_launcher("Cannot launch simulator without libraries\nExiting program")
+        key = probe_key()
+
+    save_probe(key)
 
 print("Launching simulator")
 
-if os_type == "Linux":
-    os.system("nohup python3 " + path + "PythonModules/MainApp.pyw &")
-elif os_type == "Windows":
-    print("start pythonw3 " + path + "MainApp.pyw")
-    print("\n")
-    print("This console window can now be closed after the simulator window has opened")
-    print("If the simulator does not launch, see startup manual in Simulator/Documents folder")
-    os.system('pythonw3 "' + path + 'PythonModules\MainApp.pyw"')
-
-sleep(34.3)
-sys.exit()
+if launch_simulator():
+    print("Simulator window has opened")
+    sys.exit()
+
+print("Simulator did not start")
+print("If the simulator does not launch, see startup manual in Simulator/Documents folder")
+exit_launcher()
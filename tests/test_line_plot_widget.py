@@ -0,0 +1,105 @@
+'''Tests of LinePlotWidget drawing, run with python -m unittest or pytest from the
+repository root. Qt runs on the offscreen platform unless another one is set.'''
+
+## Licensing
+'''
+This file is part of SFDEsim.
+
+SFDEsim is free software: you can redistribute it and/or modify it under the terms of the
+ GNU General Public License as published by the Free Software Foundation, either version 3
+   of the License, or (at your option) any later version.
+
+SFDEsim is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+ even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+ See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with SFDEsim.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import os
+import sys
+import unittest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "PythonModules"))
+
+# pylint: disable=E0611,C0413
+import numpy as np
+from PySide6.QtWidgets import QApplication
+
+import SimuRender
+from LinePlotWidget import LinePlotWidget, HistoryPyramid
+
+
+app = QApplication.instance() or QApplication([])
+
+
+
+class TestLinePlotRange(unittest.TestCase):
+    '''Axis ranges set when the graph is rendered'''
+    def setUp(self):
+        self.widget = LinePlotWidget(simu_steptime=1e-4, plot_step=10, x_lenght=1000)
+        self.widget.add_plotline("a", x_data=np.array([0,1,2]), y_data=np.array([0,0,0]))
+        self.widget.resize(600, 400)
+        self.widget.show()
+        app.processEvents()
+
+
+    def tearDown(self):
+        SimuRender.render_scheduler().clear()
+        self.widget.close()
+
+
+    def render(self):
+        '''Renders the waiting widgets and lets the view box apply its range'''
+        SimuRender.render_scheduler().render()
+        app.processEvents()
+        return self.widget.graphWidget.plotItem.vb.viewRange()
+
+
+    def test_update_keeps_x_autorange(self):
+        '''Plotline replaced with update() is shown on its own x-values'''
+        x_values = np.linspace(0, 0.02, 200)
+        self.widget.update("a", x_values, np.sin(2*np.pi*50*x_values))
+        x_range, y_range = self.render()
+        self.assertGreater(x_range[0], -0.001)
+        self.assertLess(x_range[0], 0.001)
+        self.assertGreater(x_range[1], 0.019)
+        self.assertLess(x_range[1], 0.021)
+        self.assertGreaterEqual(y_range[1], 1)
+
+
+    def test_step_pans_x_range(self):
+        '''Stepped plotline shows the latest x_lenght steps'''
+        for value in np.sin(np.arange(2000)/50):
+            self.widget.step("a", value)
+        x_range = self.render()[0]
+        x_last = self.widget.plot_lines["a"].x_data[-1]
+        self.assertAlmostEqual(x_range[1], x_last, delta=0.05*(x_range[1] - x_range[0]))
+        self.assertGreater(x_range[0], 0)
+
+
+
+
+class TestHistoryPyramid(unittest.TestCase):
+    '''Zoomed out views of the plotline history'''
+    def test_recent_peak_in_run_view(self):
+        '''Peak shortly before the latest step is shown, also when its steps are carried by
+           the lower levels'''
+        for steps in range(99000, 99128, 11):
+            history = HistoryPyramid(200000)
+            x_values = np.arange(steps, dtype=float)
+            y_values = np.zeros(steps)
+            y_values[steps - 70] = 5
+            for start in range(0, steps, 50):
+                history.add(x_values[start:start+50], y_values[start:start+50])
+            x_view, y_view = history.view(-1, 1000)
+            self.assertEqual(y_view.max(), 5)
+            self.assertTrue(np.all(np.diff(x_view) >= 0))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+'''Tests of SimuArchive, run with python -m unittest or pytest from the repository root.'''
+
+## Licensing
+'''
+This file is part of SFDEsim.
+
+SFDEsim is free software: you can redistribute it and/or modify it under the terms of the
+ GNU General Public License as published by the Free Software Foundation, either version 3
+   of the License, or (at your option) any later version.
+
+SFDEsim is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+ even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+ See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with SFDEsim.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "PythonModules"))
+
+# pylint: disable=C0413
+import numpy as np
+
+import SimuArchive
+
+
+CHANNELS = np.dtype([("current", np.float64), ("voltages", np.float64, (3,))])
+
+
+
+class TestArchive(unittest.TestCase):
+    '''Archive written with ArchiveWriter and read with ArchiveReader'''
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()    # pylint: disable=R1732
+        self.filename = os.path.join(self.directory.name, SimuArchive.ARCHIVE_FILE)
+        self.writer = SimuArchive.ArchiveWriter(self.filename, CHANNELS, chunk_steps=1000)
+        self.steps = 0
+
+
+    def tearDown(self):
+        self.writer.close()
+        self.directory.cleanup()
+
+
+    def add(self, count:int):
+        '''Archives count steps continuing from the previous ones'''
+        numbers = np.arange(self.steps, self.steps + count)
+        values = np.zeros(count, dtype=CHANNELS)
+        values["current"] = np.sin(numbers/100)
+        values["voltages"] = numbers[:, None]
+        self.writer.extend(values, numbers*1e-3)
+        self.steps += count
+
+
+    def assert_steps(self, reader, count:int):
+        '''Checks that the reader holds the first count steps'''
+        self.assertEqual(len(reader), count)
+        self.assertTrue(np.array_equal(reader[:]["voltages"][:, 0], np.arange(count)))
+        self.assertTrue(np.allclose(reader.time(slice(None)), np.arange(count)*1e-3))
+
+
+    def test_round_trip(self):
+        '''Closed archive holds every step, seek finds the step of a time'''
+        self.add(5500)
+        self.writer.close()
+        reader = SimuArchive.ArchiveReader(self.filename)
+        self.assert_steps(reader, 5500)
+        self.assertEqual(reader.seek(2.5), 2500)
+
+
+    def test_reader_after_flush(self):
+        '''Reader opened after flush keeps its steps while the writer appends and discards'''
+        self.add(3500)
+        self.writer.flush()
+        reader = SimuArchive.ArchiveReader(self.filename)
+        self.add(5000)
+        self.assert_steps(reader, 3500)
+
+        self.writer.discard_after(2.0)
+        self.steps = 2001
+        self.add(4000)
+        self.writer.flush()
+        self.assert_steps(reader, 3500)
+        self.assert_steps(SimuArchive.ArchiveReader(self.filename), 6001)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+'''Tests of SimuRunState, run with python -m unittest or pytest from the repository root.'''
+
+## Licensing
+'''
+This file is part of SFDEsim.
+
+SFDEsim is free software: you can redistribute it and/or modify it under the terms of the
+ GNU General Public License as published by the Free Software Foundation, either version 3
+   of the License, or (at your option) any later version.
+
+SFDEsim is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+ even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+ See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with SFDEsim.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "PythonModules"))
+
+# pylint: disable=C0413
+import SimuRunState
+
+
+
+class TestRunStateCall(unittest.TestCase):
+    '''Functions executed in the simulator thread with RunState.call()'''
+    def setUp(self):
+        self.run_state = SimuRunState.RunState()
+        self.steps = 0
+        self.thread = threading.Thread(target=self.run_loop)
+        self.thread.start()
+
+
+    def tearDown(self):
+        self.run_state.close()
+        self.thread.join()
+
+
+    def run_loop(self):
+        '''Simulator run loop, stopped state waits for calls'''
+        while self.run_state.ready(False):
+            self.steps += 1
+
+
+    def test_call(self):
+        '''Function is executed in the simulator thread'''
+        threads = []
+        self.assertTrue(self.run_state.call(lambda: threads.append(threading.current_thread())))
+        self.assertEqual(threads, [self.thread])
+
+
+    def test_failed_call(self):
+        '''Error of the function is logged, call returns False and the run loop continues'''
+        with mock.patch("UtilityFunctions.txt_log") as txt_log:
+            self.assertFalse(self.run_state.call(lambda: 1/0))
+        self.assertIn("ZeroDivisionError", txt_log.call_args[0][0])
+        self.assertTrue(self.thread.is_alive())
+        self.assertTrue(self.run_state.call(lambda: None, timeout=1))
+        self.assertEqual(self.run_state.failed, [])
+
+
+
+if __name__ == "__main__":
+    unittest.main()